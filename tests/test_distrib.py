@@ -3,13 +3,20 @@ import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import traceback
+import tempfile
 from uadapy import distribution
+from uadapy.registry import register_model
+from uadapy.gaussian import GaussianModel, GaussianMixture
+from uadapy.covariance import DiagonalCovariance, LowRankCovariance
+from uadapy.sampling import sample_parallel
+from uadapy.streaming import QuantileSketch, cholesky_update
+from uadapy.kde import sample_kde
+import uadapy.dr
 import numpy as np
 import scipy as sp
 import scipy.stats as st
 
 
-
 def test_distrib_class():
 
     model_1D = [
@@ -86,8 +93,347 @@ def test_distrib_class():
             traceback.print_exception(e)
 
 
-if __name__ == '__main__':
-    test_distrib_class()
+def test_moment_cache():
+    samples = np.random.default_rng(0).gamma(2.0, size=(5000, 3))
+    distrib = distribution(samples)
+    distrib.precompute_moments()
+    assert np.allclose(distrib.mean(), np.mean(samples, axis=0))
+    assert np.allclose(distrib.cov(), np.cov(samples.T))
+    assert np.allclose(distrib.skew(), st.skew(samples))
+    assert np.allclose(distrib.kurt(), st.kurtosis(samples))
+    assert distrib.cov() is distrib.cov()
+    # in-place changes require explicit invalidation, assigning a new model invalidates automatically
+    samples *= 2
+    distrib.invalidate()
+    assert np.allclose(distrib.mean(), np.mean(samples, axis=0))
+    distrib.model = samples[:100]
+    assert np.allclose(distrib.cov(), np.cov(samples[:100].T))
+
+
+def test_lazy_kde():
+    samples = np.random.default_rng(0).normal(size=(500, 2))
+    distrib = distribution(samples)
+    assert distrib.dim == 2
+    assert distrib._kde is None
+    distrib.cov()
+    assert distrib._kde is None
+    assert distrib.pdf(samples[:10]).shape == (10,)
+    assert distrib._kde is not None
+    distrib.invalidate()
+    assert distrib._kde is None
+    assert distribution(samples, name="Normal").kde is None
+
+
+def test_binned_pdf():
+    samples = np.random.default_rng(0).normal(size=(2000, 2))
+    distrib = distribution(samples)
+    x, y = np.meshgrid(np.linspace(-3, 3, 64), np.linspace(-3, 3, 64))
+    coordinates = np.stack((x, y), axis=-1).reshape((-1, 2))
+    exact = distrib.pdf(coordinates)
+    binned = distrib.pdf(coordinates, method="binned", grid_size=256)
+    assert np.max(np.abs(exact - binned)) < 1e-2 * np.max(exact)
+
+
+def test_tree_pdf():
+    rng = np.random.default_rng(0)
+    distrib = distribution(rng.normal(size=(2000, 3)))
+    x = rng.normal(size=(500, 3))
+    exact = distrib.pdf(x)
+    truncated = distrib.pdf(x, method="tree", cutoff=3.0)
+    assert np.all(np.abs(exact - truncated) <= distrib._kde_tree.error_bound())
+    assert np.all(truncated <= exact + 1e-12)
+
+
+def test_chunked_pdf():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(1001, 2))
+    for model in [rng.normal(size=(300, 2)), st.multivariate_normal(np.zeros(2), np.eye(2))]:
+        distrib = distribution(model)
+        expected = distrib.pdf(x)
+        out = np.zeros(len(x))
+        result = distrib.pdf(x, max_memory=10_000, out=out, workers=3)
+        assert result is out
+        assert np.allclose(result, expected)
+        # single points and empty queries
+        assert np.isclose(distrib.pdf(x[3], max_memory=10_000), expected[3])
+        assert distrib.pdf(np.empty((0, 2)), out=np.empty(0)).shape == (0,)
+    univariate = distribution(st.norm(0, 1))
+    assert np.isclose(univariate.pdf(0.5, max_memory=10_000), st.norm.pdf(0.5))
+    assert np.ndim(univariate.pdf(0.5, workers=2)) == 0
+    assert univariate.pdf(np.empty(0), out=np.empty(0), workers=2).shape == (0,)
+
+
+def test_memory_mapped_samples():
+    samples = np.random.default_rng(0).gamma(2.0, size=(10_000, 3))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'samples.npy')
+        np.save(path, samples)
+        distrib = distribution(path, chunk_size=999)
+        assert isinstance(distrib.model, np.memmap)
+        assert distrib.dim == 3
+        assert np.allclose(distrib.mean(), np.mean(samples, axis=0))
+        assert np.allclose(distrib.cov(), np.cov(samples.T))
+        assert np.allclose(distrib.skew(), st.skew(samples))
+        assert np.allclose(distrib.kurt(), st.kurtosis(samples))
+        assert distrib.sample(100, random_state=0).shape == (100, 3)
+        normal = distribution(np.load(path, mmap_mode='r'), name="Normal", chunk_size=999)
+        assert np.allclose(normal.cov(), np.cov(samples.T))
+        del distrib, normal
+
+
+def test_update():
+    rng = np.random.default_rng(0)
+    samples = rng.gamma(2.0, size=(3000, 3))
+    distrib = distribution(samples[:1000])
+    distrib.pdf(samples[:10])
+    distrib.update(samples[1000:2000])
+    distrib.update(samples[2000:])
+    assert distrib.model.shape == (3000, 3)
+    assert distrib._kde is None
+    assert np.allclose(distrib.mean(), np.mean(samples, axis=0))
+    assert np.allclose(distrib.cov(), np.cov(samples.T))
+    assert np.allclose(distrib.skew(), st.skew(samples))
+    assert np.allclose(distrib.kurt(), st.kurtosis(samples))
+    normal = distribution(samples[:1000], name="Normal")
+    normal.update(samples[1000:2999])
+    normal.update(samples[2999])
+    assert np.allclose(normal.cov(), np.cov(samples.T))
+    assert np.allclose(normal.model.cov, np.cov(samples.T))
+    # the Cholesky factor is updated with the new samples instead of being recomputed
+    assert np.allclose(normal.model._factor, np.linalg.cholesky(np.cov(samples.T)))
+    assert np.allclose(normal.logpdf(samples[:5]), st.multivariate_normal(np.mean(samples, axis=0),
+                                                                           np.cov(samples.T)).logpdf(samples[:5]))
+    a = rng.normal(size=(10, 4))
+    factor = np.linalg.cholesky(a.T @ a)
+    for m in [1, 3, 6]:
+        v = rng.normal(size=(m, 4))
+        assert np.allclose(cholesky_update(factor, v), np.linalg.cholesky(a.T @ a + v.T @ v))
+
+
+def test_qmc_sampling():
+    rng = np.random.default_rng(0)
+    models = [rng.normal(size=(500, 2)), st.multivariate_normal(np.ones(2), [[2.0, 1.0], [1.0, 2.0]]), st.norm(3, 2)]
+    for model in models:
+        distrib = distribution(model)
+        for method in ["sobol", "halton"]:
+            samples = distrib.sample(1024, random_state=1, method=method)
+            assert np.shape(samples)[0] == 1024
+            assert np.allclose(np.mean(samples, axis=0), distrib.mean(), atol=0.1)
+    # randomized QMC estimates of the mean are more accurate than plain Monte Carlo
+    normal = distribution(st.multivariate_normal(np.zeros(3), np.eye(3)))
+    qmc_error = np.mean([np.abs(normal.sample(256, s, method="sobol").mean(axis=0)).max() for s in range(20)])
+    mc_error = np.mean([np.abs(normal.sample(256, s).mean(axis=0)).max() for s in range(20)])
+    assert qmc_error < mc_error
+
+
+def test_logpdf():
+    rng = np.random.default_rng(4)
+    x = rng.normal(size=(50, 2))
+    for distr in [distribution(rng.normal(size=(300, 2))),
+                  distribution(st.multivariate_normal([0, 1], [[2, 0.5], [0.5, 1]]))]:
+        assert np.allclose(distr.logpdf(x), np.log(distr.pdf(x)))
+        assert np.allclose(distr.logpdf(x, max_memory=2**10), distr.logpdf(x))
+        # far in the tails the density underflows, the log-density does not
+        far = np.full((1, 2), 100.0)
+        assert np.all(np.ravel(distr.pdf(far)) == 0)
+        assert np.all(np.isfinite(distr.logpdf(far)))
+
+
+def test_model_registry():
+    class Point:
+        def __init__(self, location):
+            self.location = location
 
+    register_model(Point, mean=lambda d: d.model.location, cov=lambda d: np.zeros((2, 2)),
+                   sample=lambda d, n, random_state: np.tile(d.model.location, (n, 1)))
+    distrib = distribution(Point(np.ones(2)))
+    assert distrib.dim == 2
+    assert np.array_equal(distrib.mean(), np.ones(2))
+    assert distrib.sample(3).shape == (3, 2)
+    # accessors are resolved once per model type
+    assert distribution(Point(np.zeros(2)))._accessors is distrib._accessors
+    assert distribution(st.multivariate_t(np.zeros(2), np.eye(2), df=4)).cov()[0, 0] == 2
 
-    
\ No newline at end of file
+
+def test_gaussian_model():
+    mean = np.array([1.0, -1.0, 0.5])
+    a = np.random.default_rng(5).normal(size=(3, 3))
+    cov = a @ a.T + np.eye(3)
+    model = GaussianModel(mean, cov)
+    reference = st.multivariate_normal(mean, cov)
+    x = np.random.default_rng(6).normal(size=(20, 3))
+    assert np.allclose(model.pdf(x), reference.pdf(x))
+    assert np.allclose(model.logpdf(x), reference.logpdf(x))
+    assert np.isscalar(model.pdf(mean))
+    samples = model.rvs(20_000, random_state=1)
+    assert samples.shape == (20_000, 3)
+    assert np.allclose(np.cov(samples.T), cov, atol=0.2)
+    distrib = distribution(GaussianModel(mean, cov, validate=False))
+    assert distrib.dim == 3
+    assert np.array_equal(distrib.cov(), cov)
+    assert distrib.sample(16, 0, method="sobol").shape == (16, 3)
+    try:
+        GaussianModel(mean, -cov)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_gaussian_mixture():
+    rng = np.random.default_rng(7)
+    samples = np.concatenate([rng.normal(-3, 1, size=(3000, 2)), rng.normal(2, 0.5, size=(1000, 2))])
+    mixture = distribution(samples).to_mixture(2, random_state=0)
+    assert isinstance(mixture.model, GaussianMixture)
+    assert np.allclose(mixture.mean(), samples.mean(axis=0), atol=1e-2)
+    assert np.allclose(mixture.cov(), np.cov(samples.T), atol=5e-2)
+    assert np.allclose(mixture.skew(), st.skew(samples), atol=0.1)
+    x = rng.normal(size=(30, 2))
+    components = [st.multivariate_normal(m, c) for m, c in zip(mixture.model.means, mixture.model.covs)]
+    expected = sum(w * c.pdf(x) for w, c in zip(mixture.model.weights, components))
+    assert np.allclose(mixture.pdf(x), expected)
+    assert np.allclose(mixture.logpdf(x), np.log(expected))
+    # stratified sampling draws the expected number of samples from every component
+    weights = np.array([0.25, 0.75])
+    model = GaussianMixture(weights, [[-100.0], [100.0]], [[[1.0]], [[1.0]]])
+    for method in ["random", "sobol"]:
+        drawn = distribution(model).sample(1000, 1, method=method)
+        assert np.sum(drawn < 0) == 250
+
+
+def test_sample_parallel():
+    rng = np.random.default_rng(8)
+    distribs = [distribution(rng.normal(size=(200, 2))), distribution(rng.normal(size=(100, 2)), "Normal"),
+                distribution(st.multivariate_normal(np.zeros(2), np.eye(2))),
+                distribution(GaussianModel(np.ones(2), np.eye(2)))]
+    serial = sample_parallel(distribs, 50, seed=3)
+    for workers, executor in [(3, "thread"), (2, "process")]:
+        parallel = sample_parallel(distribs, 50, seed=3, workers=workers, executor=executor)
+        assert all(np.array_equal(a, b) for a, b in zip(serial, parallel))
+    # the samples of a distribution do not depend on the other distributions
+    assert np.array_equal(sample_parallel(distribs[:2], 50, seed=3)[1], serial[1])
+    assert not np.array_equal(serial[2], serial[3] - 1)
+
+
+def test_float32():
+    samples = np.random.default_rng(9).normal(size=(400, 3))
+    distrib = distribution(samples, dtype=np.float32)
+    assert distrib.model.dtype == np.float32
+    for moment in [distrib.mean(), distrib.cov(), distrib.skew(), distrib.kurt()]:
+        assert moment.dtype == np.float32
+    assert np.allclose(distrib.cov(), np.cov(samples.T), atol=1e-5)
+    x = samples[:10]
+    assert distrib.pdf(x).dtype == np.float32
+    assert distrib.pdf(x, max_memory=2**10).dtype == np.float32
+    assert distrib.sample(5, 0).dtype == np.float32
+    for validate in [False, True]:
+        model = GaussianModel(np.zeros(3, dtype=np.float32), np.eye(3, dtype=np.float32), validate=validate)
+        assert model.mean.dtype == np.float32 and model.cov.dtype == np.float32
+        assert model.logpdf(x).dtype == np.float32
+        assert model.rvs(4, 0).dtype == np.float32
+    distribs = [distribution(samples), distribution(samples + 2)]
+    projected = uadapy.dr.uapca(distribs, 2, dtype=np.float32)
+    assert projected[0].mean().dtype == np.float32
+    expected = uadapy.dr.uapca(distribs, 2)
+    assert np.allclose(np.abs(projected[1].cov()), np.abs(expected[1].cov()), atol=1e-4)
+    projected = uadapy.dr.uamds(distribs + [distribution(samples * 2)], 2, dtype=np.float32)
+    assert projected[0].cov().dtype == np.float32
+
+
+def test_quantile_sketch():
+    rng = np.random.default_rng(0)
+    samples = rng.normal(size=(200_000, 2))
+    q = np.linspace(0.01, 0.99, 25)
+    sketch = QuantileSketch.from_samples(samples, chunk_size=10_000, random_state=0)
+    assert sum(level.shape[0] for level in sketch.levels) < 1000
+    assert np.abs(st.norm.cdf(sketch.quantile(q)) - q[:, np.newaxis]).max() < 0.03
+    # merging the sketches of two halves approximates the sketch of all samples
+    merged = QuantileSketch.from_samples(samples[:100_000], random_state=1)
+    merged.merge(QuantileSketch.from_samples(samples[100_000:], random_state=2))
+    assert merged.n == samples.shape[0]
+    assert np.abs(merged.cdf(np.zeros((1, 2))) - 0.5).max() < 0.03
+    # small sample sets are never compacted, so the results are exact
+    exact = QuantileSketch.from_samples(samples[:101])
+    assert np.allclose(exact.quantile(0.5), np.median(samples[:101], axis=0))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'samples.npy')
+        np.save(path, samples)
+        distrib = distribution(path, chunk_size=10_000)
+        assert distrib.quantile(q).shape == (25, 2)
+        assert np.abs(distrib.cdf(distrib.quantile(q)) - q[:, np.newaxis]).max() < 0.03
+        del distrib
+
+    distrib = distribution(samples[:, 0])
+    distrib.quantile(0.5)
+    distrib.update(rng.normal(size=200_000) + 10)
+    assert distrib.sketch.n == 400_000
+    assert abs(distrib.cdf([5.0])[0] - 0.5) < 0.03
+
+    normal = distribution(GaussianModel(np.zeros(2), np.diag([1.0, 4.0])))
+    assert np.allclose(normal.quantile(0.975), [1.959964, 3.919928])
+    assert np.allclose(normal.cdf(normal.quantile(q)), q[:, np.newaxis])
+    mixture = distribution(GaussianMixture([0.3, 0.7], [[-2, 0], [2, 1]], [np.eye(2)] * 2))
+    assert np.allclose(mixture.cdf(mixture.quantile(q)), q[:, np.newaxis], atol=1e-8)
+
+
+def test_compression():
+    rng = np.random.default_rng(0)
+    samples = np.concatenate([rng.normal(size=(30_000, 2)), rng.normal(size=(20_000, 2)) * 0.5 + 3])
+    full = distribution(samples)
+    points = samples[:5]
+    for method in ('kmeans', 'herding', 'thin'):
+        distrib = distribution(samples, compress=method, budget=200)
+        assert distrib.kde.n <= 200
+        assert np.isclose(distrib.kde.weights.sum(), 1)
+        assert np.allclose(distrib.mean(), full.mean())
+        assert distrib.compression_error(200, 0) < 0.5
+    distrib = distribution(samples, compress='kmeans', budget=200)
+    assert distrib.compression_error(200, 0) < 0.1
+    assert np.allclose(distrib.pdf(points), full.pdf(points), rtol=0.2)
+    # quasi-Monte Carlo samples are drawn from the compressed KDE as well
+    qmc_samples = distrib.sample(1024, 0, method='sobol')
+    assert np.array_equal(qmc_samples, sample_kde(distrib.kde, 1024, 0, 'sobol'))
+    assert np.allclose(qmc_samples.mean(axis=0), full.mean(), atol=0.1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'samples.npy')
+        np.save(path, samples)
+        distrib = distribution(path, chunk_size=10_000, compress='kmeans', budget=200)
+        assert np.allclose(distrib.pdf(points), full.pdf(points), rtol=0.2)
+        assert np.array_equal(distrib.sample(16, 0, method='halton'), sample_kde(distrib.kde, 16, 0, 'halton'))
+        del distrib
+
+
+def test_structured_covariance():
+    rng = np.random.default_rng(0)
+    d = 5
+    variances = rng.uniform(0.5, 2, d)
+    for cov in [DiagonalCovariance(variances), LowRankCovariance(rng.normal(size=(d, 2)), variances)]:
+        model = GaussianModel(np.zeros(d), cov)
+        x = rng.normal(size=(4, d))
+        assert np.allclose(model.logpdf(x), st.multivariate_normal(np.zeros(d), cov.dense()).logpdf(x))
+        assert np.allclose(np.cov(model.rvs(100_000, 0).T), cov.dense(), atol=0.05)
+        distrib = distribution(model)
+        assert distrib.cov(structured=True) is cov
+        assert np.allclose(distrib.cov(), cov.dense())
+
+
+if __name__ == '__main__':
+    test_distrib_class()
+    test_moment_cache()
+    test_lazy_kde()
+    test_binned_pdf()
+    test_tree_pdf()
+    test_chunked_pdf()
+    test_memory_mapped_samples()
+    test_update()
+    test_qmc_sampling()
+    test_logpdf()
+    test_model_registry()
+    test_gaussian_model()
+    test_gaussian_mixture()
+    test_sample_parallel()
+    test_float32()
+    test_quantile_sketch()
+    test_compression()
+    test_structured_covariance()
@@ -0,0 +1,90 @@
+# make script aware of parent directory where uadapy is located
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uadapy import distribution, DistributionSet
+import uadapy.dr
+import numpy as np
+import scipy.stats as st
+
+
+def make_set(n=5, d=3, seed=0):
+    rng = np.random.default_rng(seed)
+    means = rng.normal(size=(n, d))
+    a = rng.normal(size=(n, d, d))
+    covs = a @ a.transpose(0, 2, 1) + np.eye(d)
+    return DistributionSet(means, covs)
+
+
+def test_distribution_set_moments_and_pdf():
+    dist_set = make_set()
+    x = np.random.default_rng(1).normal(size=(7, 3))
+    pdf = dist_set.pdf(x)
+    assert pdf.shape == (5, 7)
+    for i, d in enumerate(dist_set):
+        assert np.allclose(d.mean(), dist_set.mean()[i])
+        assert np.allclose(d.cov(), dist_set.cov()[i])
+        assert np.allclose(d.pdf(x), pdf[i])
+
+
+def test_distribution_set_logpdf():
+    dist_set = make_set()
+    x = np.random.default_rng(2).normal(size=(7, 3)) * 50
+    logpdf = dist_set.logpdf(x)
+    for i in range(len(dist_set)):
+        expected = st.multivariate_normal(dist_set.means[i], dist_set.covs[i]).logpdf(x)
+        assert np.allclose(logpdf[i], expected)
+
+
+def test_distribution_set_singular_logpdf():
+    rng = np.random.default_rng(3)
+    a = rng.normal(size=(3, 2))
+    singular = a @ a.T
+    dist_set = DistributionSet(np.zeros((2, 3)), np.stack([singular, np.eye(3)]))
+    # points on the support of the degenerate distribution and one point off it
+    x = np.concatenate([rng.normal(size=(5, 2)) @ a.T, np.cross(a[:, 0], a[:, 1])[np.newaxis, :]])
+    logpdf = dist_set.logpdf(x)
+    expected = st.multivariate_normal(np.zeros(3), singular, allow_singular=True).logpdf(x[:5])
+    assert np.allclose(logpdf[0, :5], expected)
+    assert logpdf[0, 5] == -np.inf
+    assert np.allclose(logpdf[1], st.multivariate_normal(np.zeros(3), np.eye(3)).logpdf(x))
+    assert np.allclose(dist_set.pdf(x)[0, :5], np.exp(expected))
+
+
+def test_distribution_set_sample():
+    dist_set = make_set()
+    samples = dist_set.sample(20_000, random_state=3)
+    assert samples.shape == (5, 20_000, 3)
+    assert np.allclose(samples.mean(axis=1), dist_set.means, atol=0.1)
+    assert np.allclose(np.cov(samples[2].T), dist_set.covs[2], atol=0.2)
+
+
+def test_distribution_set_independent_streams():
+    dist_set = make_set()
+    factors = dist_set.factors
+    samples = dist_set.sample(100, random_state=7, independent=True)
+    assert dist_set.factors is factors
+    assert np.allclose(factors @ factors.transpose(0, 2, 1), dist_set.covs)
+    # the stream of a distribution does not depend on the size of the set
+    assert np.array_equal(dist_set[:2].sample(100, random_state=7, independent=True), samples[:2])
+    assert np.array_equal(dist_set.sample(100, random_state=7, independent=True), samples)
+
+
+def test_distribution_set_from_distributions():
+    distribs = [distribution(st.multivariate_normal(np.ones(2) * i, np.eye(2))) for i in range(3)]
+    dist_set = DistributionSet.from_distributions(distribs)
+    assert dist_set.means.shape == (3, 2)
+    assert dist_set.covs.shape == (3, 2, 2)
+    assert len(dist_set[1:]) == 2
+
+
+def test_dr_with_distribution_set():
+    dist_set = make_set(n=4, d=3)
+    projected = uadapy.dr.uapca(dist_set, dims=2)
+    assert isinstance(projected, DistributionSet)
+    assert projected.means.shape == (4, 2)
+    expected = uadapy.dr.uapca(list(dist_set), dims=2)
+    assert np.allclose(projected.covs, np.array([d.cov() for d in expected]))
+    projected = uadapy.dr.uamds(dist_set, dims=2)
+    assert isinstance(projected, DistributionSet)
+    assert projected.covs.shape == (4, 2, 2)
@@ -0,0 +1,206 @@
+# make script aware of parent directory where uadapy is located
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uadapy import distribution, DistributionSet
+from uadapy.gaussian import GaussianModel
+from uadapy.covariance import DiagonalCovariance, LowRankCovariance
+from uadapy.dr.uapca import UAPCA, IncrementalUAPCA, transform_uapca, compute_uapca, compute_ua_cov
+import uadapy.dr
+import numpy as np
+
+# uadapy.dr.uamds is the function, the module defining it holds the kernels
+uamds_module = sys.modules[uadapy.dr.apply_uamds.__module__]
+
+
+def test_uapca_solvers():
+    rng = np.random.default_rng(0)
+    n, d, r = 30, 300, 4
+    factors = rng.normal(size=(n, d, r)) * 0.1
+    means = rng.normal(size=(n, d))
+    means[:, :3] *= 10
+    covs = np.einsum('idr,ier->ide', factors, factors)
+    expected_means, expected_covs = transform_uapca(means, covs, 3, solver="full")
+    assert expected_covs.shape == (n, 3, 3)
+    for solver, kwargs in [("eigh", {'covs': covs}), ("randomized", {'covs': covs}),
+                           ("randomized", {'covs': None, 'factors': factors})]:
+        projected_means, projected_covs = transform_uapca(means, dims=3, solver=solver, **kwargs)
+        # the principal axes are unique up to their signs
+        signs = np.sign(np.sum(projected_means * expected_means, axis=0))
+        assert np.allclose(projected_means * signs, expected_means, atol=1e-4)
+        assert np.allclose(projected_covs * np.outer(signs, signs), expected_covs, atol=1e-4)
+    stacked_means, stacked_covs = transform_uapca(means[:, :5], covs[:, :5, :5].reshape((n * 5, 5)), 2)
+    assert stacked_covs.shape == (n * 2, 2)
+
+
+def test_uapca_all_axes():
+    # without dims all d axes are computed by every solver
+    rng = np.random.default_rng(0)
+    n, d = 20, 5
+    factors = rng.normal(size=(n, d, d))
+    means = rng.normal(size=(n, d))
+    covs = factors @ factors.transpose(0, 2, 1)
+    _, expected_variances = compute_uapca(means, covs)
+    for solver in ["eigh", "randomized"]:
+        axes, variances = compute_uapca(means, covs, solver=solver)
+        assert axes.shape == (d, d)
+        assert np.allclose(variances, expected_variances)
+        assert np.allclose(axes.T @ axes, np.eye(d))
+
+
+def test_uapca_flat_spectrum():
+    # without dominant directions the randomized solver is inaccurate, so the exact solver is the default
+    rng = np.random.default_rng(0)
+    n, d = 200, 400
+    means = rng.normal(size=(n, d))
+    factors = rng.normal(size=(n, d, 2)) * 0.1
+    expected_means, expected_covs = transform_uapca(means, None, 2, solver="full", factors=factors)
+    for solver in [None, "eigh"]:
+        kwargs = {} if solver is None else {'solver': solver}
+        projected_means, projected_covs = transform_uapca(means, None, 2, factors=factors, **kwargs)
+        signs = np.sign(np.sum(projected_means * expected_means, axis=0))
+        assert np.allclose(projected_means * signs, expected_means)
+        assert np.allclose(projected_covs * np.outer(signs, signs), expected_covs)
+    # the randomized solver is opt-in and only approximates the principal subspace, the variance it
+    # captures is at most the optimal one and here within 5% of it
+    approximate_means, approximate_covs = transform_uapca(means, None, 2, solver="randomized", factors=factors)
+    captured = np.trace(compute_ua_cov(approximate_means, approximate_covs))
+    optimal = np.trace(compute_ua_cov(expected_means, expected_covs))
+    assert 0.95 * optimal < captured <= optimal * (1 + 1e-10)
+
+
+def test_incremental_uapca():
+    rng = np.random.default_rng(0)
+    n, d = 60, 6
+    factors = rng.normal(size=(n, d, d))
+    dist_set = DistributionSet(rng.normal(size=(n, d)) * 3, factors @ factors.transpose(0, 2, 1) / d)
+    estimator = IncrementalUAPCA(2)
+    for start in range(0, n, 25):
+        estimator.partial_fit(dist_set[start:start + 25])
+    assert estimator.n == n
+    expected_means, expected_covs = transform_uapca(dist_set.means, dist_set.covs, 2)
+    projected = estimator.transform(dist_set)
+    signs = np.sign(np.sum(projected.means * expected_means, axis=0))
+    assert np.allclose(projected.means * signs, expected_means)
+    assert np.allclose(projected.covs * np.outer(signs, signs), expected_covs)
+    # shards fitted separately and merged give the same statistics
+    merged = IncrementalUAPCA(2).partial_fit(dist_set[:30]).merge(IncrementalUAPCA(2).partial_fit(list(dist_set[30:])))
+    assert np.allclose(merged.ua_cov(), estimator.ua_cov())
+    assert len(estimator.transform(list(dist_set[:3]))) == 3
+
+
+def test_uapca_estimator():
+    rng = np.random.default_rng(0)
+    n, d = 40, 5
+    factors = rng.normal(size=(n, d, d))
+    dist_set = DistributionSet(rng.normal(size=(n, d)) * 3, factors @ factors.transpose(0, 2, 1) / d)
+    estimator = UAPCA(2)
+    projected = estimator.fit_transform(dist_set)
+    assert projected.means.shape == (n, 2)
+    expected_means, expected_covs = transform_uapca(dist_set.means, dist_set.covs, 3)
+    # projecting onto more dimensions slices the cached basis
+    projected = estimator.transform(dist_set, dims=3)
+    assert np.allclose(projected.means, expected_means)
+    assert np.allclose(projected.covs, expected_covs)
+    new = estimator.transform(list(dist_set[:4]))
+    assert np.allclose(new[1].mean(), expected_means[1, :2])
+    try:
+        UAPCA(2, solver="eigh").fit(dist_set).transform(dist_set, dims=3)
+        assert False
+    except ValueError:
+        pass
+
+
+def test_uapca_structured_covariance():
+    # UAPCA on structured covariance matrices matches the dense computation
+    rng = np.random.default_rng(0)
+    d = 5
+    for make_cov in [lambda: DiagonalCovariance(rng.uniform(0.5, 2, d)),
+                     lambda: LowRankCovariance(rng.normal(size=(d, 2)), 0.3)]:
+        structured = [distribution(GaussianModel(rng.normal(size=d) * 3, make_cov())) for _ in range(20)]
+        dense = [distribution(GaussianModel(s.mean(), s.cov())) for s in structured]
+        projected, expected = uadapy.dr.uapca(structured, 2), uadapy.dr.uapca(dense, 2)
+        for p, e in zip(projected, expected):
+            assert np.allclose(p.mean(), e.mean())
+            assert np.allclose(p.cov(), e.cov())
+
+
+def test_uamds_on_the_fly():
+    rng = np.random.default_rng(0)
+    n, d = 6, 4
+    covs = [np.cov(rng.normal(size=(d, 20))) for _ in range(n)]
+    spec = uamds_module.mk_normal_distr_spec([rng.normal(size=d) for _ in range(n)], covs)
+    transforms = rng.random((spec.shape[0], 2))
+    precomputed = uamds_module.precalculate_constants(spec, "precomputed")
+    on_the_fly = uamds_module.precalculate_constants(spec, "on_the_fly")
+    assert on_the_fly[9].size == 0
+    assert np.isclose(uamds_module.stress(spec, transforms, precomputed),
+                      uamds_module.stress(spec, transforms, on_the_fly))
+    assert np.allclose(uamds_module.gradient(spec, transforms, precomputed),
+                       uamds_module.gradient(spec, transforms, on_the_fly))
+
+    # 'auto' computes the pair terms on the fly if they exceed the memory budget
+    assert sum(c.nbytes for c in precomputed) == uamds_module.estimate_constants_memory(n, d)
+    budget = uamds_module.estimate_constants_memory(n, d) - 1
+    assert uamds_module.precalculate_constants(spec, max_memory=budget)[9].size == 0
+    projected = uadapy.dr.uamds([distribution(GaussianModel(rng.normal(size=d), c)) for c in covs], 2, mode="on_the_fly")
+    assert len(projected) == n and projected[0].dim == 2
+
+
+def test_uamds_decompose():
+    # UAMDS skips the decomposition of diagonal covariance matrices
+    rng = np.random.default_rng(0)
+    d = 5
+    variances = rng.uniform(0.5, 2, d)
+    covs = np.stack([np.diag(variances), np.cov(rng.normal(size=(d, 20)))])
+    U, s = uamds_module._decompose(covs)
+    assert np.allclose(U[0], np.eye(d)) and np.allclose(s[0], variances)
+    assert np.allclose(U @ (s[:, :, np.newaxis] * U.transpose(0, 2, 1)), covs)
+    # low-rank covariance matrices with isotropic variances are decomposed from their factors
+    factors = rng.normal(size=(3, d, 2))
+    variances = np.repeat([[0.0], [0.5], [1.0]], d, axis=1)
+    covs = factors @ factors.transpose(0, 2, 1) + variances[:, :, np.newaxis] * np.eye(d)
+    U, s = uamds_module._decompose(covs, factors, variances)
+    assert np.allclose(U.transpose(0, 2, 1) @ U, np.eye(d))
+    assert np.allclose(U @ (s[:, :, np.newaxis] * U.transpose(0, 2, 1)), covs)
+    assert np.allclose(s, uamds_module._decompose(covs)[1])
+
+
+def test_uamds_low_rank():
+    # the constants, the projection and the affine transforms use the same decomposition of the factors
+    rng = np.random.default_rng(0)
+    n, d = 8, 6
+    means = rng.normal(size=(n, d)) * 3
+    factors = rng.normal(size=(n, d, 2))
+    variances = np.full((n, d), 0.3)
+    covs = factors @ factors.transpose(0, 2, 1) + 0.3 * np.eye(d)
+    result = uadapy.dr.apply_uamds(means, None, factors=factors, variances=variances)
+    for i in range(n):
+        projection, translation = result['projections'][i], result['translations'][i]
+        assert np.allclose(result['means'][i], means[i] @ projection + translation)
+        assert np.allclose(result['covs'][i], projection.T @ covs[i] @ projection)
+    distribs = [distribution(GaussianModel(m, LowRankCovariance(f, 0.3))) for m, f in zip(means, factors)]
+    projected = uadapy.dr.uamds(distribs)
+    assert len(projected) == n and projected[0].dim == 2
+
+
+def test_dr_dtype():
+    # both methods compute in the type of the moments unless dtype is given
+    rng = np.random.default_rng(0)
+    dist_set = DistributionSet(rng.normal(size=(4, 3)).astype(np.float32), np.stack([np.eye(3, dtype=np.float32)] * 4))
+    for method in [uadapy.dr.uapca, uadapy.dr.uamds]:
+        assert method(dist_set, 2).covs.dtype == np.float32
+        assert method(dist_set, 2, dtype=np.float64).covs.dtype == np.float64
+
+
+if __name__ == '__main__':
+    test_uapca_solvers()
+    test_uapca_all_axes()
+    test_uapca_flat_spectrum()
+    test_incremental_uapca()
+    test_uapca_estimator()
+    test_uapca_structured_covariance()
+    test_uamds_on_the_fly()
+    test_uamds_decompose()
+    test_uamds_low_rank()
+    test_dr_dtype()
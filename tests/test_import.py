@@ -0,0 +1,77 @@
+# make script aware of parent directory where uadapy is located
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import subprocess
+
+# import uadapy should only load numpy, see docs/installation.rst
+HEAVY_MODULES = ['scipy.stats', 'scipy.linalg', 'numba', 'sklearn', 'matplotlib', 'seaborn', 'glasbey']
+# target for a cold import uadapy without numpy and scipy in seconds, see docs/installation.rst
+IMPORT_TIME_TARGET = 0.5
+
+
+def loaded_modules(statement: str) -> list[str]:
+    # a fresh interpreter, so that the modules imported by other tests do not count
+    code = f"import sys, json\n{statement}\nprint(json.dumps(list(sys.modules)))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def import_time(statement: str) -> float:
+    # sum of the self times reported by -X importtime, numpy and scipy are not counted
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], cwd=root,
+                            capture_output=True, text=True, check=True)
+    total = 0
+    for line in output.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, _, module = line[len('import time:'):].split('|')
+        if module.strip().split('.')[0] not in ('numpy', 'scipy'):
+            total += int(self_time)
+    return total * 1e-6
+
+
+def test_import_is_lazy():
+    for statement in ["import uadapy", "import uadapy.dr", "from uadapy.dr import uapca"]:
+        loaded = loaded_modules(statement)
+        assert not [m for m in HEAVY_MODULES if m in loaded], statement
+    # the heavy dependencies are loaded on first use
+    loaded = loaded_modules("import uadapy.dr\nuadapy.dr.uamds")
+    assert 'numba' in loaded
+
+
+def test_import_time():
+    # best of three, so that a busy machine does not fail the test
+    assert min(import_time("import uadapy") for _ in range(3)) < IMPORT_TIME_TARGET
+
+
+def test_star_import():
+    namespace = {}
+    exec("from uadapy.dr import *", namespace)
+    for name in ['uamds', 'apply_uamds', 'uapca', 'compute_uapca', 'transform_uapca', 'UAPCA']:
+        assert callable(namespace[name]), name
+    assert not [name for name in ['importlib', 'sys', 'types'] if name in namespace]
+
+
+def test_submodule_import():
+    # importing the submodules first must not replace the functions of the same name
+    call = ("from uadapy import distribution\n"
+            "import numpy as np\n"
+            "distribs = [distribution(np.eye(3) * (i + 1), 'Normal') for i in range(3)]\n"
+            "assert uamds(distribs, dims=2)[0].dim == 2\n"
+            "assert uapca(distribs, dims=2)[0].dim == 2")
+    for statement in ["import uadapy.dr.uamds as uamds\nimport uadapy.dr.uapca as uapca",
+                      "from uadapy.dr.uamds import stress\nfrom uadapy.dr.uapca import compute_uapca\n"
+                      "from uadapy.dr import uamds, uapca",
+                      "import uadapy.dr.uamds, uadapy.dr.uapca\nfrom uadapy.dr import uamds, uapca"]:
+        loaded_modules(f"{statement}\n{call}")
+
+
+if __name__ == '__main__':
+    test_import_is_lazy()
+    test_import_time()
+    test_star_import()
+    test_submodule_import()
@@ -0,0 +1,78 @@
+# make script aware of parent directory where uadapy is located
+import os, sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+from uadapy import distribution, DistributionSet
+from uadapy.gaussian import GaussianModel, GaussianMixture
+import uadapy.io
+import numpy as np
+import scipy.stats as st
+
+
+def make_distributions():
+    rng = np.random.default_rng(0)
+    return [distribution(GaussianModel(np.ones(2), np.eye(2) * 2), "first"),
+            distribution(rng.normal(size=(500, 2)), "samples"),
+            distribution(st.multivariate_normal(np.zeros(2), [[1.0, 0.5], [0.5, 1.0]])),
+            distribution(GaussianMixture([0.3, 0.7], rng.normal(size=(2, 2)), np.stack([np.eye(2)] * 2))),
+            distribution(rng.normal(size=(200, 2)) + 3)]
+
+
+def test_save_load():
+    distribs = make_distributions()
+    with tempfile.TemporaryDirectory() as path:
+        uadapy.io.save(path, distribs)
+        archive = uadapy.io.load(path)
+        assert len(archive) == len(distribs)
+        assert isinstance(archive.means, np.memmap)
+        for original, loaded in zip(distribs, archive):
+            assert loaded.name == original.name
+            assert np.allclose(loaded.mean(), original.mean())
+            assert np.allclose(loaded.cov(), original.cov())
+        # samples stay memory-mapped and are not read for the moments
+        assert isinstance(archive[1].model, np.memmap)
+        assert np.array_equal(archive[-1].model, distribs[-1].model)
+        assert np.allclose(archive[3].model.weights, distribs[3].model.weights)
+        x = np.random.default_rng(1).normal(size=(10, 2))
+        assert np.allclose(archive[3].pdf(x), distribs[3].pdf(x))
+        assert len(archive[1:3]) == 2
+        dist_set = archive.to_set()
+        assert dist_set.means.shape == (5, 2)
+        del archive, dist_set
+
+
+def test_save_load_distribution_set():
+    rng = np.random.default_rng(2)
+    a = rng.normal(size=(4, 3, 3))
+    dist_set = DistributionSet(rng.normal(size=(4, 3)), a @ a.transpose(0, 2, 1) + np.eye(3))
+    with tempfile.TemporaryDirectory() as path:
+        uadapy.io.save(path, dist_set)
+        archive = uadapy.io.load(path, mmap=False)
+        assert np.array_equal(archive.to_set().covs, dist_set.covs)
+        assert np.allclose(archive[2].pdf(dist_set.means), dist_set[2].pdf(dist_set.means))
+
+
+def test_save_load_univariate():
+    # univariate samples keep their shape, so that the moments are scalars as before saving
+    rng = np.random.default_rng(3)
+    distribs = [distribution(rng.normal(size=300), "samples"), distribution(GaussianModel(1.0, 2.0))]
+    with tempfile.TemporaryDirectory() as path:
+        uadapy.io.save(path, distribs)
+        archive = uadapy.io.load(path)
+        for original, loaded in zip(distribs, archive):
+            assert np.shape(loaded.model) == np.shape(original.model)
+            assert np.shape(loaded.mean()) == np.shape(original.mean())
+            assert np.shape(loaded.cov()) == np.shape(original.cov())
+            assert np.allclose(loaded.mean(), original.mean())
+            assert np.allclose(loaded.cov(), original.cov())
+        assert np.ndim(archive[0].mean()) == 0 and np.ndim(archive[0].cov()) == 0
+        assert isinstance(archive[0].model, np.memmap)
+        assert np.allclose(archive[0].pdf(np.zeros(3)), distribs[0].pdf(np.zeros(3)))
+        del archive
+
+
+if __name__ == '__main__':
+    test_save_load()
+    test_save_load_distribution_set()
+    test_save_load_univariate()
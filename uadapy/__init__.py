@@ -1,3 +1,15 @@
+import importlib
+
 from .distribution import distribution
+from .distribution_set import DistributionSet
+
+__all__ = ['distribution', 'DistributionSet']
+
+# subpackages and modules with heavy dependencies are imported on first access, e.g. uadapy.dr
+_LAZY_SUBMODULES = ('data', 'dr', 'io', 'plotting')
+
 
-__all__ = ['distribution']
+def __getattr__(name: str):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
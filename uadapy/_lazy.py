@@ -0,0 +1,28 @@
+"""
+Lazy imports of heavy dependencies. import uadapy should only load numpy, so scipy, numba, scikit-learn and the
+plotting libraries are imported when a function that needs them is called for the first time.
+"""
+
+import importlib
+
+
+class LazyModule:
+    """
+    Placeholder for a module that is imported on first attribute access, e.g. stats = LazyModule('scipy.stats').
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        # only called for attributes not found on the placeholder itself
+        if attr in ('_name', '_module'):
+            raise AttributeError(attr)
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
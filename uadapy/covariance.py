@@ -0,0 +1,176 @@
+"""
+Structured covariance matrices. Diagonal and low-rank-plus-diagonal covariance matrices are stored
+in O(d) and O(d * r) memory instead of O(d^2), and their densities, samples and projections are computed
+without forming the dense matrix. They can be passed as the covariance matrix of a GaussianModel and are
+returned by distribution.cov(structured=True).
+"""
+
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class StructuredCovariance(ABC):
+    """
+    Abstract base class of the structured covariance matrices.
+    """
+
+    __slots__ = ()
+
+    @property
+    @abstractmethod
+    def latent_dim(self) -> int:
+        """
+        :return: The number of independent standard normal variables that scale() maps to samples
+        """
+
+    @abstractmethod
+    def dense(self) -> np.ndarray:
+        """
+        :return: The dense covariance matrix of shape (d, d)
+        """
+
+    @abstractmethod
+    def diagonal(self) -> np.ndarray:
+        """
+        :return: The variances of shape (d,)
+        """
+
+    @abstractmethod
+    def log_det(self) -> float:
+        """
+        :return: The logarithm of the determinant
+        """
+
+    @abstractmethod
+    def mahalanobis(self, y: np.ndarray) -> np.ndarray:
+        """
+        Computes the squared Mahalanobis norms y^T cov^-1 y.
+        :param y: Centered points of shape (m, d)
+        :return: Array of shape (m,)
+        """
+
+    @abstractmethod
+    def scale(self, z: np.ndarray) -> np.ndarray:
+        """
+        Maps standard normal samples of shape (..., latent_dim) to samples with this covariance matrix.
+        :param z: Standard normal samples of shape (..., latent_dim)
+        :return: Samples of shape (..., d)
+        """
+
+    @abstractmethod
+    def project(self, projmat: np.ndarray) -> np.ndarray:
+        """
+        Projects the covariance matrix onto the columns of a matrix.
+        :param projmat: Matrix of shape (d, k)
+        :return: projmat^T cov projmat of shape (k, k)
+        """
+
+    def __array__(self, dtype=None, copy=None):
+        return self.dense() if dtype is None else self.dense().astype(dtype)
+
+
+class DiagonalCovariance(StructuredCovariance):
+    """
+    Diagonal covariance matrix, i.e., independent dimensions, stored as the vector of variances.
+    """
+
+    __slots__ = ('variances', 'dim')
+
+    def __init__(self, variances: np.ndarray):
+        """
+        :param variances: The variances of shape (d,)
+        """
+        self.variances = np.atleast_1d(np.asarray(variances))
+        self.dim = self.variances.shape[0]
+
+    @property
+    def latent_dim(self) -> int:
+        return self.dim
+
+    def dense(self) -> np.ndarray:
+        return np.diag(self.variances)
+
+    def diagonal(self) -> np.ndarray:
+        return self.variances
+
+    def log_det(self) -> float:
+        return float(np.sum(np.log(self.variances)))
+
+    def mahalanobis(self, y: np.ndarray) -> np.ndarray:
+        return np.einsum('md,md->m', y, y / self.variances)
+
+    def scale(self, z: np.ndarray) -> np.ndarray:
+        return z * np.sqrt(self.variances)
+
+    def project(self, projmat: np.ndarray) -> np.ndarray:
+        return (projmat.T * self.variances) @ projmat
+
+
+class LowRankCovariance(StructuredCovariance):
+    """
+    Covariance matrix W W^T + diag(D) of a low-rank factor W of shape (d, r) and non-negative variances D,
+    e.g. the covariance of a factor analysis or probabilistic PCA model. Densities are computed with the
+    Woodbury identity in O(d * r^2), which requires positive variances.
+    """
+
+    __slots__ = ('factor', 'variances', 'dim', 'rank')
+
+    def __init__(self, factor: np.ndarray, variances: np.ndarray | float = 0.0):
+        """
+        :param factor: The low-rank factor W of shape (d, r)
+        :param variances: The variances D of shape (d,) or a scalar for isotropic noise
+        """
+        self.factor = np.asarray(factor).reshape((np.shape(factor)[0], -1))
+        self.dim, self.rank = self.factor.shape
+        self.variances = np.broadcast_to(np.asarray(variances, dtype=self.factor.dtype), (self.dim,)).copy()
+
+    @property
+    def latent_dim(self) -> int:
+        return self.rank + self.dim
+
+    def dense(self) -> np.ndarray:
+        return self.factor @ self.factor.T + np.diag(self.variances)
+
+    def diagonal(self) -> np.ndarray:
+        return np.einsum('dr,dr->d', self.factor, self.factor) + self.variances
+
+    def _capacitance(self) -> np.ndarray:
+        if np.any(self.variances <= 0):
+            raise ValueError("The density of a low-rank covariance matrix needs positive variances")
+        scaled = self.factor.T / self.variances
+        return np.eye(self.rank) + scaled @ self.factor
+
+    def log_det(self) -> float:
+        # matrix determinant lemma: det(W W^T + D) = det(I + W^T D^-1 W) det(D)
+        return float(np.linalg.slogdet(self._capacitance())[1] + np.sum(np.log(self.variances)))
+
+    def mahalanobis(self, y: np.ndarray) -> np.ndarray:
+        # Woodbury identity: (W W^T + D)^-1 = D^-1 - D^-1 W (I + W^T D^-1 W)^-1 W^T D^-1
+        scaled = y / self.variances
+        projected = scaled @ self.factor
+        correction = np.linalg.solve(self._capacitance(), projected.T).T
+        return np.einsum('md,md->m', y, scaled) - np.einsum('mr,mr->m', projected, correction)
+
+    def scale(self, z: np.ndarray) -> np.ndarray:
+        return z[..., :self.rank] @ self.factor.T + z[..., self.rank:] * np.sqrt(self.variances)
+
+    def project(self, projmat: np.ndarray) -> np.ndarray:
+        projected = self.factor.T @ projmat
+        return projected.T @ projected + (projmat.T * self.variances) @ projmat
+
+
+def stack_covariances(covs: list) -> tuple[np.ndarray | None, np.ndarray | None, np.ndarray | None]:
+    """
+    Stacks the covariance matrices of n distributions, keeping their structure if all of them share it.
+    :param covs: List of dense matrices or structured covariance matrices of the same dimensionality
+    :return: Tuple (covs, factors, variances) of dense matrices of shape (n, d, d), low-rank factors of
+        shape (n, d, r) and variances of shape (n, d), where the covariance matrix of distribution i is
+        covs[i] if covs is not None, otherwise factors[i] factors[i]^T + diag(variances[i]) for the
+        entries that are not None
+    """
+    if all(isinstance(cov, DiagonalCovariance) for cov in covs):
+        return None, None, np.stack([cov.variances for cov in covs])
+    if all(isinstance(cov, LowRankCovariance) for cov in covs) and len({cov.rank for cov in covs}) == 1:
+        return None, np.stack([cov.factor for cov in covs]), np.stack([cov.variances for cov in covs])
+    return np.stack([np.asarray(cov) for cov in covs]), None, None
@@ -1,6 +1,8 @@
-from sklearn import datasets
 import numpy as np
 from uadapy import distribution
+from uadapy._lazy import LazyModule
+
+datasets = LazyModule('sklearn.datasets')
 
 def load_iris_normal():
     """
@@ -1,102 +1,595 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import scipy as sp
-from scipy import stats
-from scipy.stats import _multivariate as mv
+from uadapy._lazy import LazyModule
+from uadapy.kde import binned_pdf, resample_rows, sample_kde, coreset, KDETree
+from uadapy.sampling import qmc_normal
+from uadapy.streaming import RunningMoments, QuantileSketch, cholesky_update
+from uadapy.registry import register_model, resolve_accessors
+from uadapy.gaussian import GaussianModel, GaussianMixture
+from uadapy.covariance import StructuredCovariance
+
+stats = LazyModule('scipy.stats')
+special = LazyModule('scipy.special')
 
 
 class distribution:
 
-    def __init__(self, model, name="", dim = 1):
+    def __init__(self, model, name="", dim = 1, chunk_size: int = 2**16, dtype: np.dtype = None,
+                 compress: str = None, budget: int = 1000):
         """
         Creates a distribution, if samples are passed as the first parameter,
         no assumptions about the distribution are made. For the pdf and the sampling,
         a KDE is used. If the name is "Normal", the samples
         are treated as samples of a normal distribution.
-        :param model: A scipy.stats distribution or samples
+        Samples can also be passed as a np.memmap or as the path to a .npy file, which is then
+        memory-mapped. The moments of memory-mapped samples are computed in chunks and sampling
+        only reads the drawn rows, so that the samples never have to be loaded into memory at once.
+        Models of other types can be supported by registering their accessors with
+        uadapy.registry.register_model().
+        :param model: A scipy.stats distribution, samples, or the path to a .npy file with samples
         :param name: The name of the distribution
         :param dim: The dimensionality of the distribution
+        :param chunk_size: Number of rows of memory-mapped samples processed at once
+        :param dtype: Floating point type of the moments, samples and densities, e.g. np.float32 to halve the
+            memory of large sample sets. In-memory samples are converted on construction, memory-mapped
+            samples are kept as they are. The type of the model is used if None.
+        :param compress: Compresses the KDE of sample-based distributions into a weighted KDE over at most
+            budget points, so that densities cost O(budget) instead of O(n) per point. "kmeans" uses
+            weighted k-means centers, "herding" kernel herding and "thin" a random subset of the samples,
+            see uadapy.kde.coreset. The moments, quantiles and the samples themselves are not affected.
+            The error can be checked with compression_error().
+        :param budget: Maximum number of points of the compressed KDE
         """
+        self._moments = {}
+        self._kde = None
+        self._kde_tree = None
+        self._running = None
+        self._scatter_factor = None
+        self._sketch = None
+        self._coreset = None
+        self._squeeze = False
+        self.chunk_size = chunk_size
+        self.compress = compress
+        self.budget = budget
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        if isinstance(model, (str, os.PathLike)):
+            model = np.load(model, mmap_mode='r')
+        if self.dtype is not None and isinstance(model, np.ndarray) and not isinstance(model, np.memmap):
+            model = model.astype(self.dtype, copy=False)
         if name:
             self.name = name
         else:
             self.name = model.__class__.__name__
         if isinstance(model, np.ndarray) and name == "Normal":
-            mean = np.mean(model, axis=0)
-            cov = np.cov(model, rowvar=False)
-            self.model = stats.multivariate_normal(mean, cov)
+            self.model = None
+            self._running = RunningMoments.from_samples(model, chunk_size)
+            self._accessors = resolve_accessors(None, GaussianModel)
         else:
             self.model = model
-        mean = self.mean()
-        if isinstance(mean, np.ndarray):
-            self.dim = len(self.mean())
-        else:
-            self.dim = 1
-        self.kde = None
         if isinstance(self.model, np.ndarray):
-            self.kde = stats.gaussian_kde(self.model.T)
+            self.dim = self.model.shape[1] if self.model.ndim > 1 else 1
+        else:
+            mean = self.mean()
+            if isinstance(mean, np.ndarray):
+                self.dim = len(mean)
+            else:
+                self.dim = 1
+        if compress is not None and isinstance(self.model, np.ndarray):
+            self._compress()
 
-    def sample(self, n: int, random_state: int = None) -> np.ndarray:
-        if isinstance(self.model, np.ndarray):
-            return self.kde.resample(n, random_state).T
-        if hasattr(self.model, 'rvs') and callable(self.model.rvs):
-            return self.model.rvs(size=n, random_state=random_state)
-        if hasattr(self.model, 'resample') and callable(self.model.resample):
-            return self.model.resample(size=n, seed=random_state)
+    def __getstate__(self):
+        # the accessor functions and compressed KDEs are not picklable, they are resolved or rebuilt after unpickling
+        state = self.__dict__.copy()
+        del state['_accessors']
+        state['_kde'] = None
+        state['_kde_tree'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self._model is None and self._running is not None:
+            self._accessors = resolve_accessors(None, GaussianModel)
+        else:
+            self._accessors = resolve_accessors(self._model)
+
+    @property
+    def kde(self):
+        """
+        The kernel density estimate of a sample-based distribution. It is built on first access,
+        i.e., the first time pdf() or sample() is called, and None for all other models.
+        """
+        if self._kde is None and isinstance(self.model, np.ndarray):
+            if self.compress is None:
+                self._kde = stats.gaussian_kde(self.model.T)
+            else:
+                points, weights = self._coreset or self._compress()
+                kde = stats.gaussian_kde(points.T, weights=weights)
+                # the kernel keeps the bandwidth of the KDE of all samples (Scott's rule for n samples),
+                # scaled for the covariance of the weighted points being smaller than the one of the samples
+                cov = np.atleast_2d(self.cov())
+                ratio = np.linalg.det(cov) / np.linalg.det(kde.covariance / kde.factor**2)
+                kde.set_bandwidth(self.model.shape[0] ** (-1.0 / (self.dim + 4)) * ratio ** (0.5 / self.dim))
+                self._kde = kde
+        return self._kde
+
+    def _compress(self) -> tuple[np.ndarray, np.ndarray]:
+        self._coreset = coreset(self.model, self.budget, self.compress, np.atleast_2d(self.cov()), 0, self.chunk_size)
+        return self._coreset
+
+    def compression_error(self, n: int = 1000, random_state=None) -> float:
+        """
+        Estimates the L1 distance between the compressed KDE and the KDE of all samples, i.e., the integral
+        of the absolute difference of the densities, which lies between 0 and 2. It is the mean of
+        |p_compressed(x) - p(x)| / p(x) over n points x drawn from the KDE of all samples. The full KDE is
+        evaluated at these points, which costs O(n * N) for N samples.
+        :param n: Number of points
+        :param random_state: Seed or generator for the random number generator
+        :return: The estimated L1 distance, 0 for distributions that are not compressed
+        """
+        if self.compress is None or not isinstance(self.model, np.ndarray):
+            return 0.0
+        points = resample_rows(self.model, n, self.cov(), random_state)
+        full = stats.gaussian_kde(self.model.T).pdf(points.reshape((n, self.dim)).T)
+        compressed = self.kde.pdf(points.reshape((n, self.dim)).T)
+        return float(np.mean(np.abs(compressed - full) / full))
+
+    @property
+    def sketch(self) -> QuantileSketch:
+        """
+        Quantile sketch of the marginal distributions of a sample-based distribution, used by quantile()
+        and cdf(). It is built on first access in one pass over the samples, memory-mapped samples are read
+        in chunks of chunk_size rows, and kept up to date by update(). None for all other models.
+        """
+        if self._sketch is None and isinstance(self.model, np.ndarray):
+            self._sketch = QuantileSketch.from_samples(self.model, self.chunk_size)
+        return self._sketch
+
+    @property
+    def model(self):
+        if self._model is None and self._running is not None:
+            # normal distribution fitted to samples, refitted lazily after updates
+            factor = self._scatter_factor
+            if factor is not None:
+                factor = factor / np.sqrt(self._running.n - 1)
+            self._model = GaussianModel(self._running.mean, self._running.cov(), validate=False, factor=factor)
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+        self._running = None
+        self._scatter_factor = None
+        # the accessor functions are resolved once per model type instead of probing the model on every call
+        self._accessors = resolve_accessors(model)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Clears the cached moments and the kernel density estimate. Assigning a new model does this
+        automatically, call this method after modifying the samples of a sample-based distribution in place.
+        """
+        self._moments.clear()
+        self._kde = None
+        self._kde_tree = None
+        self._sketch = None
+        self._coreset = None
+        if isinstance(self._model, np.ndarray):
+            self._running = None
+
+    def update(self, new_samples: np.ndarray):
+        """
+        Adds new samples to a distribution that was created from samples. The mean, covariance,
+        skewness and kurtosis are updated from running sufficient statistics in O(m * d^2) for m new
+        samples instead of being recomputed from all samples. The KDE, and its compression if enabled, is
+        rebuilt lazily on its next use, an existing quantile sketch is updated with the new samples.
+        For distributions created with name "Normal", only the running statistics are kept and the
+        normal distribution is refitted lazily when it is used next. The Cholesky factor of its covariance
+        matrix is updated with the m new samples in O(m * d^2) (see uadapy.streaming.cholesky_update)
+        instead of being recomputed in O(d^3), after it was computed once by the first update.
+        Memory-mapped samples are loaded into memory when new samples are added.
+        :param new_samples: The new samples, array of shape (m, d)
+        """
+        if self._running is None:
+            if not isinstance(self._model, np.ndarray):
+                raise ValueError(f"Only distributions created from samples can be updated. {self.name}")
+            self._running = RunningMoments.from_samples(self._model, self.chunk_size)
+            self._squeeze = self._model.ndim == 1
+        running = self._running
+        sketch = self._sketch
+        new_samples = np.asarray(new_samples)
+        scatter_factor = None
+        if not isinstance(self._model, np.ndarray):
+            scatter_factor = self._update_scatter_factor(new_samples)
+        running.update(new_samples)
+        if sketch is not None:
+            sketch.update(new_samples)
+        if isinstance(self._model, np.ndarray):
+            self._model = np.concatenate([self._model, new_samples.reshape((-1,) + self._model.shape[1:])])
+        else:
+            self._model = None
+        self.invalidate()
+        self._running = running
+        self._scatter_factor = scatter_factor
+        self._sketch = sketch
+        self._store_moments(running, self._squeeze)
+
+    def _update_scatter_factor(self, new_samples: np.ndarray) -> np.ndarray | None:
+        # Cholesky factor of the scatter matrix after adding the new samples, None while it is singular
+        running = self._running
+        factor = self._scatter_factor
+        if factor is None:
+            try:
+                factor = np.linalg.cholesky(running.m2)
+            except np.linalg.LinAlgError:
+                return None
+        rows = np.asarray(new_samples, dtype=float).reshape((-1, running.dim))
+        if rows.shape[0] == 0:
+            return factor
+        # the scatter matrix grows by the scatter of the new samples and the shift of the mean, see RunningMoments.merge
+        mean = rows.mean(axis=0)
+        shift = (mean - running.mean) * np.sqrt(running.n * rows.shape[0] / (running.n + rows.shape[0]))
+        return cholesky_update(factor, np.concatenate([rows - mean, shift[np.newaxis, :]]))
+
+    def _store_moments(self, moments: RunningMoments, squeeze: bool):
+        mean, cov, skew, kurt = moments.mean, moments.cov(), moments.skew(), moments.kurt()
+        if squeeze:
+            mean, cov, skew, kurt = mean[0], cov[0, 0], skew[0], kurt[0]
+        self._moments['mean'] = mean
+        self._moments['cov'] = cov
+        if isinstance(self._model, np.ndarray):
+            self._moments['skew'] = skew
+            self._moments['kurt'] = kurt
+        self._cast_moments()
+
+    def _cast(self, value):
+        if self.dtype is None or value is None:
+            return value
+        return np.asarray(value, dtype=self.dtype)[()]
+
+    def _cast_moments(self):
+        if self.dtype is not None:
+            for key, value in self._moments.items():
+                self._moments[key] = self._cast(value)
+
+    def set_moments(self, mean=None, cov=None):
+        """
+        Stores known moments in the moment cache, e.g. the mean and covariance matrix of samples that were
+        computed before, so that they are not computed from the samples again. Like computed moments, they
+        are cleared by invalidate().
+        :param mean: The mean, a scalar for univariate distributions
+        :param cov: The covariance matrix, a scalar for univariate distributions
+        """
+        for key, value in (('mean', mean), ('cov', cov)):
+            if value is not None:
+                self._moments[key] = self._cast(value)
+
+    def precompute_moments(self):
+        """
+        Computes mean, covariance, skewness and kurtosis and stores them in the moment cache.
+        For sample-based distributions, all moments are computed from one centered copy of the samples.
+        Memory-mapped samples are processed in chunks of chunk_size rows instead.
+        """
+        if isinstance(self.model, np.memmap):
+            self._running = RunningMoments.from_samples(self.model, self.chunk_size)
+            self._squeeze = self.model.ndim == 1
+            self._store_moments(self._running, self._squeeze)
+        elif isinstance(self.model, np.ndarray):
+            mean = np.mean(self.model, axis=0)
+            centered = self.model - mean
+            n = centered.shape[0]
+            if centered.ndim == 1:
+                cov = centered @ centered / (n - 1)
+            else:
+                cov = centered.T @ centered / (n - 1)
+            centered_sq = centered * centered
+            m2 = np.mean(centered_sq, axis=0)
+            m3 = np.mean(centered_sq * centered, axis=0)
+            m4 = np.mean(centered_sq * centered_sq, axis=0)
+            self._moments['mean'] = mean
+            self._moments['cov'] = cov
+            self._moments['skew'] = m3 / m2**1.5
+            self._moments['kurt'] = m4 / m2**2 - 3
+            self._cast_moments()
+        else:
+            self.mean()
+            self.cov()
+            self.skew()
+            self.kurt()
+
+    def sample(self, n: int, random_state: int = None, method: str = "random") -> np.ndarray:
+        """
+        Draws samples from the distribution.
+        :param n: Number of samples
+        :param random_state: Seed or generator for the random number generator
+        :param method: "random" for pseudo-random samples, "sobol" or "halton" for randomized quasi-Monte Carlo
+            samples that cover the distribution more evenly. Quasi-Monte Carlo samples are supported for
+            sample-based distributions (KDE), multivariate normal distributions (mapped through the Cholesky
+            factor of the covariance) and univariate distributions offering ppf (inverse CDF).
+        :return: The samples
+        """
+        if method != "random":
+            samples = self._accessors.sample_qmc(self, n, random_state, method)
+        else:
+            samples = self._accessors.sample(self, n, random_state)
+        if self.dtype is not None:
+            return np.asarray(samples, dtype=self.dtype)
+        return samples
+
+    def pdf(self, x: np.ndarray | float, method: str = "exact", max_memory: int = None, out: np.ndarray = None,
+            workers: int = 1, **kwargs) -> np.ndarray | float:
+        """
+        Evaluates the probability density function at the given points.
+        :param x: The points to evaluate, array of shape (m, d)
+        :param method: Evaluation method for sample-based distributions, ignored for other models.
+            "exact" evaluates the KDE at every point, "binned" bins the samples onto a grid and
+            convolves them with the kernel via FFT (see uadapy.kde.binned_pdf), which is much faster
+            for dense grid queries in low dimensions. "tree" sums up only the kernels within cutoff
+            bandwidths of each point using a k-d tree over the samples (see uadapy.kde.KDETree), which
+            is suited for many scattered query points. Its absolute error is bounded by
+            exp(-cutoff^2 / 2) times the peak value of a single kernel.
+        :param max_memory: Approximate memory budget in bytes for intermediate arrays. If set, the points
+            are evaluated in chunks that fit into this budget.
+        :param out: Preallocated output array of shape (m,), e.g. a np.memmap, the densities are written into
+        :param workers: Number of threads evaluating chunks in parallel
+        :param kwargs: Options passed on to the evaluation method, e.g. grid_size for "binned"
+            or cutoff for "tree"
+        :return: The densities at the given points
+        """
+        return self._evaluate(self._pdf, x, method, max_memory, out, workers, **kwargs)
+
+    def logpdf(self, x: np.ndarray | float, method: str = "exact", max_memory: int = None, out: np.ndarray = None,
+               workers: int = 1, **kwargs) -> np.ndarray | float:
+        """
+        Evaluates the logarithm of the probability density function at the given points.
+        Exact evaluation stays in log space, i.e., the KDE of sample-based distributions is evaluated
+        as a log-sum-exp over the kernels and normal distributions use the log-density directly, so
+        that densities far in the tails do not underflow to zero. The approximate KDE methods and
+        models without a logpdf fall back to the logarithm of the pdf.
+        The parameters are the same as for pdf().
+        :return: The log-densities at the given points
+        """
+        return self._evaluate(self._logpdf, x, method, max_memory, out, workers, **kwargs)
+
+    def _evaluate(self, func, x, method, max_memory, out, workers, **kwargs):
+        if max_memory is None and out is None and workers == 1:
+            return self._cast(func(x, method, **kwargs))
+        x = np.asarray(x)
+        # a scalar, or a single point of a multivariate distribution, is evaluated as one row
+        single = x.ndim == 0 or (self.dim > 1 and x.ndim == 1)
+        x = np.atleast_1d(x) if self.dim == 1 else np.atleast_2d(x)
+        n = x.shape[0]
+        if out is None:
+            out = np.empty(n, dtype=self.dtype or float)
+        if n == 0:
+            return out
+        if max_memory is None:
+            chunk_size = max(1, -(-n // workers))
+        else:
+            # rough estimate of the intermediate arrays the models allocate per query point
+            chunk_size = max(1, max_memory // (32 * (self.dim + 1) * max(workers, 1)))
 
-    def pdf(self, x: np.ndarray | float) -> np.ndarray | float:
+        def evaluate(start):
+            out[start:start + chunk_size] = func(x[start:start + chunk_size], method, **kwargs)
+
+        # the first chunk is evaluated up front, so that lazily built models exist before threads start
+        evaluate(0)
+        starts = range(chunk_size, n, chunk_size)
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(evaluate, starts))
+        else:
+            for start in starts:
+                evaluate(start)
+        return out[0] if single else out
+
+    def _pdf(self, x: np.ndarray | float, method: str = "exact", **kwargs) -> np.ndarray | float:
         if isinstance(self.model, np.ndarray):
+            if method == "binned":
+                return binned_pdf(self.kde, x, **kwargs)
+            if method == "tree":
+                cutoff = kwargs.pop('cutoff', 4.0)
+                if self._kde_tree is None or self._kde_tree.cutoff != cutoff:
+                    self._kde_tree = KDETree(self.kde, cutoff)
+                return self._kde_tree.pdf(x, **kwargs)
+            if method != "exact":
+                raise ValueError(f"Unknown pdf method: {method}")
             return self.kde.pdf(x.T)
         if not hasattr(self.model, 'pdf'):
             raise AttributeError(f"The model has no pdf. {self.model.__class__.__name__}")
         else:
             return self.model.pdf(x)
 
-    def mean(self) -> np.ndarray | float:
-        if isinstance(self.model, np.ndarray):
-            return np.mean(self.model, axis=0)
-        if hasattr(self.model, 'mean'):
-            if callable(self.model.mean):
-                return self.model.mean()
-            return self.model.mean
-        if hasattr(self.model, 'loc'):
-            return self.model.loc
-        if hasattr(self.model, 'mu'):
-            return self.model.mu
-        else:
-           raise AttributeError(f"Mean not implemented yet! {self.model.__class__.__name__}")
+    def _logpdf(self, x: np.ndarray | float, method: str = "exact", **kwargs) -> np.ndarray | float:
+        if isinstance(self.model, np.ndarray) and method == "exact":
+            return self.kde.logpdf(x.T)
+        if not isinstance(self.model, np.ndarray) and hasattr(self.model, 'logpdf'):
+            return self.model.logpdf(x)
+        with np.errstate(divide='ignore'):
+            return np.log(self._pdf(x, method, **kwargs))
 
-    def cov(self) -> np.ndarray | float:
-        if isinstance(self.model, np.ndarray):
-            return np.cov(self.model.T)
-        if hasattr(self.model, 'cov'):
-            if callable(self.model.cov):
-                return self.model.cov()
-            return self.model.cov
-        if hasattr(self.model, 'covariance'):
-            if callable(self.model.covariance):
-                return self.model.covariance
-            return self.model.covariance
-        if hasattr(self.model, 'var'):
-            if callable(self.model.var):
-                return self.model.var()
-            return self.model.var
-        if isinstance(self.model, mv.multivariate_t_frozen):
-            return self.model.shape * (self.model.df / (self.model.df - 2))
-        raise AttributeError(f"Covariance not implemented yet! {self.model.__class__.__name__}")
+    def quantile(self, q: np.ndarray | float) -> np.ndarray | float:
+        """
+        Evaluates the quantile function (inverse CDF) of the marginal distributions.
+        Sample-based distributions use a mergeable quantile sketch (see uadapy.streaming.QuantileSketch)
+        instead of sorting the samples, its rank error is in the order of 1%.
+        :param q: Probabilities in [0, 1], scalar or array of shape (m,)
+        :return: Array of shape (d,) for a scalar q, otherwise of shape (m, d). The last axis is
+            dropped for univariate distributions.
+        """
+        return self._cast(self._accessors.quantile(self, q))
+
+    def cdf(self, x: np.ndarray | float) -> np.ndarray | float:
+        """
+        Evaluates the cumulative distribution functions of the marginal distributions.
+        Sample-based distributions use a mergeable quantile sketch, see quantile().
+        :param x: Points of shape (m, d), or (m,) for univariate distributions
+        :return: Array of shape (m, d) with the CDF of every dimension, (m,) for univariate distributions
+        """
+        return self._cast(self._accessors.cdf(self, x))
 
+    def to_mixture(self, k: int, random_state=None, **kwargs) -> 'distribution':
+        """
+        Compresses a sample-based distribution into a Gaussian mixture with k components. Densities of the
+        mixture are evaluated in O(k) per point instead of O(n) for the KDE of n samples.
+        :param k: Number of components
+        :param random_state: Seed for the initialization of the components
+        :param kwargs: Further options for uadapy.gaussian.GaussianMixture.from_samples
+        :return: A new distribution with a GaussianMixture as model
+        """
+        if not isinstance(self.model, np.ndarray):
+            raise ValueError(f"Only distributions created from samples can be compressed into a mixture. {self.name}")
+        return distribution(GaussianMixture.from_samples(self.model, k, random_state, **kwargs), self.name)
+
+    def mean(self) -> np.ndarray | float:
+        if 'mean' not in self._moments:
+            self._moments['mean'] = self._cast(self._accessors.mean(self))
+        return self._moments['mean']
+
+    def cov(self, structured: bool = False) -> np.ndarray | float:
+        """
+        :param structured: If True, a structured covariance matrix of the model (see uadapy.covariance), e.g.
+            of a GaussianModel created with a DiagonalCovariance, is returned as it is instead of the dense matrix
+        :return: The covariance matrix
+        """
+        if structured and isinstance(getattr(self.model, 'structure', None), StructuredCovariance):
+            return self.model.structure
+        if 'cov' not in self._moments:
+            self._moments['cov'] = self._cast(self._accessors.cov(self))
+        return self._moments['cov']
 
     def skew(self) -> np.ndarray | float:
-        if isinstance(self.model, np.ndarray):
-            return stats.skew(self.model)
-        if hasattr(self.model, 'stats') and callable(self.model.stats):
-            return self.model.stats(moments='s')
-        if isinstance(self.model, mv.multivariate_t_frozen):
-            return 0
+        if 'skew' not in self._moments:
+            self._moments['skew'] = self._cast(self._accessors.skew(self))
+        return self._moments['skew']
 
     def kurt(self) -> np.ndarray | float:
-        if isinstance(self.model, np.ndarray):
-            return stats.kurtosis(self.model)
-        if hasattr(self.model, 'stats') and callable(self.model.stats):
-            return self.model.stats(moments='k')
-        if isinstance(self.model, stats.multivariate_normal):
-            return 0
+        if 'kurt' not in self._moments:
+            self._moments['kurt'] = self._cast(self._accessors.kurt(self))
+        return self._moments['kurt']
+
+
+def _memmap_moment(name: str):
+    def moment(d: distribution):
+        d.precompute_moments()
+        return d._moments[name]
+    return moment
+
+
+def _mvn_sample_qmc(d: distribution, n: int, random_state, method: str) -> np.ndarray:
+    z = qmc_normal(n, d.dim, method, random_state)
+    return d.mean() + z @ np.linalg.cholesky(d.cov()).T
+
+
+def _mixture_sample_qmc(d: distribution, n: int, random_state, method: str) -> np.ndarray:
+    # stratified over the components, quasi-Monte Carlo within every component
+    mixture = d.model
+    rng = np.random.default_rng(random_state)
+    counts = mixture.component_counts(n, rng)
+    samples = [mixture.means[k] + qmc_normal(c, d.dim, method, rng) @ mixture.factors[k].T
+               for k, c in enumerate(counts) if c > 0]
+    return np.concatenate(samples)[rng.permutation(n)]
+
+
+def _sample_kde(d: distribution, n: int, random_state, method: str = "random") -> np.ndarray:
+    # the compressed KDE if there is one, otherwise rows of the samples are drawn without building the KDE
+    if d.compress is not None:
+        return sample_kde(d.kde, n, random_state, method)
+    return resample_rows(d.model, n, d.cov(), random_state, method)
+
+
+def _marginal(d: distribution, values: np.ndarray) -> np.ndarray | float:
+    # univariate distributions return values without the dimension axis
+    if d.dim == 1:
+        return values[..., 0][()]
+    return values
+
+
+def _sample_quantile(d: distribution, q) -> np.ndarray | float:
+    return _marginal(d, d.sketch.quantile(q))
+
+
+def _sample_cdf(d: distribution, x) -> np.ndarray:
+    return _marginal(d, d.sketch.cdf(np.reshape(x, (-1, d.dim))))
+
+
+def _normal_marginals(d: distribution) -> tuple[np.ndarray, np.ndarray]:
+    return np.reshape(d.mean(), (d.dim,)), np.sqrt(np.diagonal(np.reshape(d.cov(), (d.dim, d.dim))))
+
+
+def _normal_quantile(d: distribution, q) -> np.ndarray | float:
+    mean, std = _normal_marginals(d)
+    return _marginal(d, mean + std * special.ndtri(np.asarray(q, dtype=float))[..., np.newaxis])
+
+
+def _normal_cdf(d: distribution, x) -> np.ndarray:
+    mean, std = _normal_marginals(d)
+    return _marginal(d, special.ndtr((np.reshape(x, (-1, d.dim)) - mean) / std))
+
+
+def _mixture_marginal_cdf(mixture: GaussianMixture, x: np.ndarray) -> np.ndarray:
+    # x of shape (..., d), the marginal CDFs of the components are summed up per dimension
+    std = np.sqrt(np.diagonal(mixture.covs, axis1=1, axis2=2))
+    z = (x[..., np.newaxis, :] - mixture.means) / std
+    return np.einsum('k,...kd->...d', mixture.weights, special.ndtr(z))
+
+
+def _mixture_quantile(d: distribution, q) -> np.ndarray | float:
+    # the marginal CDF of a mixture has no closed-form inverse, it is inverted by bisection
+    mixture = d.model
+    q = np.asarray(q, dtype=float)[..., np.newaxis]
+    std = np.sqrt(np.diagonal(mixture.covs, axis1=1, axis2=2))
+    lower = np.broadcast_to((mixture.means - 10 * std).min(axis=0), q.shape[:-1] + (d.dim,)).copy()
+    upper = np.broadcast_to((mixture.means + 10 * std).max(axis=0), q.shape[:-1] + (d.dim,)).copy()
+    for _ in range(60):
+        middle = 0.5 * (lower + upper)
+        below = _mixture_marginal_cdf(mixture, middle) < q
+        lower = np.where(below, middle, lower)
+        upper = np.where(below, upper, middle)
+    return _marginal(d, 0.5 * (lower + upper))
+
+
+register_model(np.ndarray,
+               mean=lambda d: np.mean(d.model, axis=0),
+               cov=lambda d: np.cov(d.model.T, dtype=np.result_type(d.model.dtype, np.float32)),
+               skew=lambda d: stats.skew(d.model),
+               kurt=lambda d: stats.kurtosis(d.model),
+               sample=lambda d, n, random_state: d.kde.resample(n, random_state).T,
+               sample_qmc=lambda d, n, random_state, method: _sample_kde(d, n, random_state, method),
+               quantile=_sample_quantile,
+               cdf=_sample_cdf)
+register_model(np.memmap,
+               mean=_memmap_moment('mean'),
+               cov=_memmap_moment('cov'),
+               skew=_memmap_moment('skew'),
+               kurt=_memmap_moment('kurt'),
+               sample=lambda d, n, random_state: _sample_kde(d, n, random_state))
+# scipy types are registered by name, so that scipy.stats is not imported with uadapy
+register_model('scipy.stats._multivariate.multivariate_normal_frozen',
+               skew=lambda d: 0,
+               kurt=lambda d: 0,
+               sample_qmc=_mvn_sample_qmc,
+               quantile=_normal_quantile,
+               cdf=_normal_cdf)
+register_model(GaussianModel,
+               mean=lambda d: d.model.mean,
+               cov=lambda d: d.model.cov,
+               skew=lambda d: 0,
+               kurt=lambda d: 0,
+               sample=lambda d, n, random_state: d.model.rvs(n, random_state),
+               sample_qmc=lambda d, n, random_state, method:
+                   d.model.mean + qmc_normal(n, d.dim, method, random_state) @ d.model.factor.T,
+               quantile=_normal_quantile,
+               cdf=_normal_cdf)
+register_model(GaussianMixture,
+               mean=lambda d: d.model.mean,
+               cov=lambda d: d.model.cov,
+               skew=lambda d: d.model.skew(),
+               kurt=lambda d: d.model.kurt(),
+               sample=lambda d, n, random_state: d.model.rvs(n, random_state),
+               sample_qmc=_mixture_sample_qmc,
+               quantile=_mixture_quantile,
+               cdf=lambda d, x: _marginal(d, _mixture_marginal_cdf(d.model, np.reshape(x, (-1, d.dim)))))
+register_model('scipy.stats._multivariate.multivariate_t_frozen',
+               cov=lambda d: d.model.shape * (d.model.df / (d.model.df - 2)),
+               skew=lambda d: 0)
@@ -0,0 +1,193 @@
+import numpy as np
+from uadapy.distribution import distribution
+from uadapy.gaussian import GaussianModel
+from uadapy.sampling import spawn_generators
+
+
+class DistributionSet:
+    """
+    A batch of distributions stored as stacked moments. The means are kept as an (n, d) array and the
+    covariances as an (n, d, d) array, so that moments, sampling and densities can be computed for all
+    distributions at once instead of calling into every distribution object separately.
+    The distributions are treated as normal distributions with the stored means and covariances.
+    """
+
+    def __init__(self, means: np.ndarray, covs: np.ndarray, name: str = "Normal"):
+        """
+        Creates a set of distributions from stacked means and covariance matrices.
+        :param means: Array of shape (n, d) with the mean vectors
+        :param covs: Array of shape (n, d, d) with the covariance matrices. A vertically stacked
+            (n * d, d) block of covariance matrices is accepted as well.
+        :param name: The name of the distributions
+        """
+        means = np.asarray(means)
+        if means.ndim == 1:
+            means = means[:, np.newaxis]
+        n, d = means.shape
+        covs = np.asarray(covs).reshape((n, d, d))
+        self.means = means
+        self.covs = covs
+        self.name = name
+        self.dim = d
+
+    @property
+    def covs(self) -> np.ndarray:
+        return self._covs
+
+    @covs.setter
+    def covs(self, covs: np.ndarray):
+        self._covs = covs
+        self._factors = None
+        self._singular = None
+
+    @property
+    def factors(self) -> np.ndarray:
+        """
+        Matrices A with A @ A.T = cov for all covariance matrices, shape (n, d, d). They are computed once
+        on first use (Cholesky decomposition, eigendecomposition for semi-definite matrices) and reused by
+        all subsequent calls of sample(), pdf() and logpdf(). For singular matrices, pdf() and logpdf()
+        evaluate the degenerate density on the support of the distribution instead, see singular.
+        """
+        if self._factors is None:
+            self._factors = _factorize(self.covs)
+        return self._factors
+
+    @property
+    def singular(self) -> np.ndarray:
+        """
+        Boolean mask of shape (n,) of the singular covariance matrices, computed once on first use with
+        the same threshold for zero eigenvalues as scipy.stats.multivariate_normal.
+        """
+        if self._singular is None:
+            w = np.linalg.eigvalsh(self.covs)
+            self._singular = np.any(w <= _zero_threshold(w), axis=1)
+        return self._singular
+
+    @classmethod
+    def from_distributions(cls, distributions) -> 'DistributionSet':
+        """
+        Creates a set from a list of distribution objects by stacking their means and covariances.
+        :param distributions: List of distributions offering mean() and cov()
+        :return: The distribution set
+        """
+        if isinstance(distributions, DistributionSet):
+            return distributions
+        if isinstance(distributions, distribution):
+            distributions = [distributions]
+        means = np.array([np.atleast_1d(d.mean()) for d in distributions])
+        covs = np.array([np.atleast_2d(d.cov()) for d in distributions])
+        return cls(means, covs)
+
+    def __len__(self) -> int:
+        return self.means.shape[0]
+
+    def __getitem__(self, index):
+        if isinstance(index, (slice, np.ndarray, list)):
+            subset = DistributionSet(self.means[index], self.covs[index], self.name)
+            if self._factors is not None:
+                subset._factors = self._factors[index]
+            if self._singular is not None:
+                subset._singular = self._singular[index]
+            return subset
+        return distribution(GaussianModel(self.means[index], self.covs[index], validate=False), self.name)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def mean(self) -> np.ndarray:
+        return self.means
+
+    def cov(self) -> np.ndarray:
+        return self.covs
+
+    def sample(self, n: int, random_state: int = None, independent: bool = False) -> np.ndarray:
+        """
+        Draws samples from all distributions at once using the cached factors of the covariance matrices.
+        :param n: Number of samples per distribution
+        :param random_state: Seed or generator for the random number generator
+        :param independent: If True, every distribution draws from its own random stream spawned from
+            random_state via np.random.SeedSequence. The samples of a distribution then only depend on the
+            seed and its index, not on the other distributions in the set.
+        :return: Array of shape (n_distributions, n, d)
+        """
+        if independent:
+            generators = spawn_generators(random_state, len(self))
+            z = np.stack([rng.standard_normal((n, self.dim)) for rng in generators])
+        else:
+            rng = np.random.default_rng(random_state)
+            z = rng.standard_normal((len(self), n, self.dim))
+        return self.means[:, np.newaxis, :] + np.einsum('kij,knj->kni', self.factors, z)
+
+    def pdf(self, x: np.ndarray | float) -> np.ndarray:
+        """
+        Evaluates the densities of all distributions at the given points.
+        :param x: Points of shape (m, d)
+        :return: Array of shape (n_distributions, m)
+        """
+        return np.exp(self.logpdf(x))
+
+    def logpdf(self, x: np.ndarray | float) -> np.ndarray:
+        """
+        Evaluates the log-densities of all distributions at the given points using the cached factors
+        of the covariance matrices.
+        :param x: Points of shape (m, d)
+        :return: Array of shape (n_distributions, m)
+        """
+        x = np.asarray(x).reshape((-1, self.dim))
+        diff = x[np.newaxis, :, :] - self.means[:, np.newaxis, :]
+        singular = self.singular
+        if np.any(singular):
+            result = np.empty(diff.shape[:2], dtype=np.result_type(diff, self.covs))
+            result[singular] = _singular_logpdf(diff[singular], self.covs[singular])
+            regular = ~singular
+            result[regular] = _logpdf(diff[regular], self.factors[regular])
+            return result
+        return _logpdf(diff, self.factors)
+
+
+def _zero_threshold(w: np.ndarray) -> np.ndarray:
+    # eigenvalues below this threshold of shape (n, 1) are treated as zero, the same threshold as scipy uses
+    return 1e6 * np.finfo(w.dtype).eps * np.max(np.abs(w), axis=1, keepdims=True)
+
+
+def _logpdf(diff: np.ndarray, factors: np.ndarray) -> np.ndarray:
+    # log-densities of the differences (n, m, d) to the means for invertible factors (n, d, d)
+    z = np.linalg.solve(factors, diff.transpose(0, 2, 1))
+    maha = np.sum(z * z, axis=1)
+    log_det = 2 * np.linalg.slogdet(factors)[1]
+    return -0.5 * (diff.shape[2] * np.log(2 * np.pi) + log_det[:, np.newaxis] + maha)
+
+
+def _singular_logpdf(diff: np.ndarray, covs: np.ndarray) -> np.ndarray:
+    """
+    Log-densities of degenerate normal distributions with singular covariance matrices, i.e., the density
+    on the support spanned by the eigenvectors with non-zero eigenvalues (pseudo-inverse and pseudo-determinant),
+    like scipy.stats.multivariate_normal(allow_singular=True). Points off the support have log-density -inf.
+    :param diff: Differences of the points to the means of shape (n, m, d)
+    :param covs: Covariance matrices of shape (n, d, d)
+    :return: Array of shape (n, m)
+    """
+    w, v = np.linalg.eigh(covs)
+    eps = _zero_threshold(w)
+    support = w > eps
+    coords = np.einsum('nmd,nde->nme', diff, v)
+    inv_std = np.where(support, 1 / np.sqrt(np.where(support, w, 1)), 0)
+    maha = np.sum((coords * inv_std[:, np.newaxis, :]) ** 2, axis=2)
+    rank = np.sum(support, axis=1)
+    log_pdet = np.sum(np.log(np.where(support, w, 1)), axis=1)
+    logpdf = -0.5 * (rank[:, np.newaxis] * np.log(2 * np.pi) + log_pdet[:, np.newaxis] + maha)
+    residual = np.sum(np.where(support[:, np.newaxis, :], 0, coords ** 2), axis=2)
+    return np.where(residual > eps, -np.inf, logpdf)
+
+
+def _factorize(covs: np.ndarray) -> np.ndarray:
+    """
+    Computes matrices A with A @ A.T = cov for a stack of covariance matrices. Uses the Cholesky decomposition
+    and falls back to the eigendecomposition for positive semi-definite matrices.
+    """
+    try:
+        return np.linalg.cholesky(covs)
+    except np.linalg.LinAlgError:
+        w, v = np.linalg.eigh(covs)
+        return v * np.sqrt(np.clip(w, 0, None))[..., np.newaxis, :]
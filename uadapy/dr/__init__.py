@@ -1,2 +1,43 @@
-from .uamds import *
-from .uapca import *
+"""
+Dimensionality reduction methods for distributions. uamds is imported on first use,
+so that numba is only loaded when the method is actually called.
+"""
+
+import importlib
+import sys
+import types
+
+# uapca only needs numpy, importing it eagerly binds the function uapca instead of its module
+from .uapca import uapca, compute_ua_cov, compute_uapca, transform_uapca, UAPCA, IncrementalUAPCA
+
+_UAMDS_EXPORTS = ('uamds', 'apply_uamds', 'precalculate_constants', 'estimate_constants_memory', 'stress',
+                  'gradient', 'precompile', 'iterate_simple_gradient_descent', 'minimize_scipy',
+                  'perform_projection', 'get_means_covs', 'mk_normal_distr_spec',
+                  'convert_xform_uamds_to_affine', 'convert_xform_affine_to_uamds')
+
+__all__ = ['uapca', 'compute_ua_cov', 'compute_uapca', 'transform_uapca', 'UAPCA', 'IncrementalUAPCA',
+           *_UAMDS_EXPORTS]
+
+
+class _DRModule(types.ModuleType):
+    def __setattr__(self, name, value):
+        # the functions uapca and uamds shadow their modules, importing a submodule
+        # (e.g. import uadapy.dr.uamds) must not replace them
+        if name in ('uapca', 'uamds') and isinstance(value, types.ModuleType):
+            return
+        super().__setattr__(name, value)
+
+
+def __getattr__(name: str):
+    if name in _UAMDS_EXPORTS:
+        module = importlib.import_module('.uamds', __name__)
+        globals().update({export: getattr(module, export) for export in _UAMDS_EXPORTS})
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) - {'importlib', 'sys', 'types'} | set(__all__))
+
+
+sys.modules[__name__].__class__ = _DRModule
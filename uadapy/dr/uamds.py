@@ -12,103 +12,220 @@ import numba
 import numpy as np
 from scipy.spatial import distance_matrix
 from scipy.optimize import minimize
-from scipy.stats import multivariate_normal
-from uadapy import distribution
+from uadapy import distribution, DistributionSet
+from uadapy.gaussian import GaussianModel
+from uadapy.dr.uapca import _stack
 
 
-def precalculate_constants(normal_distr_spec: np.ndarray) -> tuple:
+def _decompose(covs: np.ndarray, factors: np.ndarray = None,
+               variances: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the singular value decompositions cov_i = U_i diag(s_i) U_i^T of all covariance matrices with one
+    batched call. Diagonal covariance matrices are detected and skip the decomposition, i.e., U_i is the
+    identity and s_i the diagonal. Low-rank covariance matrices W_i W_i^T + sigma_i^2 I with isotropic variances
+    are decomposed from their factors W_i of shape (d, r) in O(d^2 r) instead of O(d^3). Any decomposition works
+    for UAMDS as long as the same one is used for the constants, the projection and the conversion of the
+    transforms, which all call this function.
+
+    Parameters
+    ----------
+    covs : np.ndarray
+        covariance matrices of shape (n, d, d)
+    factors : np.ndarray
+        optional low-rank factors of shape (n, d, r) of the covariance matrices,
+        i.e., covs[i] = factors[i] @ factors[i].T + diag(variances[i])
+    variances : np.ndarray
+        variances of shape (n, d) that belong to the factors. Covariance matrices with non-isotropic
+        variances are decomposed from the dense matrix.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        the orthogonal matrices U of shape (n, d, d) and the singular values s of shape (n, d)
+    """
+    n, d, _ = covs.shape
+    diagonals = np.diagonal(covs, axis1=1, axis2=2)
+    is_diagonal = np.count_nonzero(covs, axis=(1, 2)) == np.count_nonzero(diagonals, axis=1)
+    U = np.empty_like(covs)
+    s = np.empty_like(diagonals)
+    U[is_diagonal] = np.eye(d, dtype=covs.dtype)
+    s[is_diagonal] = diagonals[is_diagonal]
+    is_dense = ~is_diagonal
+    if factors is not None:
+        is_low_rank = is_dense & np.all(variances == variances[:, :1], axis=1)
+        if np.any(is_low_rank):
+            U[is_low_rank], s[is_low_rank] = _decompose_low_rank(factors[is_low_rank], variances[is_low_rank, 0])
+        is_dense &= ~is_low_rank
+    if np.any(is_dense):
+        svds = np.linalg.svd(covs[is_dense], full_matrices=True)
+        U[is_dense] = svds.U
+        s[is_dense] = svds.S
+    return U, s
+
+
+def _decompose_low_rank(factors: np.ndarray, variances: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # W = Q R with orthogonal Q of shape (d, d), so that W W^T + sigma^2 I = Q (R R^T + sigma^2 I) Q^T,
+    # where R R^T is zero outside of its leading k x k block
+    m, d, r = factors.shape
+    k = min(d, r)
+    Q, R = np.linalg.qr(factors, mode='complete')
+    eigvals, eigvecs = np.linalg.eigh(R[:, :k, :] @ R[:, :k, :].transpose(0, 2, 1))
+    # decreasing order like the singular values, the variances alone are the smallest
+    Q[:, :, :k] = Q[:, :, :k] @ eigvecs[:, :, ::-1]
+    s = np.empty((m, d), dtype=eigvals.dtype)
+    s[:, :k] = np.maximum(eigvals[:, ::-1], 0)
+    s[:, k:] = 0
+    return Q, s + variances[:, np.newaxis]
+
+
+def estimate_constants_memory(n: int, d_hi: int, dtype: np.dtype = np.float64, mode: str = "precomputed") -> int:
+    """
+    Estimates the memory of the constants computed by precalculate_constants().
+
+    Parameters
+    ----------
+    n : int
+        number of distributions
+    d_hi : int
+        dimensionality of the distributions
+    dtype : np.dtype
+        floating point type of the constants
+    mode : str
+        'precomputed' or 'on_the_fly', see precalculate_constants
+
+    Returns
+    -------
+    int
+        the estimated memory in bytes
+    """
+    # mu, cov, U, S, Ssqrt and the pairwise squared distances of the means
+    num_values = n * d_hi + 4 * n * d_hi**2 + n**2
+    if mode == "precomputed":
+        # Ssqrti_UiTUj_Ssqrtj and Zij of shape (n, n, d, d), mui_sub_muj_TUi and mui_sub_muj_TUj of shape (n, n, d)
+        num_values += 2 * n**2 * d_hi**2 + 2 * n**2 * d_hi
+    return num_values * np.dtype(dtype).itemsize
+
+
+def precalculate_constants(normal_distr_spec: np.ndarray, mode: str = "auto", max_memory: int = 2**30,
+                           factors: np.ndarray = None, variances: np.ndarray = None) -> tuple:
     """
     Computes constant expressions used in the stress and gradient calculations.
     These constants are specific properties of the individual distributions, e.g. the SVDs of the covariance matrices,
     or relationships beetween the distributions, such as the pairwise squared distances between the distribution means
     (similar to the dissimilarity matrix in regular MDS).
+    The terms of every pair of distributions (Ssqrti_UiTUj_Ssqrtj, mui_sub_muj_TUi, mui_sub_muj_TUj, Zij) need
+    O(n^2 d^2) memory. They can be computed on the fly in the numba kernels instead, which only keeps the
+    O(n d^2) constants of the individual distributions at the cost of recomputing the pair terms in every
+    evaluation of the stress and gradient.
 
     Parameters
     ----------
     normal_distr_spec : np.ndarray
         normal distributions specification (block of means followed by block of covariance matrices)
+    mode : str
+        'precomputed' to store the pair terms, 'on_the_fly' to compute them in the kernels, or 'auto' to
+        precompute them if the estimated memory (see estimate_constants_memory) does not exceed max_memory
+    max_memory : int
+        memory budget in bytes for mode 'auto', 1 GiB by default
+    factors : np.ndarray
+        optional low-rank factors of shape (n, d, r) of the covariance matrices for a faster decomposition.
+        The same factors have to be passed to perform_projection and the conversion of the transforms.
+    variances : np.ndarray
+        variances of shape (n, d) that belong to the factors, see _decompose
 
     Returns
     -------
     tuple
-        a tuple containing the computed constant expressions
+        a tuple containing the computed constant expressions, of the same floating point type as normal_distr_spec.
+        In mode 'on_the_fly', the arrays of the pair terms are empty.
     """
     d_hi = normal_distr_spec.shape[1]
     n = normal_distr_spec.shape[0] // (d_hi+1)  # array of (d_hi x d_hi) cov matrices and (1 x d_hi) means
+    dtype = normal_distr_spec.dtype
+    if mode == "auto":
+        fits = estimate_constants_memory(n, d_hi, dtype, "precomputed") <= max_memory
+        mode = "precomputed" if fits else "on_the_fly"
+    if mode not in ("precomputed", "on_the_fly"):
+        raise ValueError(f"Unknown mode: {mode}")
 
     # extract means and covs
-    mu = [normal_distr_spec[i, :] for i in range(n)]
-    cov = [normal_distr_spec[n+d_hi*i:n+d_hi*(i+1), :] for i in range(n)]
+    mu = np.ascontiguousarray(normal_distr_spec[:n, :])
+    cov = normal_distr_spec[n:, :].reshape((n, d_hi, d_hi))
 
     # compute singular value decomps of covs
-    svds = [np.linalg.svd(cov[i], full_matrices=True) for i in range(n)]
-    U = [svds[i].U for i in range(n)]
-    S = [np.diag(svds[i].S) for i in range(n)]
-    Ssqrt = [np.diag(np.sqrt(svds[i].S)) for i in range(n)]
+    U, singular_values = _decompose(cov, factors, variances)
+    eye = np.eye(d_hi, dtype=dtype)
+    S = singular_values[:, :, np.newaxis] * eye
+    sqrt_singular_values = np.sqrt(singular_values)
+    Ssqrt = sqrt_singular_values[:, :, np.newaxis] * eye
 
     # combinations used in stress terms
-    norm2_mui_sub_muj = [[np.dot(mu[i]-mu[j], mu[i]-mu[j]) for j in range(n)] for i in range(n)]
-    Ssqrti_UiTUj_Ssqrtj = [[Ssqrt[i] @ U[i].T @ U[j] @ Ssqrt[j] for j in range(n)] for i in range(n)]
-    mui_sub_muj_TUi = [[(mu[i]-mu[j]) @ U[i] for j in range(n)] for i in range(n)]
-    mui_sub_muj_TUj = [[(mu[i]-mu[j]) @ U[j] for j in range(n)] for i in range(n)]
-    Zij = [[U[i].T @ U[j] for j in range(n)] for i in range(n)]
-
-    # constants = {
-    #     'mu': mu,
-    #     'cov': cov,
-    #     'U': U,
-    #     'S': S,
-    #     'Ssqrt': Ssqrt,
-    #     'norm2_mui_sub_muj': norm2_mui_sub_muj,
-    #     'Ssqrti_UiTUj_Ssqrtj': Ssqrti_UiTUj_Ssqrtj,
-    #     'mui_sub_muj_TUi': mui_sub_muj_TUi,
-    #     'mui_sub_muj_TUj': mui_sub_muj_TUj,
-    #     'Zij': Zij
-    # }
+    mui_sub_muj = mu[:, np.newaxis, :] - mu[np.newaxis, :, :]
+    norm2_mui_sub_muj = np.einsum('ijd,ijd->ij', mui_sub_muj, mui_sub_muj)
+    if mode == "precomputed":
+        Zij = np.einsum('iab,jac->ijbc', U, U, optimize=True)
+        # Ssqrt_i @ Z_ij @ Ssqrt_j scales the rows and columns of Z_ij
+        Ssqrti_UiTUj_Ssqrtj = (sqrt_singular_values[:, np.newaxis, :, np.newaxis] * Zij
+                               * sqrt_singular_values[np.newaxis, :, np.newaxis, :])
+        mui_sub_muj_TUi = np.einsum('ijd,ide->ije', mui_sub_muj, U, optimize=True)
+        mui_sub_muj_TUj = np.einsum('ijd,jde->ije', mui_sub_muj, U, optimize=True)
+    else:
+        Zij = Ssqrti_UiTUj_Ssqrtj = np.empty((0, 0, d_hi, d_hi), dtype=dtype)
+        mui_sub_muj_TUi = mui_sub_muj_TUj = np.empty((0, 0, d_hi), dtype=dtype)
+    del mui_sub_muj
+
     constants = (
-        np.stack(mu),
-        np.stack(cov),
-        np.stack(U),
-        np.stack(S),
-        np.stack(Ssqrt),
-        np.stack(norm2_mui_sub_muj),
-        np.stack(Ssqrti_UiTUj_Ssqrtj),
-        np.stack(mui_sub_muj_TUi),
-        np.stack(mui_sub_muj_TUj),
-        np.stack(Zij)
+        mu,
+        np.ascontiguousarray(cov),
+        U,
+        S,
+        Ssqrt,
+        norm2_mui_sub_muj,
+        Ssqrti_UiTUj_Ssqrtj,
+        mui_sub_muj_TUi,
+        mui_sub_muj_TUj,
+        Zij
     )
     return constants
 
 
+@numba.njit(cache=True)
+def _pair_mean_terms(i: int, j: int, mu, U) -> tuple:
+    mui_sub_muj = mu[i] - mu[j]
+    return mui_sub_muj @ U[i], mui_sub_muj @ U[j]
+
+
+@numba.njit(cache=True)
+def _pair_stress_terms(i: int, j: int, mu, U, Ssqrt, Ssqrti_UiTUj_Ssqrtj, mui_sub_muj_TUi, mui_sub_muj_TUj) -> tuple:
+    # the pair terms of the constants are empty if they are computed on the fly
+    if Ssqrti_UiTUj_Ssqrtj.shape[0] == 0:
+        muTUi, muTUj = _pair_mean_terms(i, j, mu, U)
+        return Ssqrt[i] @ (U[i].T @ U[j]) @ Ssqrt[j], muTUi, muTUj
+    return Ssqrti_UiTUj_Ssqrtj[i, j], mui_sub_muj_TUi[i, j], mui_sub_muj_TUj[i, j]
+
+
+@numba.njit(cache=True)
+def _pair_gradient_terms(i: int, j: int, mu, U, mui_sub_muj_TUi, mui_sub_muj_TUj, Z) -> tuple:
+    # the gradient only needs Zij, not the scaled Ssqrti_UiTUj_Ssqrtj of the stress
+    if Z.shape[0] == 0:
+        muTUi, muTUj = _pair_mean_terms(i, j, mu, U)
+        return muTUi, muTUj, U[i].T @ U[j]
+    return mui_sub_muj_TUi[i, j], mui_sub_muj_TUj[i, j], Z[i, j]
+
+
 @numba.njit(cache=True)
 def _stress_ij(i: int, j: int, normal_distr_spec: np.ndarray, uamds_transforms: np.ndarray,
-               mu,
-               cov,
-               U,
                S,
                Ssqrt,
                norm2_mui_sub_muj,
                Ssqrti_UiTUj_Ssqrtj,
                mui_sub_muj_TUi,
-               mui_sub_muj_TUj,
-               Zij
+               mui_sub_muj_TUj
                ) -> float:
     d_hi = normal_distr_spec.shape[1]
     d_lo = uamds_transforms.shape[1]
     n = normal_distr_spec.shape[0] // (d_hi + 1)
-    # get constants
-    # (
-    #     mu,
-    #     cov,
-    #     U,
-    #     S,
-    #     Ssqrt,
-    #     norm2_mui_sub_muj,
-    #     Ssqrti_UiTUj_Ssqrtj,
-    #     mui_sub_muj_TUi,
-    #     mui_sub_muj_TUj,
-    #     Zij
-    # ) = pre
+    # the pair terms are those of i and j, i.e., Ssqrti_UiTUj_Ssqrtj[i][j] etc.
 
     # get some objects for i
     Si = S[i]
@@ -134,24 +251,24 @@ def _stress_ij(i: int, j: int, normal_distr_spec: np.ndarray, uamds_transforms:
     part2 = (temp*temp).sum()  # sum of squared elements = squared frobenius norm
     # compute term 1 : part 3
     temp = (Ssqrti @ Bi) @ (Bj.T @ Ssqrtj)  # outer product of transformed Bs
-    temp = Ssqrti_UiTUj_Ssqrtj[i][j] - temp
+    temp = Ssqrti_UiTUj_Ssqrtj - temp
     part3 = (temp*temp).sum()  # sum of squared elements = squared frobenius norm
     term1 = 2*(part1+part2)+4*part3
 
     # compute term 2 : part 1 : sum_k^n [ Si_k * ( <Ui_k, mui-muj> - <Bi_k, ci-cj> )^2 ]
     temp = ci_sub_cj @ Bi.T
-    temp = mui_sub_muj_TUi[i][j] - temp
+    temp = mui_sub_muj_TUi - temp
     temp = temp*temp  # squared
     part1 = (temp @ Si).sum()
     # compute term 2 : part 2 : same as part 1 but with j
     temp = ci_sub_cj @ Bj.T
-    temp = mui_sub_muj_TUj[i][j] - temp
+    temp = mui_sub_muj_TUj - temp
     temp = temp*temp  # squared
     part2 = (temp @ Sj).sum()
     term2 = part1+part2
 
     # compute term 3 : part 1
-    norm1 = norm2_mui_sub_muj[i][j]
+    norm1 = norm2_mui_sub_muj
     norm2 = np.dot(ci_sub_cj,ci_sub_cj)  # squared norm
     part1 = norm1-norm2
     # compute term 3 : part 2
@@ -171,32 +288,25 @@ def _stress_ij(i: int, j: int, normal_distr_spec: np.ndarray, uamds_transforms:
 
 @numba.njit(cache=True)
 def _gradient_ij_optimized(i: int, j: int, normal_distr_spec: np.ndarray, uamds_transforms: np.ndarray,
-                           S, norm2_mui_sub_muj, mui_sub_muj_TUi, mui_sub_muj_TUj, Z, BiSi, Bi, Si, BiT, part1i) -> tuple:
+                           Sj, norm2_mui_sub_muj, mui_sub_muj_TUi, mui_sub_muj_TUj, Zij, BiSi, Bi, Si, BiT, part1i) -> tuple:
     d_hi = normal_distr_spec.shape[1]
     # d_lo = uamds_transforms.shape[1]
     n = normal_distr_spec.shape[0] // (d_hi + 1)
+    # the pair terms are those of i and j, i.e., mui_sub_muj_TUi[i][j] etc.
     # get some objects for i
-    #Si = S[i].copy()
-    # mui = mu[i]
     ci = uamds_transforms[i, :]
-    #Bi = uamds_transforms[n + i * d_hi: n + (i + 1) * d_hi, :].T.copy()
-    #BiSi = Bi @ Si
 
     # get some objects for j
-    Sj = S[j].copy()
-    # muj = mu[j]
+    Sj = Sj.copy()
     cj = uamds_transforms[j, :]
     Bj = uamds_transforms[n + j * d_hi:n + (j + 1) * d_hi, :].T.copy()
     BjSj = Bj @ Sj
 
-    # mui_sub_muj = mui - muj
     ci_sub_cj = ci - cj
 
     # compute term 1 :
-    Zij = Z[i][j].copy()
-    #BiT = Bi.T.copy()
+    Zij = Zij.copy()
     BjT = Bj.T.copy()
-    #part1i = (BiSi @ BiT @ BiSi) - (BiSi @ Si)
     part1j = (BjSj @ BjT @ BjSj) - (BjSj @ Sj)
     part2i = (BjSj @ BjT @ BiSi) - (BjSj @ Zij.T @ Si)
     part2j = (BiSi @ BiT @ BjSj) - (BiSi @ Zij @ Sj)
@@ -204,23 +314,23 @@ def _gradient_ij_optimized(i: int, j: int, normal_distr_spec: np.ndarray, uamds_
     dBj = (part1j + part2j) * 8
 
     # compute term 2 :
-    dci = np.zeros(ci.shape)
-    dcj = np.zeros(cj.shape)
+    dci = np.zeros_like(ci)
+    dcj = np.zeros_like(cj)
     if i != j:
         # gradient part for B matrices
-        part3i = (np.outer(ci_sub_cj, (ci_sub_cj @ Bi)) - np.outer(ci_sub_cj, mui_sub_muj_TUi[i][j])) @ Si
-        part3j = (np.outer(ci_sub_cj, (ci_sub_cj @ Bj)) - np.outer(ci_sub_cj, mui_sub_muj_TUj[i][j])) @ Sj
+        part3i = (np.outer(ci_sub_cj, (ci_sub_cj @ Bi)) - np.outer(ci_sub_cj, mui_sub_muj_TUi)) @ Si
+        part3j = (np.outer(ci_sub_cj, (ci_sub_cj @ Bj)) - np.outer(ci_sub_cj, mui_sub_muj_TUj)) @ Sj
         dBi += 2 * part3i
         dBj += 2 * part3j
         # gradient part for c vectors
-        part4i = (mui_sub_muj_TUi[i][j] - (ci_sub_cj @ Bi)) @ BiSi.T
-        part4j = (mui_sub_muj_TUj[i][j] - (ci_sub_cj @ Bj)) @ BjSj.T
+        part4i = (mui_sub_muj_TUi - (ci_sub_cj @ Bi)) @ BiSi.T
+        part4j = (mui_sub_muj_TUj - (ci_sub_cj @ Bj)) @ BjSj.T
         part4 = -2 * (part4i + part4j)
         dci += part4
         dcj -= part4
 
     # compute term 3 :
-    norm1 = norm2_mui_sub_muj[i][j]
+    norm1 = norm2_mui_sub_muj
     norm2 = np.dot(ci_sub_cj, ci_sub_cj)
     part1 = norm1 - norm2
     part2 = part3 = 0.0
@@ -245,6 +355,8 @@ def _gradient_ij_optimized(i: int, j: int, normal_distr_spec: np.ndarray, uamds_
 def stress(normal_distr_spec: np.ndarray, uamds_transforms: np.ndarray, precalc_constants: tuple=None) -> float:
     if precalc_constants is None:
         precalc_constants = precalculate_constants(normal_distr_spec)
+    # the numba kernels are compiled for the floating point type of the spec
+    uamds_transforms = uamds_transforms.astype(normal_distr_spec.dtype, copy=False)
     return _stress_numba(normal_distr_spec, uamds_transforms, precalc_constants)
 
 
@@ -253,19 +365,26 @@ def _stress_numba(normal_distr_spec: np.ndarray, uamds_transforms: np.ndarray, p
     d_hi = normal_distr_spec.shape[1]
     d_lo = uamds_transforms.shape[1]
     n = normal_distr_spec.shape[0] // (d_hi + 1)  # array of (d_hi x d_hi) cov matrices and (1 x d_hi) means
+    (mu, cov, U, S, Ssqrt, norm2_mui_sub_muj, Ssqrti_UiTUj_Ssqrtj, mui_sub_muj_TUi, mui_sub_muj_TUj,
+     Z) = precalc_constants
 
     sum = 0
     for i in numba.prange(n):
         for j in numba.prange(i, n):
-            sum += _stress_ij(i, j, normal_distr_spec, uamds_transforms, *precalc_constants)
+            SUUS_ij, muTUi_ij, muTUj_ij = _pair_stress_terms(i, j, mu, U, Ssqrt, Ssqrti_UiTUj_Ssqrtj,
+                                                             mui_sub_muj_TUi, mui_sub_muj_TUj)
+            sum += _stress_ij(i, j, normal_distr_spec, uamds_transforms, S, Ssqrt, norm2_mui_sub_muj[i, j],
+                              SUUS_ij, muTUi_ij, muTUj_ij)
     return sum
 
 
 @numba.njit(parallel=False, cache=True)
-def _gradient_numba_optimized(normal_distr_spec: np.ndarray, uamds_transforms: np.ndarray, S, norm2_mui_sub_muj,
-                              mui_sub_muj_TUi, mui_sub_muj_TUj, Z, n, d_hi):
+def _gradient_numba_optimized(normal_distr_spec: np.ndarray, uamds_transforms: np.ndarray, precalc_constants: tuple,
+                              n, d_hi):
+    (mu, cov, U, S, Ssqrt, norm2_mui_sub_muj, Ssqrti_UiTUj_Ssqrtj, mui_sub_muj_TUi, mui_sub_muj_TUj,
+     Z) = precalc_constants
     # compute the gradients of all affine transforms
-    grad = np.zeros(uamds_transforms.shape)
+    grad = np.zeros_like(uamds_transforms)
     for i in numba.prange(n):
 
         Si = S[i].copy()
@@ -276,8 +395,10 @@ def _gradient_numba_optimized(normal_distr_spec: np.ndarray, uamds_transforms: n
         part1i = (BiSi @ BiT @ BiSi) - (BiSi @ Si)
 
         for j in numba.prange(i, n):
-            dBi, dBj, dci, dcj = _gradient_ij_optimized(i, j, normal_distr_spec, uamds_transforms, S, norm2_mui_sub_muj,
-                                                        mui_sub_muj_TUi, mui_sub_muj_TUj, Z, BiSi, Bi, Si, BiT, part1i)
+            muTUi_ij, muTUj_ij, Zij = _pair_gradient_terms(i, j, mu, U, mui_sub_muj_TUi, mui_sub_muj_TUj, Z)
+            dBi, dBj, dci, dcj = _gradient_ij_optimized(i, j, normal_distr_spec, uamds_transforms, S[j],
+                                                        norm2_mui_sub_muj[i, j], muTUi_ij, muTUj_ij, Zij,
+                                                        BiSi, Bi, Si, BiT, part1i)
             # c gradients on top part of matrix
             grad[i, :] += dci
             grad[j, :] += dcj
@@ -288,19 +409,30 @@ def _gradient_numba_optimized(normal_distr_spec: np.ndarray, uamds_transforms: n
 
 
 def gradient(normal_distr_spec: np.ndarray, uamds_transforms: np.ndarray, precalc_constants: tuple) -> np.ndarray:
-    # print("grad")
     d_hi = normal_distr_spec.shape[1]
-    # d_lo = uamds_transforms.shape[1]
     n = normal_distr_spec.shape[0] // (d_hi + 1)
+    uamds_transforms = uamds_transforms.astype(normal_distr_spec.dtype, copy=False)
+    return _gradient_numba_optimized(normal_distr_spec, uamds_transforms, precalc_constants, n, d_hi)
 
-    S = precalc_constants[3]
-    norm2_mui_sub_muj = precalc_constants[5]
-    mui_sub_muj_TUi = precalc_constants[7]
-    mui_sub_muj_TUj = precalc_constants[8]
-    Z = precalc_constants[9]
 
-    return _gradient_numba_optimized(normal_distr_spec, uamds_transforms, S, norm2_mui_sub_muj,
-                                     mui_sub_muj_TUi, mui_sub_muj_TUj, Z, n, d_hi)
+def precompile(dtypes=(np.float32, np.float64)):
+    """
+    Compiles the numba kernels of the stress and gradient for the given floating point types by running
+    them on a tiny problem. The compiled kernels are cached on disk, so that later runs of UAMDS in this
+    and other processes do not pay the compilation time.
+
+    Parameters
+    ----------
+    dtypes : tuple
+        floating point types to compile the kernels for, np.float32 and np.float64 by default.
+    """
+    for dtype in np.atleast_1d(dtypes):
+        normal_distr_spec = mk_normal_distr_spec([np.zeros(2), np.ones(2)], [np.eye(2), np.eye(2)]).astype(dtype)
+        uamds_transforms = np.ones((normal_distr_spec.shape[0], 2), dtype=dtype)
+        for mode in ("precomputed", "on_the_fly"):
+            pre = precalculate_constants(normal_distr_spec, mode)
+            stress(normal_distr_spec, uamds_transforms, pre)
+            gradient(normal_distr_spec, uamds_transforms, pre)
 
 
 def iterate_simple_gradient_descent(
@@ -426,14 +558,16 @@ def minimize_scipy(
 
     def dfx(x: np.ndarray):
         grad = gradient(normal_distr_spec, x.reshape(x_shape), pre)
-        return grad.flatten()
+        # scipy optimizes in double precision, the gradient may be computed in single precision
+        return grad.flatten().astype(np.float64)
 
     # minimization
     solution = minimize(fx, uamds_transforms_init.flatten(), method=method, jac=dfx)
-    return solution.x.reshape(x_shape)
+    return solution.x.reshape(x_shape).astype(normal_distr_spec.dtype, copy=False)
 
 
-def perform_projection(normal_distr_spec: np.ndarray, uamds_transforms: np.ndarray) -> np.ndarray:
+def perform_projection(normal_distr_spec: np.ndarray, uamds_transforms: np.ndarray,
+                       factors: np.ndarray = None, variances: np.ndarray = None) -> np.ndarray:
     """
     Projects the distributions specified in normal_distr_spec using the provided uamds_transforms.
 
@@ -444,6 +578,10 @@ def perform_projection(normal_distr_spec: np.ndarray, uamds_transforms: np.ndarr
         n square matrices (covariances).
     uamds_transforms : np.ndarray
         uamds transformations for each distribution (low-dim means followed by local projection matrices B_i)
+    factors : np.ndarray
+        optional low-rank factors of the covariance matrices, the ones passed to precalculate_constants
+    variances : np.ndarray
+        variances that belong to the factors, the ones passed to precalculate_constants
 
     Returns
     -------
@@ -452,23 +590,17 @@ def perform_projection(normal_distr_spec: np.ndarray, uamds_transforms: np.ndarr
         block of covariance matrices).
     """
     d_hi = normal_distr_spec.shape[1]
-    # d_lo = uamds_transforms.shape[1]
     n = normal_distr_spec.shape[0] // (d_hi + 1)
-
-    mus = []
-    covs = []
-    for i in range(n):
-        mu_lo = uamds_transforms[i, :]
-        cov_hi = normal_distr_spec[n+i*d_hi : n+(i+1)*d_hi, :]
-        B = uamds_transforms[n+i*d_hi : n+(i+1)*d_hi, :]
-        S = np.diag(np.linalg.svd(cov_hi, full_matrices=True).S)
-        cov_lo = B.T @ S @ B
-        mus.append(mu_lo)
-        covs.append(cov_lo)
-    return mk_normal_distr_spec(mus, covs)
+    d_lo = uamds_transforms.shape[1]
+    _, singular_values = _decompose(normal_distr_spec[n:, :].reshape((n, d_hi, d_hi)), factors, variances)
+    B = uamds_transforms[n:, :].reshape((n, d_hi, d_lo))
+    covs = np.einsum('idk,id,idl->ikl', B, singular_values, B, optimize=True)
+    return np.vstack([uamds_transforms[:n, :], covs.reshape((n * d_lo, d_lo))])
 
 
-def apply_uamds(means: list[np.ndarray], covs: list[np.ndarray], target_dim=2) -> dict[str, list[np.ndarray] | float]:
+def apply_uamds(means: list[np.ndarray], covs: list[np.ndarray], target_dim=2,
+                dtype: np.dtype = None, mode: str = "auto", factors: np.ndarray = None,
+                variances: np.ndarray = None) -> dict[str, list[np.ndarray] | float]:
     """
     Applies UAMDS to the specified normal distributions (given as means and covariance matrices).
 
@@ -477,9 +609,24 @@ def apply_uamds(means: list[np.ndarray], covs: list[np.ndarray], target_dim=2) -
     means : list
         list of vectors that resemble the means of the normal distributions
     covs : list
-        list of matrices that resemble the covariances of the normal distributions
+        list of matrices that resemble the covariances of the normal distributions,
+        may be None if factors or variances are given
     target_dim : int
         the dimensionality of the projection space, 2 by default
+    dtype : np.dtype
+        floating point type of the constants, transforms and numba kernels, the type of the means and
+        covariances if None (np.float64 for integer inputs). np.float32 halves the memory of the precomputed constants, which is usually precise enough for
+        visualization. Use precompile(np.float32) to compile the single precision kernels ahead of time.
+    mode : str
+        'precomputed', 'on_the_fly' or 'auto' (see precalculate_constants). 'auto' computes the pair terms
+        on the fly if storing them would exceed 1 GiB, e.g. for many high-dimensional distributions.
+    factors : np.ndarray
+        optional low-rank factors of shape (n, d, r) of the covariance matrices, i.e.,
+        cov_i = factors[i] @ factors[i].T + diag(variances[i]). With isotropic variances, the covariance matrices
+        are decomposed from the factors in O(d^2 r) instead of O(d^3) (see precalculate_constants).
+    variances : np.ndarray
+        variances of shape (n, d) of diagonal covariance matrices, or added to the low-rank part if factors are
+        given, zero if None
 
     Returns
     -------
@@ -492,22 +639,34 @@ def apply_uamds(means: list[np.ndarray], covs: list[np.ndarray], target_dim=2) -
             ['projection']: list of projection matrices for affine transform of high-dimensional means and covs
             ['stress']: remaining stress of the projection
     """
+    if factors is not None and variances is None:
+        variances = np.zeros(factors.shape[:2], dtype=factors.dtype)
+    if covs is None:
+        # the specification holds the dense matrices, the factors only speed up their decomposition
+        covs = variances[:, :, np.newaxis] * np.eye(variances.shape[1], dtype=variances.dtype)
+        if factors is not None:
+            covs = covs + factors @ factors.transpose(0, 2, 1)
     normal_distr_spec = mk_normal_distr_spec(means, covs)
+    if dtype is None:
+        dtype = normal_distr_spec.dtype if np.issubdtype(normal_distr_spec.dtype, np.floating) else np.float64
+    normal_distr_spec = normal_distr_spec.astype(dtype, copy=False)
+    if factors is not None:
+        factors, variances = factors.astype(dtype, copy=False), variances.astype(dtype, copy=False)
     d_hi = normal_distr_spec.shape[1]
     n = normal_distr_spec.shape[0] // (d_hi + 1)
     # initialization
-    uamds_transforms = np.random.rand(normal_distr_spec.shape[0], target_dim)
+    uamds_transforms = np.random.rand(normal_distr_spec.shape[0], target_dim).astype(dtype, copy=False)
     avg_dist_hi = distance_matrix(normal_distr_spec[:n,:], normal_distr_spec[:n,:]).mean()
     avg_dist_lo = distance_matrix(uamds_transforms[:n,:], uamds_transforms[:n,:]).mean()
     uamds_transforms[:n,:] *= (avg_dist_hi/avg_dist_lo)
     # compute UAMDS
-    pre = precalculate_constants(normal_distr_spec)
+    pre = precalculate_constants(normal_distr_spec, mode, factors=factors, variances=variances)
     uamds_transforms = minimize_scipy(normal_distr_spec, uamds_transforms, pre)
     s = stress(normal_distr_spec, uamds_transforms, pre)
     # perform projection
-    normal_distribs_lo = perform_projection(normal_distr_spec, uamds_transforms)
+    normal_distribs_lo = perform_projection(normal_distr_spec, uamds_transforms, factors, variances)
     means_lo, covs_lo = get_means_covs(normal_distribs_lo)
-    affine_transforms = convert_xform_uamds_to_affine(normal_distr_spec, uamds_transforms)
+    affine_transforms = convert_xform_uamds_to_affine(normal_distr_spec, uamds_transforms, factors, variances)
     translations = affine_transforms[:n,:]
     translations = [translations[i, :] for i in range(n)]
     projection_matrices = affine_transforms[n:,:]
@@ -521,35 +680,43 @@ def apply_uamds(means: list[np.ndarray], covs: list[np.ndarray], target_dim=2) -
     }
 
 
-def uamds(distributions: list, dims: int=2, seed: int=0):
+def uamds(distributions: list, dims: int=2, seed: int=0, dtype: np.dtype = None, mode: str = "auto"):
     """
     Applies the UAMDS algorithm to the provided distributions and returns the projected distributions
     in lower-dimensional space. It assumes multivariate normal distributions.
     If you supply other distributions that provide mean and covariance, these values would be used
-    to approximate a normal distribution.
+    to approximate a normal distribution. If all distributions have a low-rank-plus-diagonal covariance matrix
+    (see uadapy.covariance), the covariance matrices are decomposed from their factors.
 
     Parameters
     ----------
-    distributions : list
+    distributions : list or DistributionSet
         list of input distributions (distribution objects offering mean() and cov() methods)
+        or a DistributionSet
     dims : int
         target dimensionality, 2 by default.
     seed : int
         Set the random seed for the initialization, 0 by default
+    dtype : np.dtype
+        floating point type used for the computation, the type of the moments if None (see apply_uamds)
+    mode : str
+        whether the constants of pairs of distributions are precomputed, 'auto' by default (see apply_uamds)
 
     Returns
     -------
-    list
-        List of distributions living in projection space (i.e. of provided dimensionality)
+    list or DistributionSet
+        List of distributions living in projection space (i.e. of provided dimensionality).
+        A DistributionSet is returned if a DistributionSet was passed.
     """
     try:
         np.random.seed(seed)
-        means = [d.mean() for d in distributions]
-        covs = [d.cov() for d in distributions]
-        result = apply_uamds(means, covs, dims)
+        means, covs, factors, variances = _stack(distributions)
+        result = apply_uamds(means, covs, dims, dtype, mode, factors, variances)
+        if isinstance(distributions, DistributionSet):
+            return DistributionSet(np.stack(result['means']), np.stack(result['covs']))
         distribs_lo = []
         for (m, c) in zip(result['means'], result['covs']):
-            distribs_lo.append(distribution(multivariate_normal(m, c)))
+            distribs_lo.append(distribution(GaussianModel(m, c, validate=False)))
         return distribs_lo
     except Exception as e:
         raise Exception(f'Something went wrong. Did you input normal distributions? Exception:{e}')
@@ -607,7 +774,8 @@ def mk_normal_distr_spec(means: list[np.ndarray], covs: list[np.ndarray]) -> np.
     return np.vstack([mean_block, cov_block])
 
 
-def convert_xform_uamds_to_affine(normal_distr_spec: np.ndarray, uamds_transforms: np.ndarray) -> np.ndarray:
+def convert_xform_uamds_to_affine(normal_distr_spec: np.ndarray, uamds_transforms: np.ndarray,
+                                  factors: np.ndarray = None, variances: np.ndarray = None) -> np.ndarray:
     """
     Converts the internally used and optimized transformations into generally applicable affine transformations.
     UAMDS optimizes an affine transform per distribution, each consisting of a projection matrix and translation vector.
@@ -621,6 +789,10 @@ def convert_xform_uamds_to_affine(normal_distr_spec: np.ndarray, uamds_transform
         normal distributions specification (means followed by covariance matrices)
     uamds_transforms : np.ndarray
         uamds transformations for each distribution (low-dim means followed by local projection matrices B_i)
+    factors : np.ndarray
+        optional low-rank factors of the covariance matrices, the ones passed to precalculate_constants
+    variances : np.ndarray
+        variances that belong to the factors, the ones passed to precalculate_constants
 
     Returns
     -------
@@ -633,25 +805,17 @@ def convert_xform_uamds_to_affine(normal_distr_spec: np.ndarray, uamds_transform
             affine_transforms[n:,:] is the block of projection matrices
     """
     d_hi = normal_distr_spec.shape[1]
-    # d_lo = uamds_transforms.shape[1]
     n = normal_distr_spec.shape[0] // (d_hi + 1)
-
-    translations = []
-    projections = []
-    for i in range(n):
-        mu_lo = uamds_transforms[i, :]
-        mu_hi = normal_distr_spec[i, :]
-        B = uamds_transforms[n+i*d_hi : n+(i+1)*d_hi, :]
-        cov_hi = normal_distr_spec[n+i*d_hi : n+(i+1)*d_hi, :]
-        U = np.linalg.svd(cov_hi, full_matrices=True).U
-        P = U @ B
-        t = mu_lo - (mu_hi @ P)
-        translations.append(t)
-        projections.append(P)
-    return np.vstack([np.vstack(translations), np.vstack(projections)])
+    d_lo = uamds_transforms.shape[1]
+    U, _ = _decompose(normal_distr_spec[n:, :].reshape((n, d_hi, d_hi)), factors, variances)
+    B = uamds_transforms[n:, :].reshape((n, d_hi, d_lo))
+    projections = U @ B
+    translations = uamds_transforms[:n, :] - np.einsum('id,idk->ik', normal_distr_spec[:n, :], projections)
+    return np.vstack([translations, projections.reshape((n * d_hi, d_lo))])
         
 
-def convert_xform_affine_to_uamds(normal_distr_spec: np.ndarray, affine_transforms: np.ndarray) -> np.ndarray:
+def convert_xform_affine_to_uamds(normal_distr_spec: np.ndarray, affine_transforms: np.ndarray,
+                                  factors: np.ndarray = None, variances: np.ndarray = None) -> np.ndarray:
     """
     Does the opposite of convert_xform_uamds_to_affine.
 
@@ -661,6 +825,10 @@ def convert_xform_affine_to_uamds(normal_distr_spec: np.ndarray, affine_transfor
         normal distributions specification (means followed by covariance matrices)
     affine_transforms : np.ndarray
         affine transformations for each distribution (low-dim translations followed by projection matrices)
+    factors : np.ndarray
+        optional low-rank factors of the covariance matrices, the ones passed to precalculate_constants
+    variances : np.ndarray
+        variances that belong to the factors, the ones passed to precalculate_constants
 
     Returns
     -------
@@ -673,21 +841,12 @@ def convert_xform_affine_to_uamds(normal_distr_spec: np.ndarray, affine_transfor
             uamds_transforms[n:,:] is the block of local projection matrices
     """
     d_hi = normal_distr_spec.shape[1]
-    # d_lo = affine_transforms.shape[1]
     n = normal_distr_spec.shape[0] // (d_hi + 1)
-
-    mus_lo = []
-    Bs = []
-    for i in range(n):
-        t = affine_transforms[i, :]
-        mu_hi = normal_distr_spec[i, :]
-        P = affine_transforms[n+i*d_hi : n+(i+1)*d_hi, :]
-        cov_hi = normal_distr_spec[n+i*d_hi : n+(i+1)*d_hi, :]
-        U = np.linalg.svd(cov_hi, full_matrices=True).U
-        B = U.T @ P
-        mu_lo = (mu_hi @ P) + t
-        mus_lo.append(mu_lo)
-        Bs.append(B)
-    return np.vstack([np.vstack(mus_lo), np.vstack(Bs)])
+    d_lo = affine_transforms.shape[1]
+    U, _ = _decompose(normal_distr_spec[n:, :].reshape((n, d_hi, d_hi)), factors, variances)
+    P = affine_transforms[n:, :].reshape((n, d_hi, d_lo))
+    Bs = U.transpose(0, 2, 1) @ P
+    mus_lo = np.einsum('id,idk->ik', normal_distr_spec[:n, :], P) + affine_transforms[:n, :]
+    return np.vstack([mus_lo, Bs.reshape((n * d_hi, d_lo))])
 
 
@@ -1,60 +1,379 @@
 import numpy as np
-from uadapy import distribution
-from scipy.stats import multivariate_normal
+from uadapy import distribution, DistributionSet
+from uadapy.gaussian import GaussianModel
+from uadapy.covariance import StructuredCovariance, stack_covariances
+from uadapy.streaming import RunningMoments
+from uadapy._lazy import LazyModule
 
-def uapca(distributions, dims: int):
+linalg = LazyModule('scipy.linalg')
+
+def uapca(distributions, dims: int, dtype: np.dtype = None, solver: str = "full"):
     """
     Applies UAPCA algorithm to the distribution and returns the distribution
     in lower-dimensional space. It assumes a normal distributions. If you apply
     other distributions that provide mean and covariance, these values would be used
-    to approximate a normal distribution
-    :param distributions: List of input distributions
+    to approximate a normal distribution. If all distributions have a diagonal or all have a
+    low-rank-plus-diagonal covariance matrix (see uadapy.covariance), the dense matrices are never formed.
+    :param distributions: List of input distributions or a DistributionSet
     :param dims: Target dimension
-    :return: List of distributions in low-dimensional space
+    :param dtype: Floating point type of the computation, e.g. np.float32, the type of the moments if None
+    :param solver: Eigensolver for the principal axes, "full", "eigh" or "randomized", see compute_uapca
+    :return: List of distributions in low-dimensional space, or a DistributionSet if a DistributionSet was passed
     """
     try:
-        means = np.array([d.mean() for d in distributions])
-        covs = np.array([d.cov() for d in distributions])
-        means_pca, covs_pca = transform_uapca(means, covs, dims)
+        means, covs, factors, variances = _stack(distributions)
+        means_pca, covs_pca = transform_uapca(means, covs, dims, dtype, solver, factors, variances=variances)
+        if isinstance(distributions, DistributionSet):
+            return DistributionSet(means_pca, covs_pca)
         dist_pca = []
         for (m, c) in zip(means_pca, covs_pca):
-            dist_pca.append(distribution(multivariate_normal(m, c)))
+            dist_pca.append(distribution(GaussianModel(m, c, validate=False)))
         return dist_pca
     except Exception as e:
         raise Exception(f'Something went wrong. Did you input normal distributions? Exception:{e}')
 
 
+def _stack(distributions) -> tuple[np.ndarray, np.ndarray | None, np.ndarray | None, np.ndarray | None]:
+    # means and covariance matrices of the distributions, structured if all distributions share the structure
+    if isinstance(distributions, distribution):
+        distributions = [distributions]
+    if not isinstance(distributions, DistributionSet):
+        structures = [d.cov(structured=True) for d in distributions]
+        if all(isinstance(cov, StructuredCovariance) for cov in structures):
+            covs, factors, variances = stack_covariances(structures)
+            if covs is None:
+                return np.array([np.atleast_1d(d.mean()) for d in distributions]), covs, factors, variances
+    dist_set = DistributionSet.from_distributions(distributions)
+    return dist_set.means, dist_set.covs, None, None
+
+
 
 # Computing methods
 
-def compute_ua_cov(means: np.ndarray, covs: np.ndarray) -> np.ndarray:
+def _cov_sum(n: int, d: int, covs: np.ndarray, factors: np.ndarray, variances: np.ndarray) -> np.ndarray:
+    # sum of the covariance matrices, in O(n * d^2 * r) for factored ones
+    if covs is not None:
+        return covs.reshape((n, d, d)).sum(axis=0)
+    total = np.zeros((d, d), dtype=(factors if factors is not None else variances).dtype)
+    if factors is not None:
+        total += np.einsum('idr,ier->de', factors, factors, optimize=True)
+    if variances is not None:
+        total[np.diag_indices(d)] += variances.sum(axis=0)
+    return total
+
+
+def _project_covs(projmat: np.ndarray, covs: np.ndarray, factors: np.ndarray, variances: np.ndarray) -> np.ndarray:
+    # projmat^T cov_i projmat for all distributions at once, shape (n, k, k)
+    d, k = projmat.shape
+    if covs is not None:
+        return np.einsum('dk,ide,el->ikl', projmat, covs.reshape((-1, d, d)), projmat, optimize=True)
+    n = (factors if factors is not None else variances).shape[0]
+    projected = np.zeros((n, k, k), dtype=projmat.dtype)
+    if factors is not None:
+        projected_factors = np.einsum('idr,dk->irk', factors, projmat)
+        projected += np.einsum('irk,irl->ikl', projected_factors, projected_factors)
+    if variances is not None:
+        projected += np.einsum('dk,id,dl->ikl', projmat, variances, projmat, optimize=True)
+    return projected
+
+
+def compute_ua_cov(means: np.ndarray, covs: np.ndarray, factors: np.ndarray = None,
+                   variances: np.ndarray = None) -> np.ndarray:
+    """
+    Computes the uncertainty-aware covariance matrix, i.e., the covariance of the means plus the average
+    covariance matrix, with one matrix product instead of n outer products.
+    :param means: Means of shape (n, d)
+    :param covs: Covariance matrices of shape (n, d, d) or stacked to shape (n*d, d),
+        or None for structured covariance matrices
+    :param factors: Low-rank factors of shape (n, d, r) of structured covariance matrices, see compute_uapca
+    :param variances: Variances of shape (n, d) of structured covariance matrices, see compute_uapca
+    :return: Covariance matrix of shape (d, d)
+    """
     n = means.shape[0]
     d = means.shape[1]
-    # empirical mean
-    mu = means.mean(axis=0)
-    # centering matrix
-    centering = np.outer(mu, mu)
+    # covariance of the means, the centered form avoids cancellation between the sample and centering terms
+    centered = means - means.mean(axis=0)
+    sample_cov = centered.T @ centered / n
     # average covariance matrix
-    avg_cov = covs.reshape((n,d,d)).mean(axis=0)
-    # sample covariance
-    sample_cov = np.array([np.outer(means[i,:], means[i,:]) for i in range(n)]).mean(axis=0)
+    avg_cov = _cov_sum(n, d, covs, factors, variances) / n
     # final uncertainty aware covariance matrix
-    return sample_cov + avg_cov - centering
+    return sample_cov + avg_cov
 
 
-def compute_uapca(means: np.ndarray, covs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
-    cov = compute_ua_cov(means, covs)
-    u,s,vh = np.linalg.svd(cov, full_matrices=True)
-    return u, s
+def _ua_cov_product(means: np.ndarray, covs: np.ndarray, factors: np.ndarray, variances: np.ndarray,
+                    v: np.ndarray) -> np.ndarray:
+    # product of the uncertainty-aware covariance matrix with v of shape (d, k) without forming the matrix
+    n = means.shape[0]
+    centered = means - means.mean(axis=0)
+    product = centered.T @ (centered @ v)
+    if covs is not None:
+        product += covs.reshape((n, means.shape[1], -1)).sum(axis=0) @ v
+    if factors is not None:
+        product += np.einsum('idr,ier,ek->dk', factors, factors, v, optimize=True)
+    if variances is not None:
+        product += variances.sum(axis=0)[:, np.newaxis] * v
+    return product / n
 
 
-def transform_uapca(means, covs, dims: int=2) -> tuple[np.ndarray, np.ndarray]:
-    n = means.shape[0]
+def compute_uapca(means: np.ndarray, covs: np.ndarray = None, dims: int = None, solver: str = "full",
+                  factors: np.ndarray = None, random_state=0,
+                  variances: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the principal axes of the uncertainty-aware covariance matrix.
+    :param means: Means of shape (n, d)
+    :param covs: Covariance matrices of shape (n, d, d) or stacked to shape (n*d, d)
+    :param dims: Number of principal axes, all d axes if None
+    :param solver: "full" for a singular value decomposition of the covariance matrix, "eigh" for a partial
+        symmetric eigendecomposition of the top dims axes, "randomized" for a randomized range finder with
+        power iterations (Halko et al.), which only needs products with the covariance matrix. "full" and
+        "eigh" are exact, "randomized" is an approximation that is only accurate if the top dims eigenvalues
+        are well separated from the rest of the spectrum.
+    :param factors: Covariance matrices in factored form, array of shape (n, d, r) with cov_i = F_i F_i^T,
+        used instead of covs. The randomized solver then never forms a d x d matrix.
+    :param random_state: Seed or generator for the randomized solver
+    :param variances: Variances of shape (n, d) of diagonal covariance matrices used instead of covs,
+        or added to the low-rank part if factors are given, i.e., cov_i = F_i F_i^T + diag(variances_i)
+    :return: The principal axes as columns of shape (d, k) and the variances along them of shape (k,),
+        in decreasing order, where k = d for "full" and k = dims otherwise
+    """
     d = means.shape[1]
-    eigvecs, eigvals = compute_uapca(means, covs)
+    dims = d if dims is None else dims
+    if solver == "randomized":
+        return _randomized_axes(lambda v: _ua_cov_product(means, covs, factors, variances, v),
+                                d, dims, means.dtype, random_state)
+    return _principal_axes(compute_ua_cov(means, covs, factors, variances), dims, solver, random_state)
+
+
+def _principal_axes(cov: np.ndarray, dims: int, solver: str, random_state) -> tuple[np.ndarray, np.ndarray]:
+    d = cov.shape[0]
+    dims = d if dims is None else dims
+    if solver == "full":
+        u, s, vh = np.linalg.svd(cov, full_matrices=True)
+        return u, s
+    if solver == "eigh":
+        eigvals, eigvecs = linalg.eigh(cov, subset_by_index=[d - dims, d - 1])
+        return eigvecs[:, ::-1], eigvals[::-1]
+    if solver == "randomized":
+        return _randomized_axes(lambda v: cov @ v, d, dims, cov.dtype, random_state)
+    raise ValueError(f"Unknown solver: {solver}")
+
+
+def _randomized_axes(product, d: int, dims: int, dtype: np.dtype, random_state, oversampling: int = 10,
+                     power_iterations: int = 7) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(random_state)
+    basis = rng.standard_normal((d, min(d, dims + oversampling))).astype(dtype, copy=False)
+    for _ in range(power_iterations):
+        # the range is re-orthonormalized after every product to keep small components from vanishing
+        basis, _ = np.linalg.qr(product(basis))
+    projected = basis.T @ product(basis)
+    eigvals, eigvecs = np.linalg.eigh((projected + projected.T) / 2)
+    order = np.argsort(eigvals)[::-1][:dims]
+    return basis @ eigvecs[:, order], eigvals[order]
+
+
+def transform_uapca(means, covs, dims: int=2, dtype: np.dtype = None, solver: str = "full",
+                    factors: np.ndarray = None, random_state=0,
+                    variances: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Projects normal distributions onto their top dims uncertainty-aware principal axes.
+    :param means: Means of shape (n, d)
+    :param covs: Covariance matrices of shape (n, d, d) or stacked to shape (n*d, d),
+        may be None if factors or variances are given
+    :param dims: Target dimension
+    :param dtype: Floating point type of the computation, the type of the inputs if None
+    :param solver: Eigensolver, see compute_uapca
+    :param factors: Covariance matrices in factored form of shape (n, d, r), see compute_uapca
+    :param random_state: Seed or generator for the randomized solver
+    :param variances: Variances of shape (n, d) of diagonal or low-rank-plus-diagonal covariance matrices,
+        see compute_uapca
+    :return: Projected means of shape (n, dims) and covariance matrices of shape (n, dims, dims),
+        or stacked to shape (n*dims, dims) if the covariance matrices were passed stacked
+    """
+    if dtype is not None:
+        means = np.asarray(means, dtype=dtype)
+        covs = None if covs is None else np.asarray(covs, dtype=dtype)
+        factors = None if factors is None else np.asarray(factors, dtype=dtype)
+        variances = None if variances is None else np.asarray(variances, dtype=dtype)
+    n = means.shape[0]
+    eigvecs, eigvals = compute_uapca(means, covs, dims, solver, factors, random_state, variances)
     projmat = eigvecs[:, :dims]
     projected_means = means @ projmat
-    projected_covs = np.vstack(
-        [projmat.T @ covs[i*d:(i+1)*d, :] @ projmat for i in range(n)]
-    )
-    return projected_means, projected_covs
\ No newline at end of file
+    projected_covs = _project_covs(projmat, covs, factors, variances)
+    if covs is not None and covs.ndim == 2:
+        projected_covs = projected_covs.reshape((n * dims, dims))
+    return projected_means, projected_covs
+
+
+class UAPCA:
+    """
+    UAPCA estimator that keeps the principal axes after fitting, so that further distributions are projected
+    with one batched matrix product and without recomputing the eigendecomposition. All axes computed by
+    the solver are cached, which allows to project onto fewer dimensions than dims without refitting.
+    """
+
+    def __init__(self, dims: int = 2, dtype: np.dtype = None, solver: str = "full", random_state=0):
+        """
+        :param dims: Default target dimension of transform(). The "full" solver caches
+            all d axes, the other solvers only the first dims axes.
+        :param dtype: Floating point type of the projected distributions, the type of the moments if None
+        :param solver: Eigensolver for the principal axes, see compute_uapca
+        :param random_state: Seed or generator for the randomized solver
+        """
+        self.dims = dims
+        self.dtype = dtype
+        self.solver = solver
+        self.random_state = random_state
+        self._eigvecs = None
+        self._eigvals = None
+        self._projections = {}
+
+    def _axes(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._eigvecs is None:
+            raise ValueError("The estimator has not been fitted yet")
+        return self._eigvecs, self._eigvals
+
+    def _set_axes(self, eigvecs: np.ndarray | None, eigvals: np.ndarray | None):
+        self._eigvecs = eigvecs
+        self._eigvals = eigvals
+        self._projections = {}
+
+    @property
+    def components(self) -> np.ndarray:
+        """
+        The principal axes as columns, shape (d, dims).
+        """
+        return self._axes()[0][:, :self.dims]
+
+    @property
+    def explained_variance(self) -> np.ndarray:
+        """
+        The variances along the principal axes, shape (dims,).
+        """
+        return self._axes()[1][:self.dims]
+
+    def fit(self, distributions) -> 'UAPCA':
+        """
+        Computes the principal axes of the distributions.
+        :param distributions: List of distributions or a DistributionSet
+        :return: The estimator
+        """
+        means, covs, factors, variances = _stack(distributions)
+        self._set_axes(*compute_uapca(means, covs, self.dims, self.solver, factors, self.random_state, variances))
+        return self
+
+    def _projection(self, dims: int) -> np.ndarray:
+        # the cached slice of the basis in the target type, shared by all calls with the same dims
+        if dims not in self._projections:
+            eigvecs = self._axes()[0]
+            if dims > eigvecs.shape[1]:
+                raise ValueError(f"The estimator was fitted with {eigvecs.shape[1]} axes, fit again with dims={dims}")
+            projmat = eigvecs[:, :dims]
+            self._projections[dims] = projmat if self.dtype is None else projmat.astype(self.dtype)
+        return self._projections[dims]
+
+    def transform(self, distributions, dims: int = None):
+        """
+        Projects distributions onto the principal axes.
+        :param distributions: List of distributions or a DistributionSet
+        :param dims: Target dimension, the dims of the estimator if None. At most the number of cached axes.
+        :return: List of distributions in low-dimensional space, or a DistributionSet if a DistributionSet was passed
+        """
+        projmat = self._projection(dims or self.dims)
+        means, *covs = _stack(distributions)
+        if self.dtype is not None:
+            means = np.asarray(means, dtype=self.dtype)
+            covs = [None if c is None else np.asarray(c, dtype=self.dtype) for c in covs]
+        means_pca = means @ projmat
+        covs_pca = _project_covs(projmat, *covs)
+        if isinstance(distributions, DistributionSet):
+            return DistributionSet(means_pca, covs_pca)
+        return [distribution(GaussianModel(m, c, validate=False)) for m, c in zip(means_pca, covs_pca)]
+
+    def fit_transform(self, distributions, dims: int = None):
+        """
+        Fits the estimator and projects the same distributions, see fit() and transform().
+        """
+        return self.fit(distributions).transform(distributions, dims)
+
+
+class IncrementalUAPCA(UAPCA):
+    """
+    UAPCA fitted shard by shard. Only the sufficient statistics are kept, i.e., the running mean and
+    scatter matrix of the means (see uadapy.streaming.RunningMoments) and the sum of the covariance
+    matrices, so that the memory is O(d^2) independent of the number of distributions. The principal
+    axes are computed when they are needed first after the last call of partial_fit().
+    Estimators fitted on different shards can be combined with merge().
+    """
+
+    def __init__(self, dims: int = 2, dtype: np.dtype = None, solver: str = "full", random_state=0):
+        """
+        :param dims: Target dimension
+        :param dtype: Floating point type of the projected distributions, the type of the moments if None
+        :param solver: Eigensolver for the principal axes, see compute_uapca
+        :param random_state: Seed or generator for the randomized solver
+        """
+        super().__init__(dims, dtype, solver, random_state)
+        self._means = None
+        self._cov_sum = None
+
+    @property
+    def n(self) -> int:
+        """
+        Number of distributions fitted so far.
+        """
+        return 0 if self._means is None else self._means.n
+
+    def fit(self, distributions) -> 'IncrementalUAPCA':
+        """
+        Discards the statistics fitted so far and fits the given distributions.
+        :param distributions: List of distributions or a DistributionSet
+        :return: The estimator
+        """
+        self._means = None
+        self._cov_sum = None
+        return self.partial_fit(distributions)
+
+    def partial_fit(self, distributions) -> 'IncrementalUAPCA':
+        """
+        Adds a shard of distributions to the sufficient statistics.
+        :param distributions: List of distributions or a DistributionSet
+        :return: The estimator
+        """
+        means, covs, factors, variances = _stack(distributions)
+        n, d = means.shape
+        if self._means is None:
+            self._means = RunningMoments(d)
+            self._cov_sum = np.zeros((d, d))
+        self._means.update(means)
+        self._cov_sum += _cov_sum(n, d, covs, factors, variances)
+        self._set_axes(None, None)
+        return self
+
+    def merge(self, other: 'IncrementalUAPCA') -> 'IncrementalUAPCA':
+        """
+        Adds the sufficient statistics of an estimator fitted on other shards.
+        :param other: The other estimator
+        :return: The estimator
+        """
+        if other._means is None:
+            return self
+        if self._means is None:
+            self._means = RunningMoments(other._means.dim)
+            self._cov_sum = np.zeros_like(other._cov_sum)
+        self._means.merge(other._means)
+        self._cov_sum += other._cov_sum
+        self._set_axes(None, None)
+        return self
+
+    def ua_cov(self) -> np.ndarray:
+        """
+        :return: The uncertainty-aware covariance matrix of all distributions fitted so far, shape (d, d)
+        """
+        if self._means is None:
+            raise ValueError("The estimator has not been fitted yet")
+        return (self._means.m2 + self._cov_sum) / self._means.n
+
+    def _axes(self) -> tuple[np.ndarray, np.ndarray]:
+        if self._eigvecs is None:
+            self._set_axes(*_principal_axes(self.ua_cov(), self.dims, self.solver, self.random_state))
+        return self._eigvecs, self._eigvals
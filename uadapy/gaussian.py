@@ -0,0 +1,314 @@
+"""
+Lightweight normal distribution models. Creating a scipy.stats.multivariate_normal runs an
+eigendecomposition and validates the covariance matrix, which dominates the cost when many small
+distributions are created, e.g. the projected distributions of the dimensionality reduction methods.
+Multimodal distributions can be represented by Gaussian mixtures, whose densities are evaluated in
+O(K) per point for K components instead of O(n) for the kernel density estimate of n samples.
+"""
+
+import numpy as np
+from uadapy._lazy import LazyModule
+from uadapy.covariance import StructuredCovariance
+
+linalg = LazyModule('scipy.linalg')
+special = LazyModule('scipy.special')
+
+_LOG_2PI = float(np.log(2 * np.pi))
+
+
+class GaussianModel:
+    """
+    Multivariate normal distribution with the mean and covariance matrix stored as they are.
+    The factor of the covariance matrix (Cholesky decomposition) is computed on first use and reused for
+    all following density evaluations and samples. pdf(), logpdf() and rvs() follow the conventions of
+    scipy.stats.multivariate_normal, so that the model can be used in its place. Densities and samples are
+    computed in the floating point type of the mean, e.g. in single precision for np.float32 parameters.
+    A structured covariance matrix (see uadapy.covariance) is kept as it is in the attribute structure,
+    densities and samples are then computed from the structure and the dense matrix is only formed when
+    the attribute cov is accessed.
+    """
+
+    __slots__ = ('mean', '_cov', 'structure', 'dim', '_factor', '_triangular', '_log_det')
+
+    def __init__(self, mean: np.ndarray | float, cov: np.ndarray | float, validate: bool = True,
+                 factor: np.ndarray = None):
+        """
+        Creates the normal distribution.
+        :param mean: Mean vector of shape (d,)
+        :param cov: Covariance matrix of shape (d, d) or a structured covariance matrix, e.g.
+            uadapy.covariance.DiagonalCovariance. If validate is True, a scalar or a vector of
+            variances is accepted as well.
+        :param validate: Checks the shapes and whether the covariance matrix is symmetric and positive
+            semi-definite. Pass False to skip all checks and conversions when the inputs are known to be
+            a float vector and a valid covariance matrix, e.g. results of a projection.
+        :param factor: The lower Cholesky factor of cov if it is already known, e.g. from a Cholesky update
+            (see uadapy.streaming.cholesky_update), so that it is not recomputed on first use
+        """
+        structure = cov if isinstance(cov, StructuredCovariance) else None
+        if validate and structure is not None:
+            mean = np.atleast_1d(np.asarray(mean, dtype=_float_type(mean)))
+            if mean.shape != (structure.dim,):
+                raise ValueError(f"The mean has shape {mean.shape}, expected {(structure.dim,)}")
+        elif validate:
+            dtype = _float_type(mean, cov)
+            mean = np.atleast_1d(np.asarray(mean, dtype=dtype))
+            if mean.ndim != 1:
+                raise ValueError(f"The mean has to be a vector, got shape {mean.shape}")
+            cov = np.asarray(cov, dtype=dtype)
+            if cov.ndim == 0:
+                cov = cov * np.eye(mean.shape[0])
+            elif cov.ndim == 1:
+                cov = np.diag(cov)
+            if cov.shape != (mean.shape[0], mean.shape[0]):
+                raise ValueError(f"The covariance matrix has shape {cov.shape}, expected {(mean.shape[0],) * 2}")
+            if not np.allclose(cov, cov.T):
+                raise ValueError("The covariance matrix is not symmetric")
+        self.mean = mean
+        self.structure = structure
+        self._cov = None if structure is not None else cov
+        self.dim = mean.shape[0]
+        self._factor = factor
+        self._triangular = factor is not None
+        self._log_det = None
+        if validate and structure is None and factor is None:
+            self._factorize()
+            if not self._triangular and np.any(np.linalg.eigvalsh(cov) < -1e-8 * np.abs(cov).max()):
+                raise ValueError("The covariance matrix is not positive semi-definite")
+
+    @property
+    def cov(self) -> np.ndarray:
+        """
+        The dense covariance matrix of shape (d, d), formed on every access for structured covariance matrices.
+        """
+        if self._cov is None:
+            return self.structure.dense()
+        return self._cov
+
+    def _factorize(self):
+        try:
+            self._factor = np.linalg.cholesky(self.cov)
+            self._triangular = True
+        except np.linalg.LinAlgError:
+            w, v = np.linalg.eigh(self.cov)
+            self._factor = v * np.sqrt(np.clip(w, 0, None))
+            self._triangular = False
+
+    @property
+    def factor(self) -> np.ndarray:
+        """
+        Matrix A with A @ A.T = cov, the lower Cholesky factor if the covariance matrix is positive definite.
+        """
+        if self._factor is None:
+            self._factorize()
+        return self._factor
+
+    def logpdf(self, x: np.ndarray | float) -> np.ndarray | float:
+        """
+        Evaluates the log-density at the given points.
+        :param x: Points of shape (m, d), a single point of shape (d,), or points of shape (m,) if d is 1
+        :return: The log-densities, squeezed like scipy.stats.multivariate_normal.logpdf
+        """
+        if self.structure is not None:
+            if self._log_det is None:
+                self._log_det = self.structure.log_det()
+            x = np.asarray(x, dtype=self.mean.dtype).reshape((-1, self.dim))
+            maha = self.structure.mahalanobis(x - self.mean)
+            return _squeeze(-0.5 * (self.dim * _LOG_2PI + self._log_det + maha))
+        factor = self.factor
+        if not self._triangular:
+            raise ValueError("The density of a normal distribution with singular covariance matrix is undefined")
+        if self._log_det is None:
+            self._log_det = 2 * np.sum(np.log(np.diag(factor)))
+        x = np.asarray(x, dtype=self.mean.dtype).reshape((-1, self.dim))
+        z = linalg.solve_triangular(factor, (x - self.mean).T, lower=True, check_finite=False)
+        maha = np.einsum('ij,ij->j', z, z)
+        return _squeeze(-0.5 * (self.dim * _LOG_2PI + self._log_det + maha))
+
+    def pdf(self, x: np.ndarray | float) -> np.ndarray | float:
+        """
+        Evaluates the density at the given points.
+        :param x: Points of shape (m, d), a single point of shape (d,), or points of shape (m,) if d is 1
+        :return: The densities, squeezed like scipy.stats.multivariate_normal.pdf
+        """
+        return np.exp(self.logpdf(x))
+
+    def rvs(self, size: int | tuple = 1, random_state=None) -> np.ndarray:
+        """
+        Draws samples from the distribution.
+        :param size: Number of samples or shape of the sample array without the last dimension
+        :param random_state: Seed, np.random.Generator or np.random.RandomState
+        :return: Samples of shape size + (d,), squeezed like scipy.stats.multivariate_normal.rvs
+        """
+        shape = (size,) if np.ndim(size) == 0 else tuple(size)
+        latent_dim = self.dim if self.structure is None else self.structure.latent_dim
+        if isinstance(random_state, np.random.RandomState):
+            z = random_state.standard_normal(shape + (latent_dim,))
+        else:
+            z = np.random.default_rng(random_state).standard_normal(shape + (latent_dim,), dtype=self.mean.dtype)
+        if self.structure is not None:
+            return _squeeze(self.mean + self.structure.scale(z))
+        return _squeeze(self.mean + z @ self.factor.T)
+
+
+class GaussianMixture:
+    """
+    Mixture of K multivariate normal distributions. The weights, means and covariance matrices of the
+    components are stored as stacked arrays, so that the densities of all components are evaluated at once.
+    Mean and covariance matrix of the mixture are computed analytically. pdf(), logpdf() and rvs() follow
+    the conventions of scipy.stats.multivariate_normal.
+    """
+
+    __slots__ = ('weights', 'means', 'covs', 'dim', 'mean', 'cov', '_factors', '_log_dets')
+
+    def __init__(self, weights: np.ndarray, means: np.ndarray, covs: np.ndarray, validate: bool = True):
+        """
+        Creates the mixture.
+        :param weights: Weights of the components, shape (K,)
+        :param means: Means of the components, shape (K, d)
+        :param covs: Covariance matrices of the components, shape (K, d, d)
+        :param validate: Checks the shapes and normalizes the weights to sum up to one.
+            The covariance matrices have to be positive definite in any case.
+        """
+        if validate:
+            weights = np.atleast_1d(np.asarray(weights, dtype=float))
+            means = np.asarray(means, dtype=float).reshape((weights.shape[0], -1))
+            d = means.shape[1]
+            covs = np.asarray(covs, dtype=float).reshape((weights.shape[0], d, d))
+            if np.any(weights < 0) or weights.sum() <= 0:
+                raise ValueError("The weights of the components have to be non-negative and must not all be zero")
+            weights = weights / weights.sum()
+        self.weights = weights
+        self.means = means
+        self.covs = covs
+        self.dim = means.shape[1]
+        self.mean = weights @ means
+        centered = means - self.mean
+        self.cov = np.einsum('k,kij->ij', weights, covs) + (centered.T * weights) @ centered
+        self._factors = None
+        self._log_dets = None
+
+    @classmethod
+    def from_samples(cls, samples: np.ndarray, k: int, random_state=None, **kwargs) -> 'GaussianMixture':
+        """
+        Fits a mixture with k components to samples using the expectation-maximization algorithm
+        (sklearn.mixture.GaussianMixture).
+        :param samples: Samples of shape (n, d) or (n,)
+        :param k: Number of components
+        :param random_state: Seed for the initialization of the components
+        :param kwargs: Further options for sklearn.mixture.GaussianMixture, e.g. max_iter or n_init
+        :return: The fitted mixture
+        """
+        from sklearn.mixture import GaussianMixture as SklearnMixture
+        samples = np.asarray(samples, dtype=float)
+        samples = samples.reshape((samples.shape[0], -1))
+        fitted = SklearnMixture(n_components=k, covariance_type='full', random_state=random_state, **kwargs)
+        fitted.fit(samples)
+        return cls(fitted.weights_, fitted.means_, fitted.covariances_, validate=False)
+
+    @property
+    def factors(self) -> np.ndarray:
+        """
+        Lower Cholesky factors of the covariance matrices of the components, shape (K, d, d).
+        """
+        if self._factors is None:
+            self._factors = np.linalg.cholesky(self.covs)
+            self._log_dets = 2 * np.sum(np.log(np.diagonal(self._factors, axis1=1, axis2=2)), axis=1)
+        return self._factors
+
+    def component_logpdf(self, x: np.ndarray | float) -> np.ndarray:
+        """
+        Evaluates the log-densities of all components at the given points.
+        :param x: Points of shape (m, d), a single point of shape (d,), or points of shape (m,) if d is 1
+        :return: Array of shape (K, m)
+        """
+        factors = self.factors
+        x = np.asarray(x, dtype=float).reshape((-1, self.dim))
+        diff = x[np.newaxis, :, :] - self.means[:, np.newaxis, :]
+        z = np.linalg.solve(factors, diff.transpose(0, 2, 1))
+        maha = np.einsum('kim,kim->km', z, z)
+        return -0.5 * (self.dim * _LOG_2PI + self._log_dets[:, np.newaxis] + maha)
+
+    def logpdf(self, x: np.ndarray | float) -> np.ndarray | float:
+        """
+        Evaluates the log-density at the given points as a log-sum-exp over the weighted components.
+        :param x: Points of shape (m, d), a single point of shape (d,), or points of shape (m,) if d is 1
+        :return: The log-densities, squeezed like scipy.stats.multivariate_normal.logpdf
+        """
+        with np.errstate(divide='ignore'):
+            log_weights = np.log(self.weights)
+        return _squeeze(special.logsumexp(self.component_logpdf(x) + log_weights[:, np.newaxis], axis=0))
+
+    def pdf(self, x: np.ndarray | float) -> np.ndarray | float:
+        """
+        Evaluates the density at the given points.
+        :param x: Points of shape (m, d), a single point of shape (d,), or points of shape (m,) if d is 1
+        :return: The densities, squeezed like scipy.stats.multivariate_normal.pdf
+        """
+        return np.exp(self.logpdf(x))
+
+    def component_counts(self, n: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Number of samples drawn from every component for stratified sampling. Every component gets
+        floor(n * weight) samples, the remaining samples are assigned randomly proportional to the
+        fractional parts, so that the counts deviate from their expectation by less than one.
+        :param n: Total number of samples
+        :param rng: The random number generator
+        :return: Array of shape (K,)
+        """
+        expected = n * self.weights
+        counts = np.floor(expected).astype(int)
+        remainder = n - counts.sum()
+        if remainder > 0:
+            fractions = expected - counts
+            extra = rng.choice(len(counts), size=remainder, replace=False, p=fractions / fractions.sum())
+            counts[extra] += 1
+        return counts
+
+    def rvs(self, size: int = 1, random_state=None) -> np.ndarray:
+        """
+        Draws stratified samples, i.e., the number of samples per component is fixed by component_counts()
+        instead of being random. The samples are returned in random order.
+        :param size: Number of samples
+        :param random_state: Seed or np.random.Generator
+        :return: Samples of shape (size, d), squeezed like scipy.stats.multivariate_normal.rvs
+        """
+        rng = np.random.default_rng(random_state)
+        counts = self.component_counts(size, rng)
+        labels = np.repeat(np.arange(len(counts)), counts)
+        z = rng.standard_normal((size, self.dim))
+        samples = self.means[labels] + np.einsum('nij,nj->ni', self.factors[labels], z)
+        return _squeeze(samples[rng.permutation(size)])
+
+    def _marginal_moments(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        delta = self.means - self.mean
+        var = np.diagonal(self.covs, axis1=1, axis2=2)
+        m3 = self.weights @ (delta**3 + 3 * delta * var)
+        m4 = self.weights @ (delta**4 + 6 * delta**2 * var + 3 * var**2)
+        return np.diag(self.cov), m3, m4
+
+    def skew(self) -> np.ndarray:
+        """
+        :return: Skewness of the marginal distributions per dimension
+        """
+        m2, m3, _ = self._marginal_moments()
+        return m3 / m2**1.5
+
+    def kurt(self) -> np.ndarray:
+        """
+        :return: Excess kurtosis of the marginal distributions per dimension
+        """
+        m2, _, m4 = self._marginal_moments()
+        return m4 / m2**2 - 3
+
+
+def _float_type(*values) -> np.dtype:
+    # the floating point type of the parameters, e.g. np.float32, integer parameters are converted to float
+    dtype = np.result_type(*[np.asarray(value) for value in values])
+    return dtype if np.issubdtype(dtype, np.floating) else np.dtype(float)
+
+
+def _squeeze(out: np.ndarray) -> np.ndarray | float:
+    out = out.squeeze()
+    if out.ndim == 0:
+        return out[()]
+    return out
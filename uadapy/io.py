@@ -0,0 +1,193 @@
+"""
+Saving and loading collections of distributions in a columnar binary format. An archive is a directory
+of .npy files holding the stacked means and covariance matrices of all distributions, the type of every
+distribution and the concatenated samples and mixture components with offsets per distribution.
+Univariate samples are stored as a column and restored to their original shape when they are loaded.
+Archives are opened memory-mapped, so that only the moments or samples that are accessed are read.
+"""
+
+import json
+import os
+from collections.abc import Sequence
+import numpy as np
+from uadapy.distribution import distribution
+from uadapy.distribution_set import DistributionSet
+from uadapy.gaussian import GaussianModel, GaussianMixture
+
+FORMAT_VERSION = 2
+
+NORMAL = 0
+SAMPLES = 1
+MIXTURE = 2
+
+# scipy types are matched by name like in uadapy.registry, so that saving does not import scipy.stats
+_NORMAL_TYPES = {'scipy.stats._multivariate.multivariate_normal_frozen'}
+
+
+def save(path: str | os.PathLike, distributions):
+    """
+    Saves distributions to a directory, which is created if it does not exist. Normal distributions
+    (GaussianModel, scipy multivariate normal, or a DistributionSet) are stored by their mean and covariance,
+    sample-based distributions additionally by their samples and Gaussian mixtures by their components.
+    The means and covariance matrices of all distributions are stored, so that they can be loaded without
+    reading the samples.
+    :param path: Path of the directory
+    :param distributions: List of distributions of the same dimensionality or a DistributionSet
+    """
+    os.makedirs(path, exist_ok=True)
+    if isinstance(distributions, DistributionSet):
+        n = len(distributions)
+        _save_arrays(path, distributions.means, distributions.covs, np.full(n, NORMAL, dtype=np.int8),
+                     np.array([distributions.name] * n), np.zeros(n + 1, dtype=np.int64), np.zeros(n, dtype=np.int8),
+                     np.zeros(n + 1, dtype=np.int64))
+        np.save(os.path.join(path, 'samples.npy'), np.zeros((0, distributions.dim)))
+        return
+
+    if isinstance(distributions, distribution):
+        distributions = [distributions]
+    types = np.array([_type_of(d) for d in distributions], dtype=np.int8)
+    dims = {d.dim for d in distributions}
+    if len(dims) > 1:
+        raise ValueError(f"All distributions need to have the same dimensionality, got {sorted(dims)}")
+    dim = dims.pop()
+    means = np.array([np.reshape(d.mean(), (dim,)) for d in distributions])
+    covs = np.array([np.reshape(d.cov(), (dim, dim)) for d in distributions])
+    names = np.array([d.name for d in distributions])
+
+    sample_counts = [d.model.shape[0] if t == SAMPLES else 0 for d, t in zip(distributions, types)]
+    sample_offsets = np.concatenate([[0], np.cumsum(sample_counts)]).astype(np.int64)
+    # univariate samples of shape (N,) are stored as a column, their shape is restored by the archive
+    sample_ndims = np.array([np.ndim(d.model) if t == SAMPLES else 0 for d, t in zip(distributions, types)],
+                            dtype=np.int8)
+    # the samples are copied into a memory-mapped file one distribution at a time
+    samples = np.lib.format.open_memmap(os.path.join(path, 'samples.npy'), mode='w+', dtype=float,
+                                        shape=(int(sample_offsets[-1]), dim))
+    for i, (d, t) in enumerate(zip(distributions, types)):
+        if t == SAMPLES:
+            samples[sample_offsets[i]:sample_offsets[i + 1]] = np.reshape(d.model, (-1, dim))
+    samples.flush()
+    del samples
+
+    mixtures = [d.model for d, t in zip(distributions, types) if t == MIXTURE]
+    component_counts = [len(d.model.weights) if t == MIXTURE else 0 for d, t in zip(distributions, types)]
+    mixture_offsets = np.concatenate([[0], np.cumsum(component_counts)]).astype(np.int64)
+    if mixtures:
+        np.save(os.path.join(path, 'mixture_weights.npy'), np.concatenate([m.weights for m in mixtures]))
+        np.save(os.path.join(path, 'mixture_means.npy'), np.concatenate([m.means for m in mixtures]))
+        np.save(os.path.join(path, 'mixture_covs.npy'), np.concatenate([m.covs for m in mixtures]))
+    _save_arrays(path, means, covs, types, names, sample_offsets, sample_ndims, mixture_offsets)
+
+
+def _type_of(d: distribution) -> int:
+    if isinstance(d.model, np.ndarray):
+        return SAMPLES
+    if isinstance(d.model, GaussianMixture):
+        return MIXTURE
+    type_names = {f'{cls.__module__}.{cls.__qualname__}' for cls in type(d.model).__mro__}
+    if isinstance(d.model, GaussianModel) or type_names & _NORMAL_TYPES:
+        return NORMAL
+    raise ValueError(f"Distributions of type {d.model.__class__.__name__} cannot be saved. {d.name}")
+
+
+def _save_arrays(path, means, covs, types, names, sample_offsets, sample_ndims, mixture_offsets):
+    np.save(os.path.join(path, 'means.npy'), means)
+    np.save(os.path.join(path, 'covs.npy'), covs)
+    np.save(os.path.join(path, 'types.npy'), types)
+    np.save(os.path.join(path, 'names.npy'), names)
+    np.save(os.path.join(path, 'sample_offsets.npy'), sample_offsets)
+    np.save(os.path.join(path, 'sample_ndims.npy'), sample_ndims)
+    np.save(os.path.join(path, 'mixture_offsets.npy'), mixture_offsets)
+    with open(os.path.join(path, 'meta.json'), 'w') as file:
+        json.dump({'version': FORMAT_VERSION, 'count': len(types), 'dim': means.shape[1]}, file)
+
+
+def load(path: str | os.PathLike, mmap: bool = True) -> 'DistributionArchive':
+    """
+    Opens an archive written by save().
+    :param path: Path of the directory
+    :param mmap: If True, the arrays are memory-mapped and only read when they are accessed,
+        otherwise they are loaded into memory
+    :return: The archive, a sequence of distributions
+    """
+    return DistributionArchive(path, mmap)
+
+
+class DistributionArchive(Sequence):
+    """
+    A sequence of distributions backed by the arrays of an archive. The distributions are created when
+    they are accessed. Sample-based distributions keep their samples memory-mapped and get their mean and
+    covariance matrix from the archive, so that the samples are only read when they are used.
+    """
+
+    def __init__(self, path: str | os.PathLike, mmap: bool = True):
+        """
+        :param path: Path of the archive directory
+        :param mmap: If True, the arrays are memory-mapped, otherwise they are loaded into memory
+        """
+        with open(os.path.join(path, 'meta.json')) as file:
+            meta = json.load(file)
+        if meta['version'] > FORMAT_VERSION:
+            raise ValueError(f"Unsupported archive version {meta['version']}")
+        self.path = path
+        self.version = meta['version']
+        self.dim = meta['dim']
+        self._mmap_mode = 'r' if mmap else None
+        self._count = meta['count']
+        self._arrays = {}
+
+    def _array(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            self._arrays[name] = np.load(os.path.join(self.path, name + '.npy'), mmap_mode=self._mmap_mode)
+        return self._arrays[name]
+
+    @property
+    def means(self) -> np.ndarray:
+        return self._array('means')
+
+    @property
+    def covs(self) -> np.ndarray:
+        return self._array('covs')
+
+    @property
+    def types(self) -> np.ndarray:
+        return self._array('types')
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("archive index out of range")
+        name = str(self._array('names')[index])
+        mean = np.array(self.means[index])
+        cov = np.array(self.covs[index])
+        kind = self.types[index]
+        if kind == SAMPLES:
+            offsets = self._array('sample_offsets')
+            samples = self._array('samples')[offsets[index]:offsets[index + 1]]
+            # archives of version 1 do not record the shape of univariate samples
+            if self.version >= 2 and self._array('sample_ndims')[index] == 1:
+                samples, mean, cov = samples[:, 0], mean[0], cov[0, 0]
+            d = distribution(samples, name)
+            d.set_moments(mean, cov)
+            return d
+        if kind == MIXTURE:
+            offsets = self._array('mixture_offsets')
+            components = slice(offsets[index], offsets[index + 1])
+            mixture = GaussianMixture(np.array(self._array('mixture_weights')[components]),
+                                      np.array(self._array('mixture_means')[components]),
+                                      np.array(self._array('mixture_covs')[components]), validate=False)
+            return distribution(mixture, name)
+        return distribution(GaussianModel(mean, cov, validate=False), name)
+
+    def to_set(self) -> DistributionSet:
+        """
+        Reads the means and covariance matrices of all distributions into a DistributionSet.
+        Sample-based distributions and mixtures are represented by their mean and covariance matrix.
+        :return: The distribution set
+        """
+        return DistributionSet(np.array(self.means), np.array(self.covs))
@@ -0,0 +1,261 @@
+"""
+Approximate evaluation methods for Gaussian kernel density estimates (scipy.stats.gaussian_kde).
+These trade a controllable amount of accuracy for speed when the number of samples and
+query points is large.
+"""
+
+import itertools
+import numpy as np
+from uadapy._lazy import LazyModule
+from uadapy.sampling import qmc_uniform
+
+signal = LazyModule('scipy.signal')
+interpolate = LazyModule('scipy.interpolate')
+linalg = LazyModule('scipy.linalg')
+spatial = LazyModule('scipy.spatial')
+stats = LazyModule('scipy.stats')
+
+
+def binned_pdf(kde, x: np.ndarray, grid_size: int | tuple = 128, cutoff: float = 4.0) -> np.ndarray:
+    """
+    Evaluates a kernel density estimate by binning the samples onto a regular grid and convolving
+    the bin weights with the kernel via FFT. The density at the query points is linearly
+    interpolated from the grid. The cost is O(n + G log G) for n samples and G grid cells, instead
+    of O(n * m) for m query points, which makes this method well suited for dense grid queries in
+    low dimensions.
+    :param kde: The scipy.stats.gaussian_kde to evaluate
+    :param x: Query points of shape (m, d)
+    :param grid_size: Number of grid points per dimension, an int or a tuple. Larger grids are more accurate
+        but slower.
+    :param cutoff: The grid covers the query points plus cutoff kernel standard deviations in every direction.
+        Samples outside of the grid and kernel contributions beyond this distance are ignored.
+    :return: The approximated densities at the query points
+    """
+    d = kde.d
+    x = np.asarray(x).reshape((-1, d))
+    grid_size = np.broadcast_to(grid_size, (d,)).astype(int)
+    bandwidth = np.sqrt(np.diag(kde.covariance))
+    lower = x.min(axis=0) - cutoff * bandwidth
+    upper = x.max(axis=0) + cutoff * bandwidth
+    delta = (upper - lower) / (grid_size - 1)
+
+    # linear binning of the weighted samples onto the grid
+    pos = (kde.dataset.T - lower) / delta
+    inside = np.all((pos >= 0) & (pos <= grid_size - 1), axis=1)
+    pos = pos[inside]
+    weights = kde.weights[inside]
+    base = np.minimum(np.floor(pos).astype(int), grid_size - 2)
+    frac = pos - base
+    counts = np.zeros(np.prod(grid_size))
+    for corner in itertools.product((0, 1), repeat=d):
+        corner = np.array(corner)
+        corner_weights = weights * np.prod(np.where(corner, frac, 1 - frac), axis=1)
+        indices = np.ravel_multi_index((base + corner).T, grid_size)
+        counts += np.bincount(indices, corner_weights, minlength=counts.size)
+    counts = counts.reshape(grid_size)
+
+    # kernel sampled at the grid offsets up to the cutoff distance
+    half = np.minimum(np.ceil(cutoff * bandwidth / delta), grid_size - 1).astype(int)
+    offsets = np.meshgrid(*[np.arange(-h, h + 1) * dk for h, dk in zip(half, delta)], indexing='ij')
+    offsets = np.stack(offsets, axis=-1)
+    maha = np.einsum('...i,ij,...j->...', offsets, kde.inv_cov, offsets)
+    norm = np.sqrt(np.linalg.det(2 * np.pi * kde.covariance))
+    kernel = np.exp(-0.5 * maha) / norm
+
+    density = signal.fftconvolve(counts, kernel, mode='same')
+    axes = [np.linspace(lo, up, g) for lo, up, g in zip(lower, upper, grid_size)]
+    interpolator = interpolate.RegularGridInterpolator(axes, density, bounds_error=False, fill_value=0.0)
+    return np.clip(interpolator(x), 0, None)
+
+
+def resample_rows(samples: np.ndarray, n: int, covariance: np.ndarray | float, random_state=None,
+                  method: str = "random") -> np.ndarray:
+    """
+    Draws from the Gaussian kernel density estimate of the samples without building a
+    scipy.stats.gaussian_kde. Random rows of the samples are picked and perturbed with kernel noise,
+    where the kernel covariance follows Scott's rule like gaussian_kde. Only the picked rows are read,
+    which keeps the memory low for memory-mapped samples.
+    :param samples: Samples of shape (N, d) or (N,), e.g. a np.memmap
+    :param n: Number of samples to draw
+    :param covariance: Covariance matrix of the samples
+    :param random_state: Seed or generator for the random number generator
+    :param method: "random" for pseudo-random samples, "sobol" or "halton" for quasi-Monte Carlo samples,
+        where the first coordinate of a low-discrepancy point selects the row and the remaining
+        coordinates the kernel noise
+    :return: The drawn samples of shape (n, d)
+    """
+    rng = np.random.default_rng(random_state)
+    num_rows = samples.shape[0]
+    d = 1 if samples.ndim == 1 else samples.shape[1]
+    factor = num_rows ** (-1.0 / (d + 4))
+    kernel_cov = np.atleast_2d(covariance) * factor**2
+    if method == "random":
+        indices = rng.integers(0, num_rows, size=n)
+        noise = rng.multivariate_normal(np.zeros(d), kernel_cov, size=n)
+    else:
+        u = qmc_uniform(n, d + 1, method, rng)
+        indices = (u[:, 0] * num_rows).astype(int)
+        noise = stats.norm.ppf(u[:, 1:]) @ np.linalg.cholesky(kernel_cov).T
+    order = np.argsort(indices)
+    rows = np.empty((n, d))
+    rows[order] = np.asarray(samples[indices[order]], dtype=float).reshape((n, d))
+    return rows + noise
+
+
+def sample_kde(kde, n: int, random_state=None, method: str = "random") -> np.ndarray:
+    """
+    Draws from a built, possibly weighted, kernel density estimate, e.g. the compressed KDE of a distribution.
+    :param kde: The scipy.stats.gaussian_kde
+    :param n: Number of samples to draw
+    :param random_state: Seed or generator for the random number generator
+    :param method: "random" for pseudo-random samples, "sobol" or "halton" for quasi-Monte Carlo samples,
+        where the first coordinate of a low-discrepancy point selects the data point by its weight
+        and the remaining coordinates the kernel noise, like in resample_rows
+    :return: The drawn samples of shape (n, d)
+    """
+    rng = np.random.default_rng(random_state)
+    if method == "random":
+        return kde.resample(n, rng).T
+    u = qmc_uniform(n, kde.d + 1, method, rng)
+    cumulative = np.cumsum(kde.weights)
+    indices = np.minimum(np.searchsorted(cumulative, u[:, 0] * cumulative[-1], side='right'), kde.n - 1)
+    noise = stats.norm.ppf(u[:, 1:]) @ np.linalg.cholesky(kde.covariance).T
+    return kde.dataset.T[indices] + noise
+
+
+def coreset(samples: np.ndarray, budget: int, method: str = "kmeans", covariance: np.ndarray | float = None,
+            random_state=None, chunk_size: int = 2**16) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compresses samples into at most budget weighted points, whose weighted kernel density estimate
+    approximates the one of all samples. Evaluating the compressed estimate costs O(budget) per point
+    instead of O(N).
+    :param samples: Samples of shape (N, d) or (N,), e.g. a np.memmap
+    :param budget: Maximum number of points of the coreset
+    :param method: "kmeans" for the centers of a mini-batch k-means clustering weighted by the number of samples
+        per cluster, "herding" for kernel herding, which greedily picks the samples whose kernel mean
+        matches the one of all samples best, or "thin" for a uniformly random subset of the samples
+    :param covariance: Covariance matrix of the samples, used for the kernel of "herding". Computed if None.
+    :param random_state: Seed or generator for the random number generator
+    :param chunk_size: Number of rows processed at once, memory-mapped samples are read in chunks of this size
+    :return: Tuple of the points of shape (M, d) and their weights of shape (M,), which sum up to one,
+        with M <= budget
+    """
+    rng = np.random.default_rng(random_state)
+    num_rows = samples.shape[0]
+    d = 1 if samples.ndim == 1 else samples.shape[1]
+    if budget >= num_rows:
+        return np.asarray(samples, dtype=float).reshape((num_rows, d)), np.full(num_rows, 1 / num_rows)
+    if method == "thin":
+        indices = np.sort(rng.choice(num_rows, budget, replace=False))
+        return np.asarray(samples[indices], dtype=float).reshape((budget, d)), np.full(budget, 1 / budget)
+    if method == "kmeans":
+        return _kmeans_coreset(samples, budget, d, rng, chunk_size)
+    if method == "herding":
+        if covariance is None:
+            covariance = np.cov(np.asarray(samples, dtype=float).reshape((num_rows, d)).T)
+        return _herding_coreset(samples, budget, d, covariance, rng, chunk_size)
+    raise ValueError(f"Unknown coreset method: {method}")
+
+
+def _kmeans_coreset(samples, budget, d, rng, chunk_size):
+    from sklearn.cluster import MiniBatchKMeans
+    num_rows = samples.shape[0]
+    seed = int(rng.integers(2**31))
+    kmeans = MiniBatchKMeans(n_clusters=budget, batch_size=max(4096, 2 * budget), n_init=1, random_state=seed)
+    if isinstance(samples, np.memmap):
+        # one pass over the chunks, so that the samples are never loaded at once
+        step = max(chunk_size, budget)
+        for start in range(0, num_rows, step):
+            chunk = np.asarray(samples[start:start + step], dtype=float).reshape((-1, d))
+            if chunk.shape[0] >= budget:
+                kmeans.partial_fit(chunk)
+    else:
+        kmeans.fit(np.asarray(samples, dtype=float).reshape((num_rows, d)))
+    counts = np.zeros(budget)
+    for start in range(0, num_rows, chunk_size):
+        chunk = np.asarray(samples[start:start + chunk_size], dtype=float).reshape((-1, d))
+        counts += np.bincount(kmeans.predict(chunk), minlength=budget)
+    used = counts > 0
+    return kmeans.cluster_centers_[used], counts[used] / num_rows
+
+
+def _herding_coreset(samples, budget, d, covariance, rng, chunk_size):
+    # candidates and the reference points estimating the kernel mean embedding are random subsets,
+    # which bounds the cost by O(budget * candidates) independent of the number of samples
+    num_rows = samples.shape[0]
+    factor = num_rows ** (-1.0 / (d + 4))
+    cho_cov = np.linalg.cholesky(np.atleast_2d(covariance) * factor**2)
+
+    def draw(count):
+        indices = np.sort(rng.choice(num_rows, min(count, num_rows), replace=False))
+        rows = np.asarray(samples[indices], dtype=float).reshape((-1, d))
+        return rows, linalg.solve_triangular(cho_cov, rows.T, lower=True).T
+
+    candidates, whitened = draw(10 * budget)
+    _, reference = draw(20 * budget)
+    tree = spatial.cKDTree(whitened)
+    embedding = np.zeros(candidates.shape[0])
+    for start in range(0, reference.shape[0], chunk_size):
+        # kernel values beyond 6 bandwidths are below 1e-7 of the peak and ignored like in KDETree
+        block = spatial.cKDTree(reference[start:start + chunk_size])
+        pairs = tree.sparse_distance_matrix(block, 6.0, output_type='ndarray')
+        embedding += np.bincount(pairs['i'], np.exp(-0.5 * pairs['v']**2), minlength=candidates.shape[0])
+    embedding /= reference.shape[0]
+
+    selected = np.empty(budget, dtype=int)
+    kernel_sum = np.zeros(candidates.shape[0])
+    for t in range(budget):
+        score = embedding - kernel_sum / (t + 1)
+        score[selected[:t]] = -np.inf
+        selected[t] = np.argmax(score)
+        kernel_sum += np.exp(-0.5 * np.sum((whitened - whitened[selected[t]])**2, axis=1))
+    return candidates[selected], np.full(budget, 1 / budget)
+
+
+class KDETree:
+    """
+    Truncated evaluation of a kernel density estimate using a k-d tree over the samples.
+    The samples are whitened with the kernel covariance so that the kernel becomes isotropic,
+    and for every query point only the samples within cutoff kernel bandwidths (Mahalanobis
+    distance) are summed up. The absolute error of every density value is bounded by
+    error_bound(), i.e., exp(-cutoff^2 / 2) times the peak value of a single kernel.
+    """
+
+    def __init__(self, kde, cutoff: float = 4.0):
+        """
+        Builds the tree for the given kernel density estimate.
+        :param kde: The scipy.stats.gaussian_kde to evaluate
+        :param cutoff: Kernel contributions beyond this many bandwidths are ignored
+        """
+        self.d = kde.d
+        self.cutoff = cutoff
+        self.weights = kde.weights
+        self.cho_cov = linalg.cholesky(kde.covariance, lower=True)
+        self.norm = np.sqrt(np.linalg.det(2 * np.pi * kde.covariance))
+        self.tree = spatial.cKDTree(self._whiten(kde.dataset.T))
+
+    def _whiten(self, x: np.ndarray) -> np.ndarray:
+        return linalg.solve_triangular(self.cho_cov, x.T, lower=True).T
+
+    def error_bound(self) -> float:
+        """
+        :return: Upper bound of the absolute error of the densities returned by pdf()
+        """
+        return np.exp(-0.5 * self.cutoff**2) / self.norm
+
+    def pdf(self, x: np.ndarray, block_size: int = 4096) -> np.ndarray:
+        """
+        Evaluates the truncated kernel density estimate.
+        :param x: Query points of shape (m, d)
+        :param block_size: Number of query points processed at once, bounds the memory of the neighbor lists
+        :return: The densities at the query points
+        """
+        x = np.asarray(x).reshape((-1, self.d))
+        z = self._whiten(x)
+        result = np.zeros(z.shape[0])
+        for start in range(0, z.shape[0], block_size):
+            block = spatial.cKDTree(z[start:start + block_size])
+            pairs = block.sparse_distance_matrix(self.tree, self.cutoff, output_type='ndarray')
+            contributions = self.weights[pairs['j']] * np.exp(-0.5 * pairs['v']**2)
+            result[start:start + block_size] = np.bincount(pairs['i'], contributions, minlength=block.n)
+        return result / self.norm
@@ -2,8 +2,6 @@ import matplotlib
 
 from uadapy.plotting.distribution_plot import InteractiveNormal
 
-matplotlib.use("TkAgg")
-
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -310,6 +308,9 @@ class InteractiveSplom:
 
 
 def main():
+    # the interactive window needs the Tk backend, which is only selected when running this demo,
+    # so that importing this module does not change the backend of the caller
+    matplotlib.use("TkAgg")
     # dim = 7
     # mean = np.zeros(dim)
     # cov = np.eye(dim, dim)
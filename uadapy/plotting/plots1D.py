@@ -1,17 +1,23 @@
 import numpy as np
-from uadapy import distribution
+from uadapy import distribution, DistributionSet
+from uadapy.sampling import sample_parallel
 import matplotlib.pyplot as plt
 from math import ceil, sqrt
-import glasbey as gb
-import seaborn as sns
 from matplotlib.patches import Ellipse
+from uadapy._lazy import LazyModule
+
+# glasbey and seaborn are only needed for some plot types and slow to import
+gb = LazyModule('glasbey')
+sns = LazyModule('seaborn')
 
 
 def calculate_freedman_diaconis_bins(data):
-    q25, q75 = np.percentile(data, [25, 75])
+    # one partial sort selects the quartiles and the extrema instead of separate passes
+    n = len(data)
+    low, q25, q75, high = np.partition(data, [0, n // 4, (3 * n) // 4, n - 1])[[0, n // 4, (3 * n) // 4, n - 1]]
     iqr = q75 - q25
-    bin_width = 2 * iqr / np.cbrt(len(data))
-    num_bins = int((np.max(data) - np.min(data)) / bin_width)
+    bin_width = 2 * iqr / np.cbrt(n)
+    num_bins = int((high - low) / bin_width)
     return num_bins
 
 def calculate_offsets(count, max_count):
@@ -31,7 +37,7 @@ def setup_plot(distributions, num_samples, seed, fig=None, axs=None, colors=None
 
     Parameters
     ----------
-    distributions : list
+    distributions : list or DistributionSet
         List of distributions to plot. If a single distribution is passed, it will be converted into a list.
     num_samples : int
         Number of samples per distribution.
@@ -48,6 +54,10 @@ def setup_plot(distributions, num_samples, seed, fig=None, axs=None, colors=None
         - colorblind_safe : bool, optional
             If True, the plot will use colors suitable for colorblind individuals.
             Default is False.
+        - workers : int, optional
+            Number of threads sampling the distributions in parallel. Every distribution draws from
+            its own random stream spawned from the seed, so the samples do not depend on the number
+            of workers. Default is 1.
 
     Returns
     -------
@@ -65,8 +75,6 @@ def setup_plot(distributions, num_samples, seed, fig=None, axs=None, colors=None
         Number of columns in the subplot layout.
     """
 
-    samples = []
-
     if isinstance(distributions, distribution):
         distributions = [distributions]
 
@@ -95,8 +103,10 @@ def setup_plot(distributions, num_samples, seed, fig=None, axs=None, colors=None
     if num_cols == 1:
         axs = [[ax] for ax in axs]
 
-    for d in distributions:
-        samples.append(d.sample(num_samples, seed))
+    if isinstance(distributions, DistributionSet):
+        samples = list(distributions.sample(num_samples, seed))
+    else:
+        samples = sample_parallel(distributions, num_samples, seed, kwargs.get('workers', 1))
 
     # Generate Glasbey colors
     if colors is None:
@@ -116,7 +126,7 @@ def plot_1d_distribution(distributions, num_samples, plot_types:list, seed=55, f
 
     Parameters
     ----------
-    distributions : list
+    distributions : list or DistributionSet
         List of distributions to plot.
     num_samples : int
         Number of samples per distribution.
@@ -142,6 +152,10 @@ def plot_1d_distribution(distributions, num_samples, plot_types:list, seed=55, f
         - colorblind_safe : bool, optional
             If True, the plot will use colors suitable for colorblind individuals.
             Default is False.
+        - workers : int, optional
+            Number of threads sampling the distributions in parallel. Every distribution draws from
+            its own random stream spawned from the seed, so the samples do not depend on the number
+            of workers. Default is 1.
         - dot_size : float, optional
             This parameter determines the size of the dots used in the 'stripplot' and 'swarmplot'.
             If not provided, the size is calculated based on the number of samples and the type of plot.
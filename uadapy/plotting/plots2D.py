@@ -1,6 +1,8 @@
 import matplotlib.pyplot as plt
 import numpy as np
-from uadapy import distribution
+from uadapy import distribution, DistributionSet
+import uadapy.plotting.utils as utils
+from uadapy.sampling import sample_parallel
 from numpy import ma
 from matplotlib import ticker
 
@@ -8,17 +10,22 @@ def plot_samples(distributions, num_samples, **kwargs):
     """
     Plot samples from the given distribution. If several distributions should be
     plotted together, an array can be passed to this function
-    :param distributions: Distributions to plot
+    :param distributions: Distributions to plot, a list of distributions or a DistributionSet
     :param num_samples: Number of samples per distribution
     :param kwargs: Optional other arguments to pass:
         xlabel for label of x-axis
         ylabel for label of y-axis
+        seed for the random number generator
+        workers for the number of threads sampling the distributions in parallel
     :return:
     """
     if isinstance(distributions, distribution):
         distributions = [distributions]
-    for d in distributions:
-        samples = d.sample(num_samples)
+    if isinstance(distributions, DistributionSet):
+        all_samples = distributions.sample(num_samples, kwargs.get('seed'))
+    else:
+        all_samples = sample_parallel(distributions, num_samples, kwargs.get('seed'), kwargs.get('workers', 1))
+    for samples in all_samples:
         plt.scatter(x=samples[:,0], y=samples[:,1])
     if 'xlabel' in kwargs:
         plt.xlabel(kwargs['xlabel'])
@@ -32,7 +39,7 @@ def plot_contour(distributions, resolution=128, ranges=None, quantiles:list=None
 
     Parameters
     ----------
-    distributions : list
+    distributions : list or DistributionSet
         List of distributions to plot.
     resolution : int, optional
         The resolution of the plot. Default is 128.
@@ -44,6 +51,22 @@ def plot_contour(distributions, resolution=128, ranges=None, quantiles:list=None
         Seed for the random number generator for reproducibility. It defaults to 55 if not provided.
     **kwargs : additional keyword arguments
         Additional optional plotting arguments.
+        - pdf_method : str, optional
+            Method used to evaluate the densities of sample-based distributions on the grid,
+            'exact', 'binned' or 'tree' (see distribution.pdf). Default is 'exact'.
+        - grid_size : int or tuple, optional
+            Number of bins per dimension of the 'binned' method. Default is 128.
+        - cutoff : float, optional
+            Number of bandwidths after which the kernels are truncated by the 'binned' and 'tree'
+            methods. Default is 4.0.
+        - sampling_method : str, optional
+            Sampling method for estimating the isovalues, 'random', or 'sobol' or 'halton' for
+            quasi-Monte Carlo samples that need fewer samples for the same accuracy. Default is 'random'.
+        - log_space : bool, optional
+            If True, densities and isovalues are computed as log-densities, which avoids that small
+            densities underflow to zero in higher dimensions. Default is False.
+        - num_isovalue_samples : int, optional
+            Number of samples for estimating the isovalues. Default is 10000.
 
     Returns
     -------
@@ -61,15 +84,7 @@ def plot_contour(distributions, resolution=128, ranges=None, quantiles:list=None
     contour_colors = generate_spectrum_colors(len(distributions))
 
     if ranges is None:
-        min_val = np.zeros(distributions[0].mean().shape)+1000
-        max_val = np.zeros(distributions[0].mean().shape)-1000
-        cov_max = np.zeros(distributions[0].mean().shape)
-        for d in distributions:
-            min_val=np.min(np.array([d.mean(), min_val]), axis=0)
-            max_val=np.max(np.array([d.mean(), max_val]), axis=0)
-            cov_max = np.max(np.array([np.diagonal(d.cov()), cov_max]), axis=0)
-        cov_max = np.sqrt(cov_max)
-        ranges = [(mi-3*co, ma+3*co) for mi,ma, co in zip(min_val, max_val, cov_max)]
+        ranges = utils.compute_ranges(distributions)
     range_x = ranges[0]
     range_y = ranges[1]
     for i, d in enumerate(distributions):
@@ -78,28 +93,14 @@ def plot_contour(distributions, resolution=128, ranges=None, quantiles:list=None
         xv, yv = np.meshgrid(x, y)
         coordinates = np.stack((xv, yv), axis=-1)
         coordinates = coordinates.reshape((-1, 2))
-        pdf = d.pdf(coordinates)
+        log_space = kwargs.get('log_space', False)
+        pdf = utils.evaluate_density(d, coordinates, log_space, **utils.density_options(kwargs))
         pdf = pdf.reshape(xv.shape)
         color = contour_colors[i]
 
         # Monte Carlo approach for determining isovalues
-        isovalues = []
-        num_samples = 10_000
-        samples = d.sample(num_samples, seed)
-        densities = d.pdf(samples)
-        densities.sort()
-        if quantiles is None:
-            isovalues.append(densities[int((1 - 99.7/100) * num_samples)]) # 99.7% quantile
-            isovalues.append(densities[int((1 - 95/100) * num_samples)]) # 95% quantile
-            isovalues.append(densities[int((1 - 68/100) * num_samples)]) # 68% quantile
-        else:
-            quantiles.sort(reverse=True)
-            for quantile in quantiles:
-                if not 0 < quantile < 100:
-                    raise ValueError(f"Invalid quantile: {quantile}. Quantiles must be between 0 and 100 (exclusive).")
-                elif int((1 - quantile/100) * num_samples) >= num_samples:
-                    raise ValueError(f"Quantile {quantile} results in an index that is out of bounds.")
-                isovalues.append(densities[int((1 - quantile/100) * num_samples)])
+        isovalues = utils.compute_isovalues(d, kwargs.get('num_isovalue_samples', 10_000), quantiles, seed,
+                                            kwargs.get('sampling_method', 'random'), log_space)
 
         plt.contour(xv, yv, pdf, levels=isovalues, colors = [color])
     plt.show()
@@ -110,7 +111,7 @@ def plot_contour_bands(distributions, num_samples, resolution=128, ranges=None,
 
     Parameters
     ----------
-    distributions : list
+    distributions : list or DistributionSet
         List of distributions to plot.
     num_samples : int
         Number of samples per distribution.
@@ -124,6 +125,20 @@ def plot_contour_bands(distributions, num_samples, resolution=128, ranges=None,
         Seed for the random number generator for reproducibility. It defaults to 55 if not provided.
     **kwargs : additional keyword arguments
         Additional optional plotting arguments.
+        - pdf_method : str, optional
+            Method used to evaluate the densities of sample-based distributions on the grid,
+            'exact', 'binned' or 'tree' (see distribution.pdf). Default is 'exact'.
+        - grid_size : int or tuple, optional
+            Number of bins per dimension of the 'binned' method. Default is 128.
+        - cutoff : float, optional
+            Number of bandwidths after which the kernels are truncated by the 'binned' and 'tree'
+            methods. Default is 4.0.
+        - sampling_method : str, optional
+            Sampling method for estimating the isovalues, 'random', or 'sobol' or 'halton' for
+            quasi-Monte Carlo samples that need fewer samples for the same accuracy. Default is 'random'.
+        - log_space : bool, optional
+            If True, densities and isovalues are computed as log-densities, which avoids that small
+            densities underflow to zero in higher dimensions. Default is False.
 
     Returns
     -------
@@ -148,15 +163,7 @@ def plot_contour_bands(distributions, num_samples, resolution=128, ranges=None,
     ]
 
     if ranges is None:
-        min_val = np.zeros(distributions[0].mean().shape)+1000
-        max_val = np.zeros(distributions[0].mean().shape)-1000
-        cov_max = np.zeros(distributions[0].mean().shape)
-        for d in distributions:
-            min_val=np.min(np.array([d.mean(), min_val]), axis=0)
-            max_val=np.max(np.array([d.mean(), max_val]), axis=0)
-            cov_max = np.max(np.array([np.diagonal(d.cov()), cov_max]), axis=0)
-        cov_max = np.sqrt(cov_max)
-        ranges = [(mi-3*co, ma+3*co) for mi,ma, co in zip(min_val, max_val, cov_max)]
+        ranges = utils.compute_ranges(distributions)
     range_x = ranges[0]
     range_y = ranges[1]
     for i, d in enumerate(distributions):
@@ -165,30 +172,21 @@ def plot_contour_bands(distributions, num_samples, resolution=128, ranges=None,
         xv, yv = np.meshgrid(x, y)
         coordinates = np.stack((xv, yv), axis=-1)
         coordinates = coordinates.reshape((-1, 2))
-        pdf = d.pdf(coordinates)
+        log_space = kwargs.get('log_space', False)
+        pdf = utils.evaluate_density(d, coordinates, log_space, **utils.density_options(kwargs))
         pdf = pdf.reshape(xv.shape)
-        pdf = ma.masked_where(pdf <= 0, pdf)  # Mask non-positive values to avoid log scale issues
 
         # Monte Carlo approach for determining isovalues
-        isovalues = []
-        samples = d.sample(num_samples, seed)
-        densities = d.pdf(samples)
-        densities.sort()
-        if quantiles is None:
-            isovalues.append(densities[int((1 - 99.7/100) * num_samples)]) # 99.7% quantile
-            isovalues.append(densities[int((1 - 95/100) * num_samples)]) # 95% quantile
-            isovalues.append(densities[int((1 - 68/100) * num_samples)]) # 68% quantile
+        isovalues = utils.compute_isovalues(d, num_samples, quantiles, seed, kwargs.get('sampling_method', 'random'),
+                                            log_space)
+
+        if log_space:
+            # log-densities can be used as they are, there are no non-positive values to mask
+            plt.contourf(xv, yv, pdf, levels=isovalues, cmap=colormaps[i % len(colormaps)])
         else:
-            quantiles.sort(reverse=True)
-            for quantile in quantiles:
-                if not 0 < quantile < 100:
-                    raise ValueError(f"Invalid quantile: {quantile}. Quantiles must be between 0 and 100 (exclusive).")
-                elif int((1 - quantile/100) * num_samples) >= num_samples:
-                    raise ValueError(f"Quantile {quantile} results in an index that is out of bounds.")
-                isovalues.append(densities[int((1 - quantile/100) * num_samples)])
-
-        # Generate logarithmic levels and create the contour plot with different colormap for each distribution
-        plt.contourf(xv, yv, pdf, levels=isovalues, locator=ticker.LogLocator(), cmap=colormaps[i % len(colormaps)])
+            pdf = ma.masked_where(pdf <= 0, pdf)  # Mask non-positive values to avoid log scale issues
+            # Generate logarithmic levels and create the contour plot with different colormap for each distribution
+            plt.contourf(xv, yv, pdf, levels=isovalues, locator=ticker.LogLocator(), cmap=colormaps[i % len(colormaps)])
 
     plt.show()
 
@@ -1,14 +1,17 @@
 import matplotlib.pyplot as plt
 import numpy as np
-from uadapy import distribution
+from uadapy import distribution, DistributionSet
 import uadapy.plotting.utils as utils
+from uadapy.sampling import sample_parallel
 
 def plot_samples(distributions, num_samples, **kwargs):
     """
     Plot samples from the multivariate distribution as a SLOM
-    :param distribution: The multivariate distributions
+    :param distribution: The multivariate distributions, a list of distributions or a DistributionSet
     :param num_samples: Number of samples to draw
     :param kwargs: Optional other arguments to pass:
+        seed for the random number generator
+        workers for the number of threads sampling the distributions in parallel
     :return:
     """
     if isinstance(distributions, distribution):
@@ -22,11 +25,16 @@ def plot_samples(distributions, num_samples, **kwargs):
         ax.xaxis.set_visible(False)
         ax.yaxis.set_visible(False)
 
+    if isinstance(distributions, DistributionSet):
+        all_samples = distributions.sample(num_samples, kwargs.get('seed'))
+    else:
+        all_samples = sample_parallel(distributions, num_samples, kwargs.get('seed'), kwargs.get('workers', 1))
+
     # Fill matrix with data
     for k, d in enumerate(distributions):
         if d.dim < 2:
             raise Exception('Wrong dimension of distribution')
-        samples = d.sample(num_samples)
+        samples = all_samples[k]
         for i, j in zip(*np.triu_indices_from(axes, k=1)):
             for x, y in [(i, j), (j, i)]:
                 axes[x,y].scatter(samples[:,y], y=samples[:,x], color=contour_colors[k])
@@ -50,7 +58,7 @@ def plot_contour(distributions, num_samples, resolution=128, ranges=None, quanti
 
     Parameters
     ----------
-    distributions : list
+    distributions : list or DistributionSet
         List of distributions to plot.
     num_samples : int
         Number of samples per distribution.
@@ -64,6 +72,26 @@ def plot_contour(distributions, num_samples, resolution=128, ranges=None, quanti
         Seed for the random number generator for reproducibility. It defaults to 55 if not provided.
     **kwargs : additional keyword arguments
         Additional optional plotting arguments.
+        - pdf_method : str, optional
+            Method used to evaluate the densities of sample-based distributions on the grid,
+            'exact', 'binned' or 'tree' (see distribution.pdf). Default is 'exact'.
+        - grid_size : int or tuple, optional
+            Number of bins per dimension of the 'binned' method. Default is 128.
+        - cutoff : float, optional
+            Number of bandwidths after which the kernels are truncated by the 'binned' and 'tree'
+            methods. Default is 4.0.
+        - sampling_method : str, optional
+            Sampling method for estimating the isovalues, 'random', or 'sobol' or 'halton' for
+            quasi-Monte Carlo samples that need fewer samples for the same accuracy. Default is 'random'.
+        - log_space : bool, optional
+            If True, densities and isovalues are computed as log-densities, which avoids that small
+            densities underflow to zero in higher dimensions. Default is False.
+        - max_memory : int, optional
+            Memory budget in bytes for evaluating the densities on the grid in chunks. Default is None.
+        - dtype : np.dtype, optional
+            Floating point type of the grid, np.float32 halves its memory. Default is np.float64.
+        - workers : int, optional
+            Number of threads evaluating the densities on the grid. Default is 1.
 
     Returns
     -------
@@ -84,15 +112,7 @@ def plot_contour(distributions, num_samples, resolution=128, ranges=None, quanti
     # Create matrix
     numvars = distributions[0].dim
     if ranges is None:
-        min_val = np.zeros(distributions[0].mean().shape)+1000
-        max_val = np.zeros(distributions[0].mean().shape)-1000
-        cov_max = np.zeros(np.diagonal(distributions[0].cov()).shape)
-        for d in distributions:
-            min_val=np.min(np.array([d.mean(), min_val]), axis=0)
-            max_val=np.max(np.array([d.mean(), max_val]), axis=0)
-            cov_max = np.max(np.array([np.diagonal(d.cov()), cov_max]), axis=0)
-        cov_max = np.sqrt(cov_max)
-        ranges = [(mi-3*co, ma+3*co) for mi,ma, co in zip(min_val, max_val, cov_max)]
+        ranges = utils.compute_ranges(distributions)
     fig, axes = plt.subplots(nrows=numvars, ncols=numvars)
     for i, ax in enumerate(axes.flat):
         # Hide all ticks and labels
@@ -107,30 +127,19 @@ def plot_contour(distributions, num_samples, resolution=128, ranges=None, quanti
         test = ()
         for i in range(d.dim):
             test = (*test, i)
-            x = np.linspace(ranges[i][0], ranges[i][1], resolution)
+            x = np.linspace(ranges[i][0], ranges[i][1], resolution, dtype=kwargs.get('dtype', np.float64))
             dims = (*dims, x)
         coordinates = np.array(np.meshgrid(*dims)).transpose(tuple(range(1, numvars+1)) + (0,))
-        pdf = d.pdf(coordinates.reshape((-1, coordinates.shape[-1])))
+        log_space = kwargs.get('log_space', False)
+        pdf = utils.evaluate_density(d, coordinates.reshape((-1, coordinates.shape[-1])), log_space,
+                                     **utils.density_options(kwargs), max_memory=kwargs.get('max_memory'),
+                                     workers=kwargs.get('workers', 1))
         pdf = pdf.reshape(coordinates.shape[:-1])
         pdf = pdf.transpose((1,0)+tuple(range(2,numvars)))
 
         # Monte Carlo approach for determining isovalues
-        isovalues = []
-        samples = d.sample(num_samples, seed)
-        densities = d.pdf(samples)
-        densities.sort()
-        if quantiles is None:
-            isovalues.append(densities[int((1 - 99.7/100) * num_samples)]) # 99.7% quantile
-            isovalues.append(densities[int((1 - 95/100) * num_samples)]) # 95% quantile
-            isovalues.append(densities[int((1 - 68/100) * num_samples)]) # 68% quantile
-        else:
-            quantiles.sort(reverse=True)
-            for quantile in quantiles:
-                if not 0 < quantile < 100:
-                    raise ValueError(f"Invalid quantile: {quantile}. Quantiles must be between 0 and 100 (exclusive).")
-                elif int((1 - quantile/100) * num_samples) >= num_samples:
-                    raise ValueError(f"Quantile {quantile} results in an index that is out of bounds.")
-                isovalues.append(densities[int((1 - quantile/100) * num_samples)])
+        isovalues = utils.compute_isovalues(d, num_samples, quantiles, seed, kwargs.get('sampling_method', 'random'),
+                                            log_space)
 
         for i, j in zip(*np.triu_indices_from(axes, k=1)):
             for x, y in [(i, j), (j, i)]:
@@ -138,7 +147,7 @@ def plot_contour(distributions, num_samples, resolution=128, ranges=None, quanti
                 indices = list(np.arange(d.dim))
                 indices.remove(x)
                 indices.remove(y)
-                pdf_agg = np.sum(pdf, axis=tuple(indices))
+                pdf_agg = utils.aggregate_density(pdf, tuple(indices), log_space)
                 if x > y:
                     pdf_agg = pdf_agg.T
                 axes[x,y].contour(dims[y], dims[x], pdf_agg, levels=isovalues, colors=[color])
@@ -147,7 +156,10 @@ def plot_contour(distributions, num_samples, resolution=128, ranges=None, quanti
         for i in range(numvars):
             indices = list(np.arange(d.dim))
             indices.remove(i)
-            axes[i,i].plot(dims[i], np.sum(pdf, axis=tuple(indices)), color=color)
+            marginal = utils.aggregate_density(pdf, tuple(indices), log_space)
+            if log_space:
+                marginal = np.exp(marginal)
+            axes[i,i].plot(dims[i], marginal, color=color)
             axes[i,i].xaxis.set_visible(True)
             axes[i,i].yaxis.set_visible(True)
 
@@ -165,7 +177,7 @@ def plot_contour_samples(distributions, num_samples, resolution=128, ranges=None
 
     Parameters
     ----------
-    distributions : list
+    distributions : list or DistributionSet
         List of distributions to plot.
     num_samples : int
         Number of samples for the scatterplot.
@@ -179,6 +191,28 @@ def plot_contour_samples(distributions, num_samples, resolution=128, ranges=None
         Seed for the random number generator for reproducibility. It defaults to 55 if not provided.
     **kwargs : additional keyword arguments
         Additional optional plotting arguments.
+        - pdf_method : str, optional
+            Method used to evaluate the densities of sample-based distributions on the grid,
+            'exact', 'binned' or 'tree' (see distribution.pdf). Default is 'exact'.
+        - grid_size : int or tuple, optional
+            Number of bins per dimension of the 'binned' method. Default is 128.
+        - cutoff : float, optional
+            Number of bandwidths after which the kernels are truncated by the 'binned' and 'tree'
+            methods. Default is 4.0.
+        - sampling_method : str, optional
+            Sampling method for estimating the isovalues, 'random', or 'sobol' or 'halton' for
+            quasi-Monte Carlo samples that need fewer samples for the same accuracy. Default is 'random'.
+        - log_space : bool, optional
+            If True, densities and isovalues are computed as log-densities, which avoids that small
+            densities underflow to zero in higher dimensions. Default is False.
+        - max_memory : int, optional
+            Memory budget in bytes for evaluating the densities on the grid in chunks. Default is None.
+        - dtype : np.dtype, optional
+            Floating point type of the grid, np.float32 halves its memory. Default is np.float64.
+        - workers : int, optional
+            Number of threads evaluating the densities on the grid and drawing the samples of the
+            scatterplots. Every distribution draws from its own random stream spawned from the seed,
+            so the samples do not depend on the number of workers. Default is 1.
 
     Returns
     -------
@@ -199,52 +233,38 @@ def plot_contour_samples(distributions, num_samples, resolution=128, ranges=None
     # Create matrix
     numvars = distributions[0].dim
     if ranges is None:
-        min_val = np.zeros(distributions[0].mean().shape)+1000
-        max_val = np.zeros(distributions[0].mean().shape)-1000
-        cov_max = np.zeros(np.diagonal(distributions[0].cov()).shape)
-        for d in distributions:
-            min_val=np.min(np.array([d.mean(), min_val]), axis=0)
-            max_val=np.max(np.array([d.mean(), max_val]), axis=0)
-            cov_max = np.max(np.array([np.diagonal(d.cov()), cov_max]), axis=0)
-        cov_max = np.sqrt(cov_max)
-        ranges = [(mi-3*co, ma+3*co) for mi,ma, co in zip(min_val, max_val, cov_max)]
+        ranges = utils.compute_ranges(distributions)
     fig, axes = plt.subplots(nrows=numvars, ncols=numvars)
     for i, ax in enumerate(axes.flat):
         # Hide all ticks and labels
         ax.xaxis.set_visible(False)
         ax.yaxis.set_visible(False)
 
+    if isinstance(distributions, DistributionSet):
+        all_samples = distributions.sample(num_samples, seed, independent=True)
+    else:
+        all_samples = sample_parallel(distributions, num_samples, seed, kwargs.get('workers', 1))
+
     # Fill matrix with data
     for k, d in enumerate(distributions):
-        samples = d.sample(num_samples, seed)
+        samples = all_samples[k]
         if d.dim < 2:
             raise Exception('Wrong dimension of distribution')
         dims = ()
         for i in range(d.dim):
-            x = np.linspace(ranges[i][0], ranges[i][1], resolution)
+            x = np.linspace(ranges[i][0], ranges[i][1], resolution, dtype=kwargs.get('dtype', np.float64))
             dims = (*dims, x)
         coordinates = np.array(np.meshgrid(*dims)).transpose(tuple(range(1, numvars+1)) + (0,))
-        pdf = d.pdf(coordinates.reshape((-1, coordinates.shape[-1])))
+        log_space = kwargs.get('log_space', False)
+        pdf = utils.evaluate_density(d, coordinates.reshape((-1, coordinates.shape[-1])), log_space,
+                                     **utils.density_options(kwargs), max_memory=kwargs.get('max_memory'),
+                                     workers=kwargs.get('workers', 1))
         pdf = pdf.reshape(coordinates.shape[:-1])
         pdf = pdf.transpose((1,0)+tuple(range(2,numvars)))
 
         # Monte Carlo approach for determining isovalues
-        isovalues = []
-        samples = d.sample(num_samples, seed)
-        densities = d.pdf(samples)
-        densities.sort()
-        if quantiles is None:
-            isovalues.append(densities[int((1 - 99.7/100) * num_samples)]) # 99.7% quantile
-            isovalues.append(densities[int((1 - 95/100) * num_samples)]) # 95% quantile
-            isovalues.append(densities[int((1 - 68/100) * num_samples)]) # 68% quantile
-        else:
-            quantiles.sort(reverse=True)
-            for quantile in quantiles:
-                if not 0 < quantile < 100:
-                    raise ValueError(f"Invalid quantile: {quantile}. Quantiles must be between 0 and 100 (exclusive).")
-                elif int((1 - quantile/100) * num_samples) >= num_samples:
-                    raise ValueError(f"Quantile {quantile} results in an index that is out of bounds.")
-                isovalues.append(densities[int((1 - quantile/100) * num_samples)])
+        isovalues = utils.compute_isovalues(d, num_samples, quantiles, seed, kwargs.get('sampling_method', 'random'),
+                                            log_space)
 
         for i, j in zip(*np.triu_indices_from(axes, k=1)):
             for x, y in [(i, j), (j, i)]:
@@ -252,7 +272,7 @@ def plot_contour_samples(distributions, num_samples, resolution=128, ranges=None
                 indices = list(np.arange(d.dim))
                 indices.remove(x)
                 indices.remove(y)
-                pdf_agg = np.sum(pdf, axis=tuple(indices))
+                pdf_agg = utils.aggregate_density(pdf, tuple(indices), log_space)
                 if x < y:
                     axes[x,y].contour(dims[x], dims[y], pdf_agg, levels=isovalues, colors=[color])
                 else:
@@ -264,7 +284,10 @@ def plot_contour_samples(distributions, num_samples, resolution=128, ranges=None
         for i in range(numvars):
             indices = list(np.arange(d.dim))
             indices.remove(i)
-            axes[i,i].plot(dims[i], np.sum(pdf, axis=tuple(indices)), color=color)
+            marginal = utils.aggregate_density(pdf, tuple(indices), log_space)
+            if log_space:
+                marginal = np.exp(marginal)
+            axes[i,i].plot(dims[i], marginal, color=color)
             axes[i,i].xaxis.set_visible(True)
             axes[i,i].yaxis.set_visible(True)
 
@@ -1,9 +1,110 @@
 import numpy as np
 import matplotlib.pyplot as plt
+from uadapy import DistributionSet
+from uadapy._lazy import LazyModule
+
+special = LazyModule('scipy.special')
 
 def generate_random_colors(length):
     return ["#"+''.join([np.random.choice('0123456789ABCDEF') for j in range(6)]) for _ in range(length)]
 
 def generate_spectrum_colors(length):
     cmap = plt.cm.get_cmap('viridis', length)  # You can choose different colormaps like 'jet', 'hsv', 'rainbow', etc.
-    return np.array([cmap(i) for i in range(length)])
\ No newline at end of file
+    return np.array([cmap(i) for i in range(length)])
+
+def compute_ranges(distributions, scale=3):
+    """
+    Computes plotting ranges for all dimensions that cover the means of the distributions
+    plus scale times the largest standard deviation in each dimension.
+    :param distributions: List of distributions or a DistributionSet
+    :param scale: Number of standard deviations added around the means
+    :return: List of (min, max) tuples, one per dimension
+    """
+    if isinstance(distributions, DistributionSet):
+        means = distributions.means
+        variances = np.diagonal(distributions.covs, axis1=1, axis2=2)
+    else:
+        means = np.array([d.mean() for d in distributions])
+        variances = np.array([np.diagonal(d.cov()) for d in distributions])
+    min_val = means.min(axis=0)
+    max_val = means.max(axis=0)
+    std_max = np.sqrt(np.max(variances, axis=0))
+    return [(mi-scale*co, ma+scale*co) for mi, ma, co in zip(min_val, max_val, std_max)]
+
+
+def compute_isovalues(distribution, num_samples, quantiles=None, seed=55, sampling_method="random", log_space=False):
+    """
+    Monte Carlo approach for determining the density isovalues that enclose the given quantiles
+    of the probability mass of a distribution.
+    :param distribution: The distribution
+    :param num_samples: Number of samples used to estimate the isovalues
+    :param quantiles: List of quantiles in percent, the 99.7%, 95%, and 68% quantiles are used if None
+    :param seed: Seed for the random number generator
+    :param sampling_method: "random", or "sobol" or "halton" for quasi-Monte Carlo samples, which
+        achieve the same accuracy with fewer samples (see distribution.sample)
+    :param log_space: If True, the isovalues are computed from log-densities and returned as log-densities
+    :return: List of isovalues in increasing order
+    """
+    samples = distribution.sample(num_samples, seed, method=sampling_method)
+    if log_space:
+        densities = distribution.logpdf(samples)
+    else:
+        densities = distribution.pdf(samples)
+    if quantiles is None:
+        quantiles = [99.7, 95, 68]
+    else:
+        quantiles.sort(reverse=True)
+    indices = []
+    for quantile in quantiles:
+        if not 0 < quantile < 100:
+            raise ValueError(f"Invalid quantile: {quantile}. Quantiles must be between 0 and 100 (exclusive).")
+        elif int((1 - quantile/100) * num_samples) >= num_samples:
+            raise ValueError(f"Quantile {quantile} results in an index that is out of bounds.")
+        indices.append(int((1 - quantile/100) * num_samples))
+    # only the order statistics at the indices are needed, a partial sort finds them in linear time
+    densities = np.partition(densities, indices)
+    return [densities[i] for i in indices]
+
+
+def evaluate_density(distribution, points, log_space=False, **kwargs):
+    """
+    Evaluates the density or log-density of a distribution at the given points.
+    :param distribution: The distribution
+    :param points: Points of shape (m, d)
+    :param log_space: If True, the log-densities are returned
+    :param kwargs: Options passed on to distribution.pdf or distribution.logpdf
+    :return: The (log-)densities at the points
+    """
+    if log_space:
+        return distribution.logpdf(points, **kwargs)
+    return distribution.pdf(points, **kwargs)
+
+
+def density_options(kwargs: dict) -> dict:
+    """
+    Collects the options of distribution.pdf from the keyword arguments of a plotting function,
+    i.e., pdf_method and the accuracy settings grid_size of the 'binned' and cutoff of the 'binned'
+    and 'tree' methods.
+    :param kwargs: Keyword arguments of the plotting function
+    :return: Keyword arguments for evaluate_density
+    """
+    method = kwargs.get('pdf_method', 'exact')
+    options = {'method': method}
+    if method == 'binned' and 'grid_size' in kwargs:
+        options['grid_size'] = kwargs['grid_size']
+    if method in ('binned', 'tree') and 'cutoff' in kwargs:
+        options['cutoff'] = kwargs['cutoff']
+    return options
+
+
+def aggregate_density(density, axis, log_space=False):
+    """
+    Sums a density grid over the given axes. In log space the sum is computed as a log-sum-exp.
+    :param density: Grid of densities or log-densities
+    :param axis: Axes to sum over
+    :param log_space: If True, the grid contains log-densities
+    :return: The aggregated grid
+    """
+    if log_space:
+        return special.logsumexp(density, axis=axis)
+    return np.sum(density, axis=axis)
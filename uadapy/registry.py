@@ -0,0 +1,138 @@
+"""
+Registry of the functions that compute moments and samples of the models wrapped by a distribution.
+The functions are resolved once per model type when a distribution is created, so that the
+accessors of a distribution do not have to probe the model on every call.
+New model types can be supported by registering their accessors with register_model().
+"""
+
+from uadapy.sampling import qmc_uniform
+
+ACCESSORS = ('mean', 'cov', 'skew', 'kurt', 'sample', 'sample_qmc', 'quantile', 'cdf')
+
+_registry = {}
+_resolved = {}
+
+
+class ModelAccessors:
+    """
+    The accessor functions of one model type. The moment functions take the distribution as their only
+    argument, sample takes (distribution, n, random_state), sample_qmc takes
+    (distribution, n, random_state, method), quantile takes (distribution, q) and cdf takes (distribution, x).
+    """
+
+    __slots__ = ACCESSORS
+
+    def __init__(self, **accessors):
+        for key in ACCESSORS:
+            setattr(self, key, accessors.get(key))
+
+
+def register_model(model_type: type | str, **accessors):
+    """
+    Registers accessor functions for a model type. The functions are used for the model type and
+    all its subclasses, unless a subclass registers its own functions. Accessors that are not given
+    are inherited from registered base classes or derived from the attributes of the model.
+    :param model_type: The type of the models, or its qualified name 'module.ClassName' to register
+        a type without importing its module
+    :param accessors: Functions for 'mean', 'cov', 'skew', 'kurt', 'sample', 'sample_qmc', 'quantile' and 'cdf',
+        see ModelAccessors
+    """
+    unknown = set(accessors) - set(ACCESSORS)
+    if unknown:
+        raise ValueError(f"Unknown accessors: {', '.join(sorted(unknown))}")
+    _registry.setdefault(model_type, {}).update(accessors)
+    _resolved.clear()
+
+
+def resolve_accessors(model, model_type: type = None) -> ModelAccessors:
+    """
+    Returns the accessor functions for the type of the given model. They are looked up along the
+    method resolution order of the type, missing functions are derived from the attributes of the model.
+    The result is cached per type.
+    :param model: The model
+    :param model_type: Type to resolve instead of the type of the model, e.g. for a model that is not created yet
+    :return: The accessor functions
+    """
+    model_type = model_type or type(model)
+    accessors = _resolved.get(model_type)
+    if accessors is None:
+        found = {}
+        for cls in reversed(model_type.__mro__):
+            found.update(_registry.get(f'{cls.__module__}.{cls.__qualname__}', {}))
+            found.update(_registry.get(cls, {}))
+        for key in ACCESSORS:
+            if key not in found:
+                found[key] = _PROBES[key](model)
+        accessors = _resolved[model_type] = ModelAccessors(**found)
+    return accessors
+
+
+def _attribute(name: str, call: bool = False):
+    if call:
+        return lambda d: getattr(d.model, name)()
+    return lambda d: getattr(d.model, name)
+
+
+def _first_attribute(model, names, call=True):
+    for name in names:
+        if hasattr(model, name):
+            return _attribute(name, call and callable(getattr(model, name)))
+    return None
+
+
+def _missing(what: str):
+    def raise_missing(d, *args):
+        raise AttributeError(f"{what} not implemented yet! {d.model.__class__.__name__}")
+    return raise_missing
+
+
+def _probe_mean(model):
+    return _first_attribute(model, ('mean', 'loc', 'mu')) or _missing("Mean")
+
+
+def _probe_cov(model):
+    return _first_attribute(model, ('cov', 'covariance', 'var')) or _missing("Covariance")
+
+
+def _probe_stats(moment: str):
+    def probe(model):
+        if callable(getattr(model, 'stats', None)):
+            return lambda d: d.model.stats(moments=moment)
+        return lambda d: None
+    return probe
+
+
+def _probe_sample(model):
+    if callable(getattr(model, 'rvs', None)):
+        return lambda d, n, random_state: d.model.rvs(size=n, random_state=random_state)
+    if callable(getattr(model, 'resample', None)):
+        return lambda d, n, random_state: d.model.resample(size=n, seed=random_state)
+    return lambda d, n, random_state: None
+
+
+def _probe_sample_qmc(model):
+    if callable(getattr(model, 'ppf', None)):
+        def sample_ppf(d, n, random_state, method):
+            return d.model.ppf(qmc_uniform(n, 1, method, random_state)[:, 0])
+        return sample_ppf
+    return _missing("Quasi-Monte Carlo sampling")
+
+
+def _probe_method(name: str, what: str):
+    def probe(model):
+        if callable(getattr(model, name, None)):
+            return lambda d, x: getattr(d.model, name)(x)
+        return _missing(what)
+    return probe
+
+
+_PROBES = {
+    'mean': _probe_mean,
+    'cov': _probe_cov,
+    'skew': _probe_stats('s'),
+    'kurt': _probe_stats('k'),
+    'sample': _probe_sample,
+    'sample_qmc': _probe_sample_qmc,
+    'quantile': _probe_method('ppf', "Quantile"),
+    'cdf': _probe_method('cdf', "CDF"),
+}
@@ -0,0 +1,104 @@
+"""
+Utilities for drawing samples from many distributions reproducibly.
+"""
+
+import multiprocessing
+import warnings
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from uadapy._lazy import LazyModule
+
+stats = LazyModule('scipy.stats')
+
+
+def spawn_generators(seed, n: int) -> list[np.random.Generator]:
+    """
+    Creates n statistically independent random number generators from one seed using np.random.SeedSequence.
+    The i-th generator only depends on the seed and i.
+    :param seed: An int, a np.random.SeedSequence, a np.random.Generator or None for fresh entropy
+    :param n: Number of generators
+    :return: List of generators
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed.spawn(n)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [np.random.default_rng(child) for child in seed.spawn(n)]
+
+
+def sample_parallel(distributions, n: int, seed=None, workers: int = 1, executor: str | Executor = "thread",
+                    method: str = "random") -> list[np.ndarray]:
+    """
+    Draws n samples from each of the distributions, distributing the distributions across a pool of workers.
+    Every distribution draws from its own random number generator spawned from the seed
+    (see spawn_generators), so that the samples only depend on the seed and the position of the
+    distribution in the list. The result is bit-identical for any number of workers.
+    :param distributions: List of distributions offering sample(n, random_state, method)
+    :param n: Number of samples per distribution
+    :param seed: An int, a np.random.SeedSequence, a np.random.Generator or None for fresh entropy
+    :param workers: Number of workers, the distributions are sampled serially if 1
+    :param executor: "thread" for a thread pool, "process" for a process pool, or an existing
+        concurrent.futures.Executor, in which case workers is ignored. Processes avoid the global
+        interpreter lock for sampling that is not done in numpy, but the distributions are pickled.
+    :param method: Sampling method passed on to sample(), e.g. "random" or "sobol"
+    :return: List with the samples of every distribution
+    """
+    generators = spawn_generators(seed, len(distributions))
+    tasks = [(d, n, rng, method) for d, rng in zip(distributions, generators)]
+    if isinstance(executor, Executor):
+        return list(executor.map(_sample, tasks))
+    if workers <= 1 or len(tasks) <= 1:
+        return [_sample(task) for task in tasks]
+    if executor == "thread":
+        pool = ThreadPoolExecutor(max_workers=workers)
+    elif executor == "process":
+        # forking a process that already runs BLAS or numba threads can deadlock, so workers are spawned
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        raise ValueError(f"Unknown executor: {executor}")
+    with pool:
+        return list(pool.map(_sample, tasks))
+
+
+def _sample(task: tuple) -> np.ndarray:
+    d, n, rng, method = task
+    if method == "random":
+        return d.sample(n, rng)
+    return d.sample(n, rng, method=method)
+
+
+def qmc_uniform(n: int, d: int, method: str = "sobol", random_state=None) -> np.ndarray:
+    """
+    Draws scrambled quasi-Monte Carlo points in the open unit cube.
+    :param n: Number of points. Sobol sequences are best balanced for powers of two.
+    :param d: Dimensionality of the points
+    :param method: "sobol" or "halton"
+    :param random_state: Seed or generator used for the scrambling
+    :return: Array of shape (n, d)
+    """
+    rng = np.random.default_rng(random_state)
+    if method == "sobol":
+        engine = stats.qmc.Sobol(d, scramble=True, seed=rng)
+    elif method == "halton":
+        engine = stats.qmc.Halton(d, scramble=True, seed=rng)
+    else:
+        raise ValueError(f"Unknown quasi-Monte Carlo method: {method}")
+    with warnings.catch_warnings():
+        # sample sizes that are no powers of two are fine for our use
+        warnings.simplefilter("ignore", UserWarning)
+        u = engine.random(n)
+    eps = np.finfo(float).eps
+    return np.clip(u, eps, 1 - eps)
+
+
+def qmc_normal(n: int, d: int, method: str = "sobol", random_state=None) -> np.ndarray:
+    """
+    Draws quasi-Monte Carlo points of the standard normal distribution by mapping
+    scrambled low-discrepancy points through the inverse normal CDF.
+    :param n: Number of points
+    :param d: Dimensionality of the points
+    :param method: "sobol" or "halton"
+    :param random_state: Seed or generator used for the scrambling
+    :return: Array of shape (n, d)
+    """
+    return stats.norm.ppf(qmc_uniform(n, d, method, random_state))
@@ -0,0 +1,252 @@
+"""
+Streaming statistics for sample-based distributions that are processed chunk by chunk,
+e.g. samples stored in memory-mapped files or samples that arrive incrementally.
+"""
+
+import numpy as np
+
+
+class RunningMoments:
+    """
+    Mergeable running estimates of the mean, the covariance matrix and the per-dimension third and
+    fourth central moments of a set of samples. Chunks are combined with the pairwise update formulas
+    by Chan et al. and Pébay, which are numerically stable and only need O(d^2) memory.
+    """
+
+    def __init__(self, dim: int):
+        """
+        :param dim: The dimensionality of the samples
+        """
+        self.n = 0
+        self.dim = dim
+        self.mean = np.zeros(dim)
+        self.m2 = np.zeros((dim, dim))
+        self.m3 = np.zeros(dim)
+        self.m4 = np.zeros(dim)
+
+    @classmethod
+    def from_samples(cls, samples: np.ndarray, chunk_size: int = None) -> 'RunningMoments':
+        """
+        Computes the moments of the samples, reading chunk_size rows at a time.
+        :param samples: Array of shape (n, d) or (n,), e.g. a np.memmap
+        :param chunk_size: Number of rows per chunk, all rows at once if None
+        :return: The accumulated moments
+        """
+        samples = samples.reshape((samples.shape[0], -1))
+        moments = cls(samples.shape[1])
+        chunk_size = chunk_size or samples.shape[0]
+        for start in range(0, samples.shape[0], chunk_size):
+            moments.update(samples[start:start + chunk_size])
+        return moments
+
+    def update(self, samples: np.ndarray):
+        """
+        Adds a chunk of samples.
+        :param samples: Array of shape (m, d) or (m,)
+        """
+        samples = np.asarray(samples, dtype=float).reshape((-1, self.dim))
+        if samples.shape[0] == 0:
+            return
+        chunk = RunningMoments(self.dim)
+        chunk.n = samples.shape[0]
+        chunk.mean = samples.mean(axis=0)
+        centered = samples - chunk.mean
+        centered_sq = centered * centered
+        chunk.m2 = centered.T @ centered
+        chunk.m3 = np.sum(centered_sq * centered, axis=0)
+        chunk.m4 = np.sum(centered_sq * centered_sq, axis=0)
+        self.merge(chunk)
+
+    def merge(self, other: 'RunningMoments'):
+        """
+        Merges the moments of another set of samples into this one.
+        :param other: Moments of the other samples
+        """
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n, self.mean, self.m2, self.m3, self.m4 = other.n, other.mean.copy(), other.m2.copy(), \
+                other.m3.copy(), other.m4.copy()
+            return
+        na, nb = self.n, other.n
+        n = na + nb
+        delta = other.mean - self.mean
+        m2a, m2b = np.diag(self.m2), np.diag(other.m2)
+        m4 = (self.m4 + other.m4 + delta**4 * na * nb * (na * na - na * nb + nb * nb) / n**3
+              + 6 * delta**2 * (na * na * m2b + nb * nb * m2a) / n**2
+              + 4 * delta * (na * other.m3 - nb * self.m3) / n)
+        m3 = (self.m3 + other.m3 + delta**3 * na * nb * (na - nb) / n**2
+              + 3 * delta * (na * m2b - nb * m2a) / n)
+        self.m2 = self.m2 + other.m2 + np.outer(delta, delta) * na * nb / n
+        self.mean = self.mean + delta * nb / n
+        self.m3 = m3
+        self.m4 = m4
+        self.n = n
+
+    def cov(self) -> np.ndarray:
+        """
+        :return: The unbiased sample covariance matrix
+        """
+        return self.m2 / (self.n - 1)
+
+    def skew(self) -> np.ndarray:
+        """
+        :return: The (biased) sample skewness per dimension, as computed by scipy.stats.skew
+        """
+        return np.sqrt(self.n) * self.m3 / np.diag(self.m2)**1.5
+
+    def kurt(self) -> np.ndarray:
+        """
+        :return: The (biased) excess kurtosis per dimension, as computed by scipy.stats.kurtosis
+        """
+        return self.n * self.m4 / np.diag(self.m2)**2 - 3
+
+
+def cholesky_update(factor: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """
+    Updates the lower Cholesky factor L of a positive definite matrix A = L L^T to the factor of
+    A + V^T V for m vectors V of shape (m, d). Fewer than d vectors are added by m rank-1 updates in
+    O(m * d^2), otherwise the factor is recomputed from a QR decomposition of [L^T; V] in O((m + d) * d^2),
+    both without forming A.
+    :param factor: Lower Cholesky factor of shape (d, d)
+    :param vectors: Vectors of shape (m, d) or (d,)
+    :return: The updated lower Cholesky factor of shape (d, d)
+    """
+    d = factor.shape[0]
+    vectors = np.array(vectors, dtype=np.result_type(factor, float)).reshape((-1, d))
+    if vectors.shape[0] >= d:
+        r = np.linalg.qr(np.concatenate([factor.T, vectors]), mode='r')
+        # R^T R = L L^T + V^T V, the signs of the rows of R are chosen for a positive diagonal
+        return (r * np.where(np.diag(r) < 0, -1, 1)[:, np.newaxis]).T
+    factor = factor.astype(vectors.dtype, copy=True)
+    for x in vectors:
+        for k in range(d):
+            r = np.hypot(factor[k, k], x[k])
+            c = r / factor[k, k]
+            s = x[k] / factor[k, k]
+            factor[k, k] = r
+            factor[k + 1:, k] = (factor[k + 1:, k] + s * x[k + 1:]) / c
+            x[k + 1:] = c * x[k + 1:] - s * factor[k + 1:, k]
+    return factor
+
+
+class QuantileSketch:
+    """
+    Mergeable KLL sketch (Karnin, Lang and Liberty) of the marginal distributions of a stream of samples.
+    The sketch keeps a hierarchy of compactors, where an item on level h represents 2^h samples. When a level
+    exceeds its capacity, it is sorted and every other item is promoted to the next level. The memory is
+    O(k * d) independent of the number of samples, and the rank error of quantile() and cdf() is in the
+    order of 1/k with high probability. As long as fewer than k samples were added, the results are exact.
+    All dimensions receive the same number of items, so the compactors of all dimensions are stored as
+    (m, d) arrays and compacted at once.
+    """
+
+    def __init__(self, dim: int, k: int = 200, random_state=None):
+        """
+        :param dim: The dimensionality of the samples
+        :param k: Capacity of the top level, larger values are more accurate and need more memory
+        :param random_state: Seed or generator for the random offsets of the compactions
+        """
+        self.n = 0
+        self.dim = dim
+        self.k = k
+        self.levels = [np.empty((0, dim))]
+        self._rng = np.random.default_rng(random_state)
+
+    @classmethod
+    def from_samples(cls, samples: np.ndarray, chunk_size: int = None, k: int = 200,
+                     random_state=None) -> 'QuantileSketch':
+        """
+        Builds the sketch of the samples, reading chunk_size rows at a time.
+        :param samples: Array of shape (n, d) or (n,), e.g. a np.memmap
+        :param chunk_size: Number of rows per chunk, all rows at once if None
+        :param k: Capacity of the top level
+        :param random_state: Seed or generator for the random offsets of the compactions
+        :return: The sketch
+        """
+        samples = samples.reshape((samples.shape[0], -1))
+        sketch = cls(samples.shape[1], k, random_state)
+        chunk_size = chunk_size or samples.shape[0]
+        for start in range(0, samples.shape[0], chunk_size):
+            sketch.update(samples[start:start + chunk_size])
+        return sketch
+
+    def _capacity(self, level: int) -> int:
+        # lower levels get geometrically smaller capacities, see Karnin et al.
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, samples: np.ndarray):
+        """
+        Adds a chunk of samples.
+        :param samples: Array of shape (m, d) or (m,)
+        """
+        samples = np.asarray(samples, dtype=float).reshape((-1, self.dim))
+        self.n += samples.shape[0]
+        self.levels[0] = np.concatenate([self.levels[0], samples])
+        self._compress()
+
+    def merge(self, other: 'QuantileSketch'):
+        """
+        Merges the sketch of another set of samples into this one.
+        :param other: Sketch of the other samples
+        """
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty((0, self.dim)))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self._compress()
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if items.shape[0] > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty((0, self.dim)))
+                items = np.sort(items, axis=0)
+                # an odd item stays on its level, the others are halved with a random offset
+                keep = items.shape[0] % 2
+                offset = self._rng.integers(0, 2)
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], items[keep + offset::2]])
+                self.levels[h] = items[:keep]
+            h += 1
+
+    def _weighted_items(self) -> tuple[np.ndarray, np.ndarray]:
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level.shape[0], 2.0**h) for h, level in enumerate(self.levels)])
+        return items, weights
+
+    def quantile(self, q: np.ndarray | float) -> np.ndarray:
+        """
+        Estimates the quantiles of the marginal distributions.
+        :param q: Probabilities in [0, 1], scalar or array of shape (m,)
+        :return: Array of shape (d,) for a scalar q, otherwise of shape (m, d)
+        """
+        items, weights = self._weighted_items()
+        q = np.asarray(q, dtype=float)
+        result = np.empty(q.shape + (self.dim,))
+        total = weights.sum()
+        for i in range(self.dim):
+            order = np.argsort(items[:, i])
+            ranks = np.cumsum(weights[order])
+            indices = np.minimum(np.searchsorted(ranks, q * total), len(order) - 1)
+            result[..., i] = items[order[indices], i]
+        return result
+
+    def cdf(self, x: np.ndarray) -> np.ndarray:
+        """
+        Estimates the marginal cumulative distribution functions.
+        :param x: Points of shape (m, d)
+        :return: Array of shape (m, d) with the fraction of samples less than or equal to x per dimension
+        """
+        items, weights = self._weighted_items()
+        x = np.asarray(x, dtype=float).reshape((-1, self.dim))
+        result = np.empty(x.shape)
+        total = weights.sum()
+        for i in range(self.dim):
+            order = np.argsort(items[:, i])
+            ranks = np.concatenate([[0], np.cumsum(weights[order])])
+            result[:, i] = ranks[np.searchsorted(items[order, i], x[:, i], side='right')] / total
+        return result